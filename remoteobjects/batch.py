@@ -0,0 +1,363 @@
+"""
+
+`remoteobjects.batch` provides strategies for sending many `RemoteObject`
+instances to a remote resource at once, as with `HttpObject.post_many()`.
+
+A batching strategy is an object with a `post()` method taking the
+collection `RemoteObject` to post to, a list of `RemoteObject` instances to
+post, and the user agent to post with (or `None` for the default). The method
+should update each posted instance from its result, and return a list with,
+for each posted instance in order, the exception that prevented it from being
+posted, or `None` if it was posted successfully.
+
+Strategies used with `HttpObject.put_many()` and `delete_many()` similarly
+provide `put()` and `delete()` methods, taking the list of instances and the
+user agent. `SequentialBatch` and `ConcurrentBatch` provide all three
+methods; `ArrayBatch` and `MultipartBatch` can only post.
+
+"""
+
+from email.parser import Parser
+import time
+import urlparse
+
+import httplib2
+from remoteobjects.json import forgiving_loads
+
+import remoteobjects.deadline
+from remoteobjects.futures import Executor
+import remoteobjects.http
+
+
+def batches(objs, size):
+    """Yields lists of at most `size` items from the iterable `objs`.
+
+    Items are pulled from `objs` only as each list is needed, so `objs` can
+    be a generator producing items lazily.
+
+    """
+    chunk = []
+    for obj in objs:
+        chunk.append(obj)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class BatchResult(object):
+
+    """The outcomes of a bulk operation over many `RemoteObject` instances.
+
+    Iterating over a `BatchResult` yields ``(obj, error)`` pairs for each
+    instance in the order they were given, where ``error`` is the exception
+    raised for that instance or `None` if it succeeded.
+
+    """
+
+    def __init__(self):
+        self.outcomes = []
+        self.started = time.time()
+        self.elapsed = 0.0
+
+    def add(self, objs, errors):
+        """Records the outcomes for the list of instances `objs`, given the
+        matching list of their `errors`."""
+        self.outcomes.extend(zip(objs, errors))
+        self.elapsed = time.time() - self.started
+
+    @property
+    def throughput(self):
+        """The number of instances processed per second, over the whole
+        operation."""
+        if not self.elapsed:
+            return 0.0
+        return len(self.outcomes) / self.elapsed
+
+    @property
+    def succeeded(self):
+        """The instances for which the operation succeeded."""
+        return [obj for obj, error in self.outcomes if error is None]
+
+    @property
+    def failed(self):
+        """The ``(obj, error)`` pairs for which the operation failed."""
+        return [(obj, error) for obj, error in self.outcomes
+            if error is not None]
+
+    def __len__(self):
+        return len(self.outcomes)
+
+    def __iter__(self):
+        return iter(self.outcomes)
+
+
+class SequentialBatch(object):
+
+    """A batching strategy that sends each instance in its own request, one
+    after another.
+
+    As each request is a regular `HttpObject.post()`, `put()` or `delete()`
+    made with the given user agent (or the default user agent), this
+    strategy works with any API, and uses the same credentials and cache as
+    single requests do. This is the strategy `HttpObject` uses by default.
+
+    """
+
+    def each(self, fn, objs, http=None):
+        """Calls `fn` with each instance in `objs` and the user agent `http`,
+        returning the list of exceptions raised (or `None` for calls that
+        returned normally) in the same order.
+
+        If a deadline is set for the calling thread and it passes, the calls
+        not yet made are reported as `remoteobjects.deadline.DeadlineExceeded`
+        errors instead.
+
+        """
+        deadline = remoteobjects.deadline.current()
+        errors = []
+        for obj in objs:
+            try:
+                if deadline is not None:
+                    deadline.check('Batch request')
+                fn(obj, http)
+            except Exception, exc:
+                errors.append(exc)
+            else:
+                errors.append(None)
+        return errors
+
+    def post(self, collection, objs, http=None):
+        return self.each(lambda obj, http: collection.post(obj, http=http),
+            objs, http)
+
+    def put(self, objs, http=None):
+        return self.each(lambda obj, http: obj.put(http=http), objs, http)
+
+    def delete(self, objs, http=None):
+        return self.each(lambda obj, http: obj.delete(http=http), objs, http)
+
+
+class ArrayBatch(object):
+
+    """A batching strategy that posts a batch as one JSON array.
+
+    The target API should respond with a JSON array containing, in the same
+    order, the representations of the created resources. Each posted
+    instance is updated from its corresponding member of that array.
+
+    """
+
+    def post(self, collection, objs, http=None):
+        cls = type(objs[0])
+        url = collection._location
+
+        body = '[%s]' % ', '.join(obj.encode_body() for obj in objs)
+        headers = {'content-type': cls.content_types[0]}
+        request = collection.get_request(method='POST', body=body,
+            headers=headers)
+        response, content = remoteobjects.http.send_request(http,
+            request)
+
+        try:
+            cls.raise_for_response(url, response, content)
+            data = forgiving_loads(content)
+            if not isinstance(data, list) or len(data) != len(objs):
+                raise cls.BadResponse('Response posting %d %s instances to %s'
+                    ' was not a list of %d results'
+                    % (len(objs), cls.__name__, url, len(objs)))
+        except Exception, exc:
+            return [exc] * len(objs)
+
+        errors = []
+        for obj, item in zip(objs, data):
+            try:
+                obj.update_from_dict(item)
+            except Exception, exc:
+                errors.append(exc)
+            else:
+                errors.append(None)
+        return errors
+
+
+class MultipartBatch(object):
+
+    """A batching strategy that posts a batch as one ``multipart/mixed``
+    request, with each part holding an ``application/http`` ``POST``
+    request.
+
+    The target API should respond with a ``multipart/mixed`` response with a
+    part holding the HTTP response to each request part, identified by the
+    ``Content-ID`` header given in the request part or in the same order. Each
+    posted instance is updated from its own response, so statuses and errors
+    are reported per instance just as with `HttpObject.post()`.
+
+    """
+
+    boundary = '==remoteobjects-batch=='
+
+    def __init__(self, url=None):
+        """Sets the URL of the API's batch endpoint.
+
+        If optional parameter `url` is not given, batch requests are posted to
+        the collection's own URL.
+
+        """
+        self.url = url
+
+    def post(self, collection, objs, http=None):
+        url = collection._location
+        cls = type(collection)
+
+        parts = urlparse.urlsplit(url)
+        path = urlparse.urlunsplit(('', '', parts[2] or '/', parts[3], ''))
+        body = []
+        for i, obj in enumerate(objs):
+            body.append('--%s\r\nContent-Type: application/http\r\n'
+                'Content-ID: <%d>\r\n\r\nPOST %s HTTP/1.1\r\nHost: %s\r\n'
+                'Content-Type: %s\r\nAccept: %s\r\n\r\n%s\r\n'
+                % (self.boundary, i, path, parts[1], obj.content_types[0],
+                   ', '.join(obj.content_types), obj.encode_body()))
+        body.append('--%s--\r\n' % self.boundary)
+
+        headers = {
+            'content-type': 'multipart/mixed; boundary="%s"' % self.boundary,
+            'accept': 'multipart/mixed',
+        }
+        request = dict(uri=self.url or url, method='POST',
+            body=''.join(body), headers=headers)
+        response, content = remoteobjects.http.send_request(http,
+            request)
+
+        try:
+            results = self.parse_response(cls, url, response, content)
+            if len(results) != len(objs):
+                raise cls.BadResponse('Batch response posting to %s had %d'
+                    ' parts for %d requests' % (url, len(results), len(objs)))
+        except Exception, exc:
+            return [exc] * len(objs)
+
+        errors = []
+        for i, obj in enumerate(objs):
+            part_response, part_content = results.get(i, (None, None))
+            try:
+                if part_response is None:
+                    raise cls.BadResponse('Batch response posting to %s had'
+                        ' no part for request %d' % (url, i))
+                obj.update_from_response(url, part_response, part_content)
+            except Exception, exc:
+                errors.append(exc)
+            else:
+                errors.append(None)
+        return errors
+
+    def parse_response(self, cls, url, response, content):
+        """Splits a ``multipart/mixed`` batch response into a dictionary of
+        ``(response, content)`` pairs keyed by request index."""
+        if response.status != 200:
+            cls.raise_for_response(url, response, content)
+            raise cls.BadResponse('Unexpected response posting batch to %s:'
+                ' %d %s' % (url, response.status, response.reason))
+        content_type = response.get('content-type', '')
+        if content_type.split(';', 1)[0].strip() != 'multipart/mixed':
+            raise cls.BadResponse('Bad response posting batch to %s:'
+                ' content-type %s is not multipart/mixed'
+                % (url, content_type))
+
+        message = Parser().parsestr('Content-Type: %s\r\n\r\n%s'
+            % (content_type, content))
+        results = {}
+        for i, part in enumerate(message.get_payload()):
+            content_id = part.get('content-id', '').strip('<> ')
+            if content_id.startswith('response-'):
+                content_id = content_id[len('response-'):]
+            if content_id.isdigit():
+                i = int(content_id)
+
+            status_line, _, rest = part.get_payload().lstrip().partition('\n')
+            version, status, reason = (status_line.strip().split(None, 2)
+                + [''])[:3]
+            part_message = Parser().parsestr(rest)
+            info = dict((k.lower(), v) for k, v in part_message.items())
+            info['status'] = status
+            part_response = httplib2.Response(info)
+            part_response.reason = reason
+            results[i] = (part_response, part_message.get_payload())
+        return results
+
+
+class ConcurrentBatch(object):
+
+    """A batching strategy that sends each instance in its own request,
+    running at most `workers` requests at once.
+
+    As with `SequentialBatch`, each request is a regular `HttpObject.post()`,
+    `put()` or `delete()`, so this strategy works with any API that supports
+    those requests for single instances. Each worker thread keeps its own
+    user agent, so connections to the API are reused from one request to the
+    next.
+
+    The worker threads are started when first needed and kept for later
+    batches; call ``strategy.executor.shutdown()`` to stop them.
+
+    """
+
+    def __init__(self, workers=4, http_factory=None):
+        """Sets the number of concurrent requests to make.
+
+        Optional parameter `http_factory` is a callable returning a new user
+        agent for each worker thread, as for `futures.Executor`. A user agent
+        given to `post()`, `put()` or `delete()` is instead shared by all
+        workers, so it must be safe to use from multiple threads.
+
+        """
+        self.executor = Executor(workers=workers, http_factory=http_factory)
+
+    def each(self, fn, objs, http=None):
+        """Calls `fn` with each instance in `objs` and a user agent, returning
+        the list of exceptions raised (or `None` for calls that returned
+        normally) in the same order.
+
+        If a deadline is set for the calling thread, the calls are made under
+        that deadline too. Calls still waiting for a worker when it passes are
+        cancelled, and reported as `remoteobjects.deadline.DeadlineExceeded`
+        errors.
+
+        """
+        executor = self.executor
+        deadline = remoteobjects.deadline.current()
+
+        def run(obj):
+            if deadline is None:
+                return fn(obj, http or executor.http())
+            deadline.__enter__()
+            try:
+                return fn(obj, http or executor.http())
+            finally:
+                deadline.__exit__(None, None, None)
+
+        futures = executor.map(run, objs)
+        if deadline is None:
+            return [future.exception() for future in futures]
+
+        errors = []
+        for future in futures:
+            if not future.wait(deadline.remaining()) and future.cancel():
+                try:
+                    deadline.check('Batch request')
+                except remoteobjects.deadline.DeadlineExceeded, exc:
+                    errors.append(exc)
+                    continue
+            errors.append(future.exception())
+        return errors
+
+    def post(self, collection, objs, http=None):
+        return self.each(lambda obj, http: collection.post(obj, http=http),
+            objs, http)
+
+    def put(self, objs, http=None):
+        return self.each(lambda obj, http: obj.put(http=http), objs, http)
+
+    def delete(self, objs, http=None):
+        return self.each(lambda obj, http: obj.delete(http=http), objs, http)
@@ -0,0 +1,588 @@
+"""
+
+`remoteobjects.cache` provides caches that save `RemoteObject` classes from
+making requests whose results they already know.
+
+"""
+
+from collections import OrderedDict
+import errno
+import hashlib
+import httplib
+import logging
+import os
+import stat
+import tempfile
+import threading
+import time
+import weakref
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from remoteobjects import codec
+from remoteobjects.dataobject import DataObject, copy_data
+from remoteobjects.futures import Executor
+import remoteobjects.http
+
+
+log = logging.getLogger('remoteobjects.cache')
+
+
+class NegativeCache(object):
+
+    """A cache of recent requests for missing or forbidden resources.
+
+    Set a `NegativeCache` as the `negative_cache` of an `HttpObject` class to
+    remember which URLs answered with ``404 Not Found``, ``403 Forbidden`` or
+    ``410 Gone`` responses. Until the remembered failure expires, requesting
+    the same URL as an instance of the same class raises the same exception
+    again without making any request.
+
+    The cache holds at most `max_size` failures; when full, the oldest
+    failures are forgotten first.
+
+    """
+
+    statuses = (httplib.NOT_FOUND, httplib.FORBIDDEN, httplib.GONE)
+
+    def __init__(self, ttl=30, max_size=1000):
+        """Sets how long failures are remembered and how many to remember.
+
+        Optional parameter `ttl` is the number of seconds to remember each
+        failure. Optional parameter `max_size` is the most failures to
+        remember at once.
+
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._failures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, cls, url, exc):
+        """Remembers that requesting `url` as a `cls` instance failed with
+        the exception `exc`."""
+        key = (cls, url)
+        expires = time.time() + self.ttl
+        self._lock.acquire()
+        try:
+            self._failures.pop(key, None)
+            self._failures[key] = (type(exc), exc.args, expires)
+            while len(self._failures) > self.max_size:
+                self._failures.popitem(last=False)
+        finally:
+            self._lock.release()
+
+    def discard(self, cls, url):
+        """Forgets any failure remembered for requesting `url` as a `cls`
+        instance."""
+        self._lock.acquire()
+        try:
+            self._failures.pop((cls, url), None)
+        finally:
+            self._lock.release()
+
+    def check(self, cls, url):
+        """Raises the exception remembered for requesting `url` as a `cls`
+        instance, if there is one that has not expired."""
+        if not self._failures:
+            return
+        key = (cls, url)
+        self._lock.acquire()
+        try:
+            try:
+                exc_type, args, expires = self._failures[key]
+            except KeyError:
+                return
+            if expires <= time.time():
+                del self._failures[key]
+                return
+        finally:
+            self._lock.release()
+        raise exc_type(*args)
+
+    def clear(self):
+        """Forgets all the remembered failures."""
+        self._lock.acquire()
+        try:
+            self._failures.clear()
+        finally:
+            self._lock.release()
+
+    def __len__(self):
+        return len(self._failures)
+
+
+class CacheEntry(object):
+
+    """The data of a delivered `PromiseObject` kept in an `ObjectCache`,
+    along with the validators and freshness information of the response it
+    came from."""
+
+    __slots__ = ('data', 'etag', 'info', 'refreshing')
+
+    def __init__(self, data, etag, info):
+        self.data = data
+        self.etag = etag
+        self.info = info
+        self.refreshing = False
+
+
+class ObjectCache(object):
+
+    """A cache of the data of delivered `PromiseObject` instances.
+
+    Set an `ObjectCache` as the `object_cache` of a `PromiseObject` class to
+    keep the data of its delivered instances, keyed by class and URL. While
+    the response the data came from is still fresh (as described by its
+    caching headers), instances promised for the same URL are delivered from
+    the cache without making a request.
+
+    If the cache has a `grace` period, stale data is served too, for up to
+    `grace` seconds after it stops being fresh: the instance is delivered
+    immediately, and a conditional request to bring it up to date is made in
+    the background on the cache's `executor`. When that request finishes,
+    the new data is swapped into both the cache and the instance at once,
+    unless the instance has been changed since it was delivered (see
+    `revalidate()`).
+
+    Only responses that say how long they stay fresh are cached. The cache
+    holds at most `max_size` entries; when full, the least recently used
+    entries are dropped first.
+
+    """
+
+    def __init__(self, max_size=1000, grace=0, executor=None, shared=None):
+        """Sets the size of the cache and how long to serve stale data.
+
+        Optional parameter `grace` is the number of seconds past its freshness
+        lifetime to keep serving data while it's refreshed. Optional parameter
+        `executor` is the `remoteobjects.futures.Executor` on which to make
+        the refresh requests; if not given, one with two worker threads is
+        made when first needed.
+
+        Optional parameter `shared` is a `SharedStore` through which to share
+        cached data with other processes on the same host. Data another
+        process delivered is then used as if this cache had kept it.
+
+        """
+        self.max_size = max_size
+        self.grace = grace
+        self.executor = executor
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, cls, url):
+        """Returns the `CacheEntry` for `url` as a `cls` instance, or `None`
+        if there is none."""
+        key = (cls, url)
+        self._lock.acquire()
+        try:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+                return entry
+        finally:
+            self._lock.release()
+
+        if self.shared is None:
+            return None
+        value = self.shared.get(self.shared_key(key))
+        if value is None:
+            return None
+        try:
+            obj = codec.loads(value, cls)
+            entry = CacheEntry(obj.__dict__['api_data'],
+                getattr(obj, '_etag', None), obj._response_info)
+        except Exception:
+            log.exception('Could not load shared cache entry for %s %s',
+                cls.__name__, url)
+            return None
+        self._put(key, entry, share=False)
+        return entry
+
+    def shared_key(self, key):
+        """Returns the key in the `shared` store for the ``(cls, url)`` pair
+        `key`."""
+        cls, url = key
+        return '%s.%s %s' % (cls.__module__, cls.__name__, url)
+
+    def store(self, obj):
+        """Keeps the data of the delivered `PromiseObject` instance `obj`,
+        returning its new `CacheEntry`, or `None` if its data can't be
+        cached."""
+        info = obj._response_info
+        if info is None or not info.lifetime:
+            return None
+        entry = CacheEntry(obj.copy_api_data(),
+            getattr(obj, '_etag', None), info)
+        self._put((type(obj), obj._location), entry)
+        return entry
+
+    def _put(self, key, entry, share=True):
+        self._lock.acquire()
+        try:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        finally:
+            self._lock.release()
+
+        if share and self.shared is not None:
+            cls, url = key
+            obj = cls()
+            obj.replace_api_data(entry.data)
+            obj._location = url
+            obj._etag = entry.etag
+            obj._response_info = entry.info
+            self.shared.set(self.shared_key(key), codec.dumps(obj))
+
+    def discard(self, cls, url):
+        """Drops any cached data for `url` as a `cls` instance."""
+        self._lock.acquire()
+        try:
+            self._entries.pop((cls, url), None)
+        finally:
+            self._lock.release()
+        if self.shared is not None:
+            self.shared.delete(self.shared_key((cls, url)))
+
+    def clear(self):
+        """Drops all the cached data, including any in the `shared` store."""
+        self._lock.acquire()
+        try:
+            self._entries.clear()
+        finally:
+            self._lock.release()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def servable(self, entry, now=None):
+        """Returns whether `entry` is fresh, or stale but still within the
+        cache's grace period."""
+        if entry is None:
+            return False
+        if now is None:
+            now = time.time()
+        return entry.info.current_age(now) < entry.info.lifetime + self.grace
+
+    def deliver(self, obj):
+        """Delivers the undelivered `PromiseObject` instance `obj` from the
+        cache, if it can be, returning whether it was.
+
+        If the cached data is stale, a background refresh of it is started.
+
+        """
+        entry = self.lookup(type(obj), obj._location)
+        now = time.time()
+        if not self.servable(entry, now):
+            return False
+
+        obj.replace_api_data(copy_data(entry.data))
+        obj._etag = entry.etag
+        obj._response_info = entry.info
+        obj._delivered = True
+
+        if not entry.info.is_fresh(now):
+            self.revalidate(obj, entry)
+        return True
+
+    def revalidate(self, obj, entry):
+        """Starts a background request to bring the cached `entry` for the
+        `PromiseObject` instance `obj` up to date, unless one is already in
+        progress.
+
+        The resource is requested conditionally on the entry's validators,
+        with the user agent of one of the executor's worker threads. If it
+        has changed, the new data replaces the entry and, if `obj` is still
+        in use, the data of `obj` too.
+
+        The data of `obj` is replaced only if it has no local changes: if a
+        field of `obj` (or of an object decoded from it) has been set or
+        deleted, or its API data has been changed in place, `obj` keeps its
+        data, so a later `put()` doesn't silently lose those changes. Only
+        the cache entry is updated then.
+
+        """
+        self._lock.acquire()
+        try:
+            if entry.refreshing:
+                return
+            entry.refreshing = True
+            executor = self.executor
+            if executor is None:
+                executor = self.executor = Executor(workers=2)
+        finally:
+            self._lock.release()
+
+        cls, url, projection = type(obj), obj._location, obj.projection
+        ref = weakref.ref(obj)
+
+        def refresh():
+            try:
+                self._refresh(cls, url, projection, entry, ref,
+                    executor.http())
+            finally:
+                entry.refreshing = False
+
+        executor.submit(refresh)
+
+    def _refresh(self, cls, url, projection, entry, ref, http):
+        headers = {}
+        if entry.etag is not None:
+            headers['if-none-match'] = entry.etag
+        if entry.info.last_modified is not None:
+            headers['if-modified-since'] = entry.info.last_modified
+
+        fresh = cls()
+        if projection != cls.projection:
+            fresh.projection = projection
+        request = fresh.get_request(url=url, headers=headers)
+        try:
+            response, content = remoteobjects.http.send_request(http, request)
+            if response.status == httplib.NOT_MODIFIED:
+                info = remoteobjects.http.ResponseInfo.from_response(response)
+                info.etag = info.etag or entry.etag
+                info.last_modified = (info.last_modified
+                    or entry.info.last_modified)
+                self._put((cls, url), CacheEntry(entry.data, info.etag, info))
+                obj = ref()
+                if obj is not None:
+                    obj._response_info = info
+                return
+            fresh.update_from_get(url, response, content)
+        except cls.NotFound:
+            self.discard(cls, url)
+            return
+        except Exception:
+            log.exception('Could not refresh cached %s %s', cls.__name__, url)
+            return
+
+        if self.store(fresh) is None:
+            self.discard(cls, url)
+        obj = ref()
+        if obj is not None:
+            self._swap(obj, entry.data, fresh)
+
+    def _swap(self, obj, delivered, fresh):
+        if _changed(obj) or obj.__dict__.get('api_data') != delivered:
+            log.debug('Not refreshing %r, which has local changes', obj)
+            return
+        state = dict(obj.__dict__)
+        for name in obj.fields:
+            state.pop(name, None)
+        state.pop('_fingerprint', None)
+        state['api_data'] = fresh.__dict__['api_data']
+        state['_etag'] = getattr(fresh, '_etag', None)
+        state['_response_info'] = fresh._response_info
+        # Replace the instance's data in one step, so code using it never
+        # sees a mix of old and new data. Check once more for a field set on
+        # another thread while the new state was made.
+        if not obj.__dict__.get('_modified'):
+            obj.__dict__ = state
+
+
+def _changed(value):
+    """Returns whether `value`, or any `DataObject` instance in it, has had
+    fields set or deleted since it was last updated from new data."""
+    if isinstance(value, DataObject):
+        attrs = value.__dict__
+        if attrs.get('_modified'):
+            return True
+        return any(_changed(attrs[name]) for name in value.fields
+            if name in attrs)
+    if isinstance(value, (list, tuple)):
+        return any(_changed(item) for item in value)
+    if isinstance(value, dict):
+        return any(_changed(item) for item in value.itervalues())
+    return False
+
+
+class SharedStore(object):
+
+    """A cache store shared by all the processes on a host.
+
+    Each value is kept in its own file in the store's directory, by default
+    in shared memory under ``/dev/shm`` where that is available. Values are
+    written to temporary files and renamed into place, so reading never
+    sees a partly written value and needs no lock; writers take an
+    exclusive ``flock`` on the store's lock file, so they are safe to use
+    from many processes (such as the workers of a prefork server) at once.
+
+    The store holds at most `max_entries` values. When it's full, the values
+    least recently read or written are removed first.
+
+    A `SharedStore` has the same `get()`, `set()` and `delete()` methods as
+    an `httplib2` cache, so it can also be given as the `cache` of an
+    `httplib2.Http` user agent to share validated response bodies, as well
+    as the `shared` store of an `ObjectCache` to share decoded data.
+
+    """
+
+    def __init__(self, path=None, max_entries=1000):
+        """Sets up a store in the directory `path`, creating the directory
+        if necessary.
+
+        If optional parameter `path` is not given, a directory named for the
+        current user (``remoteobjects-cache-<uid>``) in ``/dev/shm`` (or, if
+        there is none, the system's temporary directory) is used. Processes
+        using the same `path` share the same store.
+
+        As only the current user's processes should share the store, the
+        directory must belong to the current user and be closed to everyone
+        else; otherwise `OSError` is raised. `ImportError` is raised on
+        platforms without the `fcntl` module.
+
+        """
+        if fcntl is None:
+            raise ImportError('SharedStore requires file locking through the'
+                ' fcntl module')
+        if path is None:
+            root = '/dev/shm'
+            if not os.path.isdir(root):
+                root = tempfile.gettempdir()
+            path = os.path.join(root, 'remoteobjects-cache-%d' % os.getuid())
+        try:
+            os.makedirs(path, 0700)
+        except OSError, exc:
+            if exc.errno != errno.EEXIST:
+                raise
+        # Another user could have made the directory first, so don't use one
+        # that isn't ours alone.
+        info = os.lstat(path)
+        if not stat.S_ISDIR(info.st_mode):
+            raise OSError(errno.ENOTDIR, 'Shared store path is not a'
+                ' directory', path)
+        if info.st_uid != os.getuid():
+            raise OSError(errno.EPERM, 'Shared store directory belongs to'
+                ' another user', path)
+        if info.st_mode & 077:
+            raise OSError(errno.EPERM, 'Shared store directory is open to'
+                ' other users', path)
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._lockfile = None
+        self._pid = None
+
+    def filename(self, key):
+        """Returns the path of the file holding the value for `key`."""
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        return os.path.join(self.path, hashlib.md5(key).hexdigest())
+
+    def get(self, key):
+        """Returns the value stored for `key`, or `None` if there is none."""
+        filename = self.filename(key)
+        try:
+            f = open(filename, 'rb')
+        except IOError:
+            return None
+        try:
+            value = f.read()
+        finally:
+            f.close()
+        try:
+            # Mark the value as recently used.
+            os.utime(filename, None)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value):
+        """Stores `value`, a string, for `key`."""
+        fd, tmpname = tempfile.mkstemp(prefix='.', dir=self.path)
+        try:
+            os.write(fd, value)
+        finally:
+            os.close(fd)
+
+        self.acquire()
+        try:
+            os.rename(tmpname, self.filename(key))
+            self.evict()
+        finally:
+            self.release()
+
+    def delete(self, key):
+        """Removes any value stored for `key`."""
+        self.acquire()
+        try:
+            try:
+                os.unlink(self.filename(key))
+            except OSError:
+                pass
+        finally:
+            self.release()
+
+    def clear(self):
+        """Removes all the values in the store."""
+        self.acquire()
+        try:
+            for name in self.names():
+                try:
+                    os.unlink(os.path.join(self.path, name))
+                except OSError:
+                    pass
+        finally:
+            self.release()
+
+    def names(self):
+        # Skip the lock file and any temporary files.
+        return [name for name in os.listdir(self.path)
+            if not name.startswith('.')]
+
+    def evict(self):
+        """Removes the least recently used values until the store holds no
+        more than `max_entries` values.
+
+        Call `evict()` only while holding the store's lock.
+
+        """
+        names = self.names()
+        excess = len(names) - self.max_entries
+        if excess <= 0:
+            return
+
+        used = []
+        for name in names:
+            filename = os.path.join(self.path, name)
+            try:
+                used.append((os.stat(filename).st_mtime, filename))
+            except OSError:
+                pass
+        used.sort()
+        for mtime, filename in used[:excess]:
+            try:
+                os.unlink(filename)
+            except OSError:
+                pass
+
+    def acquire(self):
+        """Takes the store's lock, excluding writers in other processes and
+        threads."""
+        self._lock.acquire()
+        try:
+            # Locks taken through a file opened before a fork would be shared
+            # with the forked process, so each process opens its own.
+            if self._pid != os.getpid():
+                self._lockfile = open(os.path.join(self.path, '.lock'), 'a')
+                self._pid = os.getpid()
+            fcntl.flock(self._lockfile.fileno(), fcntl.LOCK_EX)
+        except:
+            self._lock.release()
+            raise
+
+    def release(self):
+        """Releases the store's lock."""
+        try:
+            fcntl.flock(self._lockfile.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._lock.release()
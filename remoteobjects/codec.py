@@ -0,0 +1,237 @@
+"""
+
+`remoteobjects.codec` encodes `DataObject` instances in a compact binary
+form, for keeping them in caches and other stores.
+
+Pickling a `DataObject` stores its whole `api_data` dictionary, key names
+and all, along with any field values already decoded from it. The codec
+instead stores the data of each object as a tuple of values in the order of
+its class's fields, with the list of field names (the *schema*) stored only
+once for all the objects of that class in the encoded value. This is
+especially compact for list objects, whose many entries all share one
+schema. Field values that were decoded are stored in their encoded forms, to
+be decoded again only when used.
+
+As the schema is stored with the data, encoded values stay readable after
+fields are added to or removed from a class: data for unknown fields is
+kept in the decoded instance's `api_data` as usual, and new fields are
+missing from it as they would be from an older API response.
+
+Values are encoded with the `marshal` module, and by default compressed with
+`zlib`, which costs little time to decompress and makes repeated values in
+lists of objects nearly free. Only decode values from stores you trust.
+
+"""
+
+from itertools import izip
+import marshal
+import sys
+import zlib
+
+import remoteobjects.dataobject
+import remoteobjects.fields
+from remoteobjects.http import ResponseInfo
+
+
+VERSION = 2
+
+# Marks a field with no value in an object's data.
+MISSING = Ellipsis
+
+OBJECT, LIST, DICT = range(3)
+
+
+def schema(cls):
+    """Returns the schema for the `DataObject` class `cls`.
+
+    The schema is a tuple of the names of the class's fields in the API data,
+    in order, and a tuple of ``(index, kind, cls)`` triples for the fields
+    that hold nested `DataObject` instances.
+
+    """
+    # Fields may refer to classes by name, so the schema is good only until
+    # another class is declared.
+    generation = remoteobjects.dataobject.registry_generation
+    try:
+        schema_generation, result = cls.__dict__['_codec_schema']
+    except KeyError:
+        pass
+    else:
+        if schema_generation == generation:
+            return result
+
+    fields = sorted(cls.fields.itervalues(), key=lambda f: f.api_name)
+    names = tuple(f.api_name for f in fields)
+    nested = []
+    for i, field in enumerate(fields):
+        if isinstance(field, remoteobjects.fields.Object):
+            nested.append((i, OBJECT, field.cls))
+        elif (isinstance(field, remoteobjects.fields.List)
+              and isinstance(field.fld, remoteobjects.fields.Object)):
+            if isinstance(field, remoteobjects.fields.Dict):
+                nested.append((i, DICT, field.fld.cls))
+            else:
+                nested.append((i, LIST, field.fld.cls))
+
+    result = (names, tuple(nested))
+    # Keep the schema on the class itself, not inherited by subclasses.
+    setattr(cls, '_codec_schema', (generation, result))
+    return result
+
+
+def dumps(obj, compress=True):
+    """Returns the `DataObject` instance `obj` encoded as a string.
+
+    If optional parameter `compress` is false, the encoded value is not
+    compressed, making it larger but a little faster to decode.
+
+    """
+    cls = type(obj)
+    state = obj.__getstate__()
+    data = state.pop('api_data', None) or {}
+
+    # Store any decoded field values in their encoded forms.
+    changed = False
+    for attrname, field in cls.fields.iteritems():
+        value = state.pop(attrname, None)
+        if value is None:
+            continue
+        if not changed:
+            data = dict(data)
+            changed = True
+        data[field.api_name] = field.encode(value)
+
+    # Store response information separately, so other state is never
+    # mistaken for it.
+    infos = {}
+    for name, value in state.items():
+        if isinstance(value, ResponseInfo):
+            infos[name] = value.__getstate__()
+            del state[name]
+
+    # Classes that can't be found again by module and name (such as those
+    # declared in functions) are stored by bare name, to be given to
+    # `loads()`.
+    name = cls.__name__
+    if getattr(sys.modules.get(cls.__module__), name, None) is cls:
+        name = '%s.%s' % (cls.__module__, name)
+
+    table = ([], {})
+    root = _encode_object(cls, data, table)
+    value = marshal.dumps((VERSION, name, tuple(table[0]), root, state,
+        infos), 2)
+    if compress:
+        value = zlib.compress(value, 1)
+    return value
+
+
+def _encode_object(cls, data, table):
+    names, nested = schema(cls)
+    schemas, ids = table
+    entry = (names, tuple((i, kind) for i, kind, nested_cls in nested))
+    try:
+        sid = ids[entry]
+    except KeyError:
+        sid = ids[entry] = len(schemas)
+        schemas.append(entry)
+
+    values = [data.get(name, MISSING) for name in names]
+    for i, kind, nested_cls in nested:
+        value = values[i]
+        if kind == OBJECT:
+            if isinstance(value, dict):
+                values[i] = _encode_object(nested_cls, value, table)
+        elif kind == LIST:
+            if isinstance(value, list):
+                values[i] = [_encode_object(nested_cls, v, table)
+                    if isinstance(v, dict) else v for v in value]
+        elif isinstance(value, dict):
+            values[i] = dict((k, _encode_object(nested_cls, v, table)
+                if isinstance(v, dict) else v) for k, v in value.iteritems())
+
+    while values and values[-1] is MISSING:
+        values.pop()
+
+    if len(data) > len(values):
+        extras = dict((k, v) for k, v in data.iteritems() if k not in names)
+    else:
+        extras = None
+    return (sid, tuple(values), extras or None)
+
+
+def loads(value, cls=None):
+    """Decodes a string from `dumps()` into a new `DataObject` instance.
+
+    Optional parameter `cls` is the class of the new instance. If not given,
+    the class is found by the module and name of the encoded object's class,
+    so it must be importable from its module; pass `cls` for classes that
+    aren't (such as classes declared inside functions).
+
+    """
+    # Marshaled tuples start with "(", but zlib streams with "x".
+    if value[:1] == 'x':
+        value = zlib.decompress(value)
+    version = marshal.loads(value)[0]
+    if version != VERSION:
+        raise ValueError('Cannot decode object encoded with codec version %r'
+            % (version,))
+    version, name, schemas, root, state, infos = marshal.loads(value)
+    if cls is None:
+        cls = find_class(name)
+
+    self = cls()
+    self.replace_api_data(_decode_object(root, schemas))
+    self.__dict__.update(state)
+    for name, value in infos.iteritems():
+        info = ResponseInfo.__new__(ResponseInfo)
+        info.__setstate__(value)
+        self.__dict__[name] = info
+    return self
+
+
+def find_class(name):
+    """Returns the class with the name `name`, as stored by `dumps()`.
+
+    The class's module is imported if necessary. Raises `ValueError` if
+    there is no such class in its module.
+
+    """
+    modulename, _, classname = name.rpartition('.')
+    if not modulename:
+        raise ValueError('Cannot find class %s to decode outside its module;'
+            ' pass the class to loads() instead' % (name,))
+    try:
+        __import__(modulename)
+        return getattr(sys.modules[modulename], classname)
+    except (ImportError, KeyError, AttributeError):
+        raise ValueError('Cannot find class %s to decode; pass the class to'
+            ' loads() instead' % (name,))
+
+
+def _decode_object(value, schemas):
+    sid, values, extras = value
+    names, nested = schemas[sid]
+    data = dict(izip(names, values))
+    if MISSING in values:
+        for name, v in izip(names, values):
+            if v is MISSING:
+                del data[name]
+    if extras is not None:
+        data.update(extras)
+
+    count = len(values)
+    for i, kind in nested:
+        if i >= count:
+            break
+        v = values[i]
+        if kind == OBJECT:
+            if isinstance(v, tuple):
+                data[names[i]] = _decode_object(v, schemas)
+        elif kind == LIST:
+            if isinstance(v, list):
+                data[names[i]] = [_decode_object(x, schemas)
+                    if isinstance(x, tuple) else x for x in v]
+        elif isinstance(v, dict):
+            data[names[i]] = dict((k, _decode_object(x, schemas)
+                if isinstance(x, tuple) else x) for k, x in v.iteritems())
+    return data
@@ -12,14 +12,113 @@ declared on `DataObject` subclasses. `Field` classes reside in the
 
 
 from copy import deepcopy
+import hashlib
 import logging
+import weakref
 
 import remoteobjects.fields
+from remoteobjects.lazy import LazyModule
+import remoteobjects.memory
+import remoteobjects.tracing
+
+
+json = LazyModule('simplejson')
 
 
 classes_by_name = {}
 classes_by_constant_field = {}
 
+# Incremented whenever a class is registered, so lookups of classes by name
+# can be cached until the registry changes.
+registry_generation = 0
+
+
+# Implementations of `__init__()` and `update_from_dict()` whose effects on a
+# new instance `DataObject.from_dict()` may reproduce without calling them.
+stock_methods = set()
+
+# Types of instance attribute values new instances can share.
+_immutable_types = (type(None), bool, int, long, float, str, unicode, tuple)
+
+
+def stock_method(func):
+    """Marks `func` as an `__init__()` or `update_from_dict()` implementation
+    that `DataObject.from_dict()` may skip calling.
+
+    A stock `__init__()` must only set instance attributes from its keyword
+    arguments and constant values, and a stock `update_from_dict()` must
+    only replace the instance's API data (and clear any decoded field
+    values). Returns `func`, so `stock_method` can be used as a decorator.
+
+    """
+    stock_methods.add(func)
+    return func
+
+
+def constant_key(value):
+    """Returns the key under which a `Constant` field's `value` is indexed.
+
+    Lists (as decoded from JSON arrays) are indexed as tuples, so they can be
+    used as dictionary keys. Other values are indexed as they are.
+
+    """
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+def unique(objs):
+    """Returns a list of the `DataObject` instances in `objs`, leaving out
+    any equivalent to an instance earlier in the list.
+
+    Instances are compared by `DataObject.fingerprint()`, so no fields are
+    decoded to compare them. Instances whose data differs only in how it's
+    represented (such as ``1`` and ``1.0``) are both kept.
+
+    """
+    seen = set()
+    result = []
+    for obj in objs:
+        key = (type(obj), obj.fingerprint())
+        if key not in seen:
+            seen.add(key)
+            result.append(obj)
+    return result
+
+
+def adopt(owner, value):
+    """Links the `DataObject` instances in `value`, a value of one of
+    `owner`'s fields, to `owner`.
+
+    Changing a linked instance makes `owner` forget its fingerprint too. If
+    `owner` is frozen, the instances in `value` are frozen instead.
+
+    """
+    if isinstance(value, DataObject):
+        if owner._frozen:
+            value.freeze()
+        else:
+            value.__dict__['_owner'] = weakref.ref(owner)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            adopt(owner, item)
+    elif isinstance(value, dict):
+        for item in value.itervalues():
+            adopt(owner, item)
+
+
+def objects_in(value):
+    """Returns a list of the `DataObject` instances in the field value
+    `value`: the value itself, if it's a `DataObject` instance, or the
+    `DataObject` members of a list, tuple or dictionary."""
+    if isinstance(value, DataObject):
+        return [value]
+    if isinstance(value, (list, tuple)):
+        return [v for v in value if isinstance(v, DataObject)]
+    if isinstance(value, dict):
+        return [v for v in value.itervalues() if isinstance(v, DataObject)]
+    return []
+
 
 def find_by_name(name):
     """Finds and returns the DataObject subclass with the given name.
@@ -31,6 +130,33 @@ def find_by_name(name):
     return classes_by_name[name]
 
 
+_scalar_types = (basestring, int, long, float, bool)
+
+
+def copy_data(data, omit_nulls=False):
+    """Returns a deep copy of the given decoded JSON data.
+
+    Dictionaries and lists are copied recursively; other values, being
+    immutable JSON scalars, are shared with the original. Values of any
+    other type are copied with `copy.deepcopy()`.
+
+    If optional parameter `omit_nulls` is true, dictionary members whose
+    values are `None` are left out of the copy as it's made, so the result
+    needs no further pass to strip them.
+
+    """
+    if isinstance(data, dict):
+        if omit_nulls:
+            return dict((k, copy_data(v, True)) for k, v in data.iteritems()
+                if v is not None)
+        return dict((k, copy_data(v)) for k, v in data.iteritems())
+    if isinstance(data, list):
+        return [copy_data(v, omit_nulls) for v in data]
+    if data is None or isinstance(data, _scalar_types):
+        return data
+    return deepcopy(data)
+
+
 class DataObjectMetaclass(type):
     """Metaclass for `DataObject` classes.
 
@@ -74,7 +200,9 @@ class DataObjectMetaclass(type):
             obj_cls.add_to_class(field, value)
 
         # Register the new class so Object fields can have forward-referenced it.
+        global registry_generation
         classes_by_name[name] = obj_cls
+        registry_generation += 1
 
         # Tell this class's fields what this class is, so they can find their
         # forward references later.
@@ -108,12 +236,27 @@ class DataObject(object):
     A DataObject's fields then provide the coding between live DataObject
     instances and dictionaries.
 
+    Normally, a field value decoded from an instance's API data is kept
+    alongside the API data it was decoded from. Set a DataObject class's
+    `release_decoded` attribute to true to instead drop the API data for
+    each field as it's decoded, when the decoded value is a different
+    object. This saves memory for long-lived instances (especially those
+    with nested `Object` fields), at the cost of encoding the values again
+    when the instance is encoded with `to_dict()`.
+
     """
 
     __metaclass__ = DataObjectMetaclass
 
+    release_decoded = False
+
+    _frozen = False
+
+    @stock_method
     def __init__(self, **kwargs):
         """Initializes a new `DataObject` with the given field values."""
+        if remoteobjects.memory.tracking:
+            remoteobjects.memory.track(self)
         self.api_data = {}
         self.__dict__.update(kwargs)
 
@@ -123,9 +266,14 @@ class DataObject(object):
         If the `DataObject` instances are of the same type and contain the
         same data in all their fields, the objects are equivalent.
 
+        If both instances are frozen (see `freeze()`), they are compared by
+        fingerprint instead, without decoding any fields.
+
         """
         if type(self) != type(other):
             return False
+        if self._frozen and other._frozen:
+            return self.fingerprint() == other.fingerprint()
         for k, v in self.fields.iteritems():
             if isinstance(v, remoteobjects.fields.Field):
                 if getattr(self, k) != getattr(other, k):
@@ -141,6 +289,106 @@ class DataObject(object):
         """
         return not self == other
 
+    def __hash__(self):
+        """Returns a hash of a frozen `DataObject` instance's fingerprint.
+
+        Instances that are not frozen (see `freeze()`) can change, so they
+        are hashed by identity.
+
+        """
+        if self._frozen:
+            return hash(self.fingerprint())
+        return id(self)
+
+    def fingerprint(self):
+        """Returns a digest of the content of this `DataObject` instance's
+        fields.
+
+        The fingerprint is computed from the instance's API data for each
+        field, or from the encoded field value if the field has a value
+        (whether decoded or explicitly set), so computing it decodes nothing.
+        Instances of the same class with the same field content have the same
+        fingerprint.
+
+        The fingerprint is kept until a field of the instance, or of an
+        object decoded from it, is set or deleted, or one of them is updated
+        from new data. Changes made to the API data or to decoded lists and
+        dictionaries directly are not noticed, so `freeze()` instances whose
+        fingerprints should last.
+
+        """
+        try:
+            return self.__dict__['_fingerprint']
+        except KeyError:
+            pass
+
+        api_data = self.api_data
+        content = []
+        for field in self.fields.itervalues():
+            value = self.__dict__.get(field.attrname)
+            if value is not None:
+                value = field.encode(value)
+            elif field.api_name in api_data:
+                value = api_data[field.api_name]
+            else:
+                continue
+            content.append((field.api_name, value))
+        content.sort()
+
+        digest = hashlib.md5(json.dumps(content, sort_keys=True,
+            separators=(',', ':'), default=repr)).digest()
+        self.__dict__['_fingerprint'] = digest
+        for field in self.fields.itervalues():
+            if field.attrname in self.__dict__:
+                adopt(self, self.__dict__[field.attrname])
+        return digest
+
+    def freeze(self):
+        """Makes this `DataObject` instance immutable through its fields, so
+        it can be hashed by its `fingerprint()`.
+
+        Setting or deleting a field of a frozen instance, or updating it with
+        new data, raises an `AttributeError`. Objects decoded from a frozen
+        instance are frozen too. Frozen instances can be used as dictionary
+        keys and set members, where equivalent instances are deduplicated by
+        fingerprint without decoding their fields.
+
+        Returns the instance.
+
+        """
+        if self._frozen:
+            return self
+        self.fingerprint()
+        self._frozen = True
+        for field in self.fields.itervalues():
+            if field.attrname in self.__dict__:
+                adopt(self, self.__dict__[field.attrname])
+        return self
+
+    def _before_change(self):
+        """Prepares this instance for a change to its field content,
+        forgetting its fingerprint.
+
+        Raises `AttributeError` if the instance is frozen.
+
+        Setting or deleting a field also marks the instance as having local
+        changes (with a true ``_modified`` attribute) until it's next updated
+        from new data.
+
+        """
+        if self._frozen:
+            raise AttributeError('Cannot change frozen %s instance %r'
+                % (type(self).__name__, self))
+        self.__dict__.pop('_fingerprint', None)
+        # The objects this instance was decoded from change with it.
+        owner = self.__dict__.get('_owner')
+        while owner is not None:
+            obj = owner()
+            if obj is None or obj._frozen:
+                break
+            obj.__dict__.pop('_fingerprint', None)
+            owner = obj.__dict__.get('_owner')
+
     @classmethod
     def statefields(cls):
         return cls.fields.keys() + ['api_data']
@@ -149,22 +397,95 @@ class DataObject(object):
         return dict((k, self.__dict__[k]) for k in self.statefields()
             if k in self.__dict__)
 
-    def to_dict(self):
-        """Encodes the DataObject to a dictionary."""
-        data = deepcopy(self.api_data)
-        for field_name, field in self.fields.iteritems():
-            value = getattr(self, field.attrname, None)
-            if value is not None:
-                data[field.api_name] = field.encode(value)
+    def to_dict(self, omit_nulls=False):
+        """Encodes the DataObject to a dictionary.
+
+        If optional parameter `omit_nulls` is true, members of the API data
+        with `None` values are omitted from the result at any depth, including
+        in the data encoded for nested `DataObject` instances. (Fields whose
+        values are `None` are never encoded.)
+
+        """
+        span = remoteobjects.tracing.begin('to_dict', type(self).__name__)
+        try:
+            data = copy_data(self.api_data, omit_nulls)
+            encode_value = remoteobjects.fields.encode_value
+            for field_name, field in self.fields.iteritems():
+                value = getattr(self, field.attrname, None)
+                if value is not None:
+                    data[field.api_name] = encode_value(field, value,
+                        omit_nulls)
+            return data
+        finally:
+            remoteobjects.tracing.end(span)
+
+    def copy_api_data(self):
+        """Returns a copy of this DataObject's API data.
+
+        Any API data released for decoded field values (see
+        `release_decoded`) is encoded again from those values.
+
+        """
+        data = copy_data(self.api_data)
+        if self.release_decoded:
+            for field in self.fields.itervalues():
+                if field.api_name in data:
+                    continue
+                value = self.__dict__.get(field.attrname)
+                if value is not None:
+                    data[field.api_name] = field.encode(value)
         return data
 
     @classmethod
     def from_dict(cls, data):
-        """Decodes a dictionary into a new `DataObject` instance."""
-        self = cls()
-        self.update_from_dict(data)
+        """Decodes a dictionary into a new `DataObject` instance.
+
+        If the class's `__init__()` and `update_from_dict()` methods are both
+        stock implementations (see `stock_method()`), the new instance is
+        made in one step from a copy of the attributes a new instance starts
+        with, instead of by calling those methods.
+
+        """
+        try:
+            template = cls.__dict__['_from_dict_template']
+        except KeyError:
+            template = cls._compile_from_dict_template()
+        if template is None:
+            self = cls()
+            self.update_from_dict(data)
+            return self
+
+        if not isinstance(data, dict):
+            raise TypeError
+        if cls.release_decoded:
+            # Released values are removed, so don't remove the caller's.
+            data = dict(data)
+        self = object.__new__(cls)
+        if remoteobjects.memory.tracking:
+            remoteobjects.memory.track(self)
+        self.__dict__.update(template)
+        self.__dict__['api_data'] = data
         return self
 
+    @classmethod
+    def _compile_from_dict_template(cls):
+        template = None
+        if (cls.__init__.im_func in stock_methods
+            and cls.update_from_dict.im_func in stock_methods):
+            state = dict(cls().__dict__)
+            state.pop('api_data', None)
+            # New instances can share only values that can't be changed in
+            # place.
+            for value in state.itervalues():
+                if not isinstance(value, _immutable_types):
+                    break
+            else:
+                template = state
+        # Keep the template on the class itself, not inherited by subclasses.
+        setattr(cls, '_from_dict_template', template)
+        return template
+
+    @stock_method
     def update_from_dict(self, data):
         """Adds the content of a dictionary to this DataObject.
 
@@ -180,12 +501,34 @@ class DataObject(object):
         """
         if not isinstance(data, dict):
             raise TypeError
+        self._before_change()
+        self.__dict__.pop('_modified', None)
         # Clear any local instance field data
         for k in self.fields.iterkeys():
             if k in self.__dict__:
                 del self.__dict__[k]
+        if self.release_decoded:
+            # Released values are removed, so don't remove the caller's.
+            data = dict(data)
         self.api_data = data
 
+    def replace_api_data(self, data):
+        """Replaces this DataObject's API data with the dictionary `data`,
+        clearing any field values decoded from the old data.
+
+        Unlike `update_from_dict()`, `data` is used exactly as given, so use
+        this to copy in the `api_data` of another instance of the same class
+        (such as from a cache).
+
+        """
+        self._before_change()
+        self.__dict__.pop('_modified', None)
+        for k in self.fields.iterkeys():
+            if k in self.__dict__:
+                del self.__dict__[k]
+        # Update the instance directly, so properties can't intervene.
+        self.__dict__['api_data'] = data
+
     @classmethod
     def subclass_with_constant_field(cls, fieldname, value):
         """Returns the closest subclass of this class that has a `Constant`
@@ -209,13 +552,64 @@ class DataObject(object):
         subclasses will be returned, but which subclass is not defined.
 
         """
+        api_name, table = cls.constant_field_table(fieldname)
         try:
-            clsname = classes_by_constant_field[fieldname][tuple(value)]
-        except KeyError:
+            return table[constant_key(value)]
+        except (KeyError, TypeError):
             # No matching classes, then.
             pass
-        else:
-            return find_by_name(clsname)
 
         raise ValueError('No such subclass of %s with field %r equivalent to %r'
             % (cls.__name__, fieldname, value))
+
+    @classmethod
+    def constant_field_table(cls, fieldname):
+        """Returns the table of this class's subclasses by the values of their
+        `Constant` fields named `fieldname`.
+
+        The result is a tuple of the API name of the `Constant` field and a
+        dictionary mapping the fields' values (as keyed by `constant_key()`)
+        to the leafmost subclasses of `cls` declaring them. `cls` itself is
+        included if it declares such a field.
+
+        The table is built once and kept on the class until another
+        `DataObject` class is declared, so it can be used to pick the class
+        of each object in a large list cheaply.
+
+        """
+        generation = registry_generation
+        tables = cls.__dict__.get('_constant_field_tables')
+        if tables is None:
+            tables = {}
+            # Keep the tables on the class itself, not inherited by
+            # subclasses.
+            setattr(cls, '_constant_field_tables', tables)
+        try:
+            table_generation, result = tables[fieldname]
+        except KeyError:
+            pass
+        else:
+            if table_generation == generation:
+                return result
+
+        api_name, table = None, {}
+        field = cls.fields.get(fieldname)
+        if field is not None:
+            api_name = field.api_name
+        for subcls in classes_by_name.values():
+            if not issubclass(subcls, cls):
+                continue
+            field = subcls.fields.get(fieldname)
+            if not isinstance(field, remoteobjects.fields.Constant):
+                continue
+            if api_name is None:
+                api_name = field.api_name
+            key = constant_key(field.value)
+            # Prefer the leafmost class when subclasses share a value.
+            other = table.get(key)
+            if other is None or issubclass(subcls, other):
+                table[key] = subcls
+
+        result = (api_name or fieldname, table)
+        tables[fieldname] = (generation, result)
+        return result
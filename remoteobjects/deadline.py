@@ -0,0 +1,120 @@
+"""
+
+`remoteobjects.deadline` bounds how long `RemoteObject` requests may take.
+
+A `Deadline` is a point in time by which some work must be done. Deadlines
+can be given to individual requests (as the `timeout` parameters of methods
+such as `HttpObject.get()`), or set for all the requests made in a block of
+code by using a `Deadline` as a context manager:
+
+>>> with Deadline(2.5):
+...     entries = Timeline.get(url).entries
+
+When a deadline passes, requests that have not been made yet fail
+immediately, requests in progress time out, and pending background requests
+are cancelled. In all these cases a `DeadlineExceeded` exception is raised.
+
+Deadlines set as context managers apply only to the thread that set them.
+Operations that use worker threads, such as `HttpObject.post_many()` and
+eager `PromiseObject` instances, carry the deadline over to their workers.
+
+"""
+
+import socket
+import threading
+import time
+
+
+class DeadlineExceeded(socket.timeout):
+    """An exception raised when a request cannot be finished before its
+    deadline.
+
+    As a subclass of `socket.timeout`, `DeadlineExceeded` can be caught along
+    with the timeouts raised by the underlying user agent.
+
+    """
+    pass
+
+
+_local = threading.local()
+
+
+def current():
+    """Returns the earliest `Deadline` set for the calling thread, or `None`
+    if no deadline is set."""
+    stack = getattr(_local, 'stack', None)
+    if not stack:
+        return None
+    return stack[-1]
+
+
+def effective(*timeouts):
+    """Returns the `Deadline` that applies to an operation with the given
+    timeouts in the calling thread.
+
+    Each of `timeouts` may be a number of seconds from now, a `Deadline`
+    instance, or `None`. The result is whichever is earliest of those
+    deadlines and the calling thread's `current()` deadline, or `None` if
+    none of them are set.
+
+    """
+    deadline = current()
+    for timeout in timeouts:
+        if timeout is None:
+            continue
+        if not isinstance(timeout, Deadline):
+            timeout = Deadline(timeout)
+        if deadline is None or timeout.expires < deadline.expires:
+            deadline = timeout
+    return deadline
+
+
+class Deadline(object):
+
+    """A point in time by which some work must be done.
+
+    Use a `Deadline` as a context manager to apply it to all the requests
+    made in a block of code. Nested deadlines can only shorten the time
+    available, never extend it.
+
+    """
+
+    def __init__(self, timeout):
+        """Sets the deadline to `timeout` seconds from now."""
+        self.expires = time.time() + timeout
+
+    def remaining(self):
+        """Returns the number of seconds left before the deadline, or 0 if it
+        has passed."""
+        return max(0.0, self.expires - time.time())
+
+    def expired(self):
+        """Returns whether the deadline has passed."""
+        return time.time() >= self.expires
+
+    def check(self, what='Operation'):
+        """Raises `DeadlineExceeded` if the deadline has passed. Otherwise,
+        returns the number of seconds left."""
+        remaining = self.expires - time.time()
+        if remaining <= 0:
+            raise DeadlineExceeded('%s exceeded its deadline by %.3fs'
+                % (what, -remaining))
+        return remaining
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        # Keep the earliest deadline on top of the stack.
+        if stack and stack[-1].expires < self.expires:
+            stack.append(stack[-1])
+        else:
+            stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _local.stack.pop()
+        return False
+
+    def __repr__(self):
+        return '<%s expires=%r>' % (type(self).__name__, self.expires)
@@ -15,6 +15,8 @@ import time
 import urlparse
 
 import remoteobjects.dataobject
+import remoteobjects.stats
+import remoteobjects.tracing
 
 
 class Property(object):
@@ -108,24 +110,47 @@ class Field(Property):
             return self
 
         if self.attrname not in obj.__dict__:
+            api_data = obj.api_data
             try:
-                value = obj.api_data[self.api_name]
+                raw = api_data[self.api_name]
             except KeyError:
                 if callable(self.default):
                     value = self.default(obj)
                 else:
                     value = self.default
             else:
-                value = self.decode(value)
+                if remoteobjects.stats.enabled:
+                    value = remoteobjects.stats.record_decode(self, obj, raw)
+                elif remoteobjects.tracing.enabled:
+                    value = self.traced_decode(obj, raw)
+                else:
+                    value = self.decode(raw)
+                if obj.release_decoded and value is not raw:
+                    # Don't keep both the raw and decoded values.
+                    del api_data[self.api_name]
             # Store the value so we need decode it only once.
             obj.__dict__[self.attrname] = value
+            if '_fingerprint' in obj.__dict__ or '_owner' in obj.__dict__:
+                remoteobjects.dataobject.adopt(obj, value)
 
         return obj.__dict__[self.attrname]
 
+    def traced_decode(self, obj, raw):
+        """Decodes `raw` as for `decode()`, recording the decoding as a span
+        in the current `remoteobjects.tracing.Trace` for `obj`'s field."""
+        return remoteobjects.tracing.call('decode', '%s.%s'
+            % (type(obj).__name__, self.attrname), self.decode, raw)
+
     def __set__(self, obj, value):
+        obj._before_change()
+        obj.__dict__['_modified'] = True
         obj.__dict__[self.attrname] = value
+        if '_owner' in obj.__dict__:
+            remoteobjects.dataobject.adopt(obj, value)
 
     def __delete__(self, obj):
+        obj._before_change()
+        obj.__dict__['_modified'] = True
         # Delete both the instance and API data, so we'll get a real
         # attribute miss next time and return the field's default.
         try:
@@ -161,6 +186,20 @@ class Field(Property):
         return value
 
 
+def encode_value(field, value, omit_nulls=False):
+    """Encodes the attribute value `value` through the field `field`.
+
+    If optional parameter `omit_nulls` is true, `None` members of any
+    dictionaries encoded for nested `DataObject` instances are left out, as
+    for `DataObject.to_dict()`.
+
+    """
+    value = field.encode(value)
+    if omit_nulls and isinstance(field, (List, Object)):
+        value = remoteobjects.dataobject.copy_data(value, omit_nulls=True)
+    return value
+
+
 class Constant(Field):
 
     """A field for data that always has a certain value for all instances of
@@ -195,7 +234,8 @@ class Constant(Field):
         attrname, value = self.attrname, self.value
         if attrname not in cf:
             cf[attrname] = dict()
-        cf[attrname][value] = cls.__name__
+        key = remoteobjects.dataobject.constant_key(value)
+        cf[attrname][key] = cls.__name__
 
     def __get__(self, obj, cls):
         if obj is None:
@@ -284,7 +324,7 @@ class Object(Field):
 
     """A field representing a nested `DataObject`."""
 
-    def __init__(self, cls, **kwargs):
+    def __init__(self, cls, discriminator=None, **kwargs):
         """Sets the the `DataObject` class the field represents.
 
         Parameter `cls` is the `DataObject` class representing the nested
@@ -297,18 +337,39 @@ class Object(Field):
         another module will make all name-based `Object` fields reference the
         new subclass.
 
+        Optional parameter `discriminator` is the attribute name of a
+        `Constant` field declared on subclasses of `cls`. If given, each
+        nested object is decoded as the subclass whose `Constant` field has
+        the value found in the object's data, or as `cls` itself if no
+        subclass matches. (See `DataObject.constant_field_table()`.)
+
         """
         super(Object, self).__init__(**kwargs)
         self.cls = cls
+        self.discriminator = discriminator
 
     def get_cls(self):
         cls = self.__dict__['cls']
-        if not callable(cls):
-            cls = remoteobjects.dataobject.find_by_name(cls)
-        return cls
+        if callable(cls):
+            return cls
+
+        # Look the class up again only if another class has been declared
+        # since, as it may be a leafier subclass with the same name.
+        generation = remoteobjects.dataobject.registry_generation
+        try:
+            resolved_generation, resolved = self.__dict__['_resolved']
+        except KeyError:
+            pass
+        else:
+            if resolved_generation == generation:
+                return resolved
+        resolved = remoteobjects.dataobject.find_by_name(cls)
+        self.__dict__['_resolved'] = (generation, resolved)
+        return resolved
 
     def set_cls(self, cls):
         self.__dict__['cls'] = cls
+        self.__dict__.pop('_resolved', None)
 
     cls = property(get_cls, set_cls)
 
@@ -319,7 +380,20 @@ class Object(Field):
             if callable(self.default):
                 return self.default()
             return self.default
-        return self.cls.from_dict(value)
+        return self.cls_for(value).from_dict(value)
+
+    def cls_for(self, value):
+        """Returns the `DataObject` class the dictionary value `value` is
+        decoded as, picked by the field's `discriminator` if it has one."""
+        cls = self.cls
+        if self.discriminator is not None:
+            api_name, table = cls.constant_field_table(self.discriminator)
+            try:
+                cls = table[remoteobjects.dataobject.constant_key(
+                    value[api_name])]
+            except (KeyError, TypeError):
+                pass
+        return cls
 
     def encode(self, value):
         """Encodes an instance of the field's DataObject class into its
@@ -0,0 +1,235 @@
+"""
+
+`remoteobjects.futures` provides a small pool of worker threads for making
+HTTP requests concurrently, and `Future` objects for collecting their
+results.
+
+The user agents `remoteobjects` uses (`httplib2.Http` instances) are not safe
+to share between threads, so each `Executor` worker thread makes its own user
+agent the first time one is asked for. By default these are copies of the
+default user agent (see `remoteobjects.http.new_user_agent()`), with the same
+credentials and cache. Pass an `http_factory` to an `Executor` to customize
+how those user agents are made.
+
+"""
+
+import Queue
+import sys
+import threading
+
+
+class CancelledError(Exception):
+    """An exception raised when getting the result of a `Future` that was
+    cancelled before it ran."""
+    pass
+
+
+class Future(object):
+
+    """The eventual result of a call run by an `Executor`.
+
+    A future that has not started running yet can be cancelled with
+    `cancel()`, in which case its call is never made.
+
+    """
+
+    PENDING, RUNNING, FINISHED, CANCELLED = range(4)
+
+    def __init__(self, fn, args=(), kwargs=None):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.state = self.PENDING
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._result = None
+        self._exc_info = None
+
+    def run(self):
+        """Runs the future's call in the current thread, recording its
+        return value or exception.
+
+        If the future has been cancelled, `run()` does nothing.
+
+        """
+        self._lock.acquire()
+        try:
+            if self.state != self.PENDING:
+                return
+            self.state = self.RUNNING
+        finally:
+            self._lock.release()
+
+        try:
+            self._result = self.fn(*self.args, **self.kwargs)
+        except Exception:
+            self._exc_info = sys.exc_info()
+        self.state = self.FINISHED
+        self._done.set()
+
+    def cancel(self):
+        """Cancels the future's call if it hasn't started running yet,
+        returning whether the future is now cancelled."""
+        self._lock.acquire()
+        try:
+            if self.state == self.PENDING:
+                self.state = self.CANCELLED
+                # Release anything the call would have used.
+                self.fn, self.args, self.kwargs = None, (), {}
+                self._done.set()
+            return self.state == self.CANCELLED
+        finally:
+            self._lock.release()
+
+    def cancelled(self):
+        """Returns whether the future was cancelled."""
+        return self.state == self.CANCELLED
+
+    def done(self):
+        """Returns whether the future's call has finished or was
+        cancelled."""
+        return self._done.isSet()
+
+    def wait(self, timeout=None):
+        """Waits for the future's call to finish, returning whether it did.
+
+        Optional parameter `timeout` is the longest time to wait in seconds.
+        If not given, `wait()` waits as long as it takes.
+
+        """
+        self._done.wait(timeout)
+        return self.done()
+
+    def exception(self, timeout=None):
+        """Returns the exception raised by the future's call, or `None` if it
+        returned normally."""
+        if not self.wait(timeout):
+            raise RuntimeError('Future %r is not done' % (self,))
+        if self.state == self.CANCELLED:
+            return CancelledError('Future %r was cancelled' % (self,))
+        if self._exc_info is None:
+            return None
+        return self._exc_info[1]
+
+    def result(self, timeout=None):
+        """Returns the value the future's call returned, first waiting for it
+        to finish if necessary.
+
+        If the call raised an exception, that exception is raised again from
+        `result()`. If the future was cancelled, `CancelledError` is raised.
+
+        """
+        if not self.wait(timeout):
+            raise RuntimeError('Future %r is not done' % (self,))
+        if self.state == self.CANCELLED:
+            raise CancelledError('Future %r was cancelled' % (self,))
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+
+class Executor(object):
+
+    """A pool of worker threads that run calls as `Future` instances.
+
+    Worker threads are started as calls are submitted, up to the executor's
+    `workers` count, and run as daemon threads so they never keep a process
+    alive.
+
+    """
+
+    def __init__(self, workers=4, http_factory=None, max_queue=0):
+        """Sets up an executor with at most `workers` threads.
+
+        Optional parameter `http_factory` is a callable that returns a new
+        user agent object, compatible with `httplib2.Http`, for each worker
+        thread. If not given, `remoteobjects.http.new_user_agent()` is used,
+        so workers use the same settings as the default user agent.
+
+        Optional parameter `max_queue` is the most calls that can be waiting
+        for a worker at once. When the queue is full, `submit()` waits for
+        room and `try_submit()` gives up. If not given, the queue is
+        unbounded.
+
+        """
+        self.workers = workers
+        self.http_factory = http_factory
+        self._queue = Queue.Queue(max_queue)
+        self._threads = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def http(self):
+        """Returns the user agent belonging to the calling thread, making a
+        new one if the thread has none yet."""
+        try:
+            return self._local.http
+        except AttributeError:
+            factory = self.http_factory
+            if factory is None:
+                from remoteobjects.http import new_user_agent as factory
+            http = self._local.http = factory()
+            return http
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedules `fn` to be called with the given arguments on one of the
+        executor's worker threads, returning a `Future` for its result."""
+        future = Future(fn, args, kwargs)
+        self._start_worker()
+        self._queue.put(future)
+        return future
+
+    def try_submit(self, fn, *args, **kwargs):
+        """Schedules `fn` as for `submit()`, unless the executor's queue is
+        full, in which case `try_submit()` returns `None` immediately."""
+        future = Future(fn, args, kwargs)
+        self._start_worker()
+        try:
+            self._queue.put_nowait(future)
+        except Queue.Full:
+            return None
+        return future
+
+    def map(self, fn, items):
+        """Schedules `fn` to be called with each of the given items, returning
+        a list of `Future` instances in the same order."""
+        return [self.submit(fn, item) for item in items]
+
+    def shutdown(self, wait=True):
+        """Stops the executor's worker threads once they've finished the
+        calls already submitted.
+
+        If optional parameter `wait` is true (as it is by default),
+        `shutdown()` returns only after the workers have stopped.
+
+        """
+        self._lock.acquire()
+        try:
+            threads, self._threads = self._threads, []
+        finally:
+            self._lock.release()
+        for thread in threads:
+            self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _start_worker(self):
+        if len(self._threads) >= self.workers:
+            return
+        self._lock.acquire()
+        try:
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work)
+                thread.setDaemon(True)
+                thread.start()
+                self._threads.append(thread)
+        finally:
+            self._lock.release()
+
+    def _work(self):
+        while True:
+            future = self._queue.get()
+            if future is None:
+                break
+            future.run()
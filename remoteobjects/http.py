@@ -1,28 +1,340 @@
-import simplejson as json
-from remoteobjects.json import ForgivingDecoder
-
-import httplib2
 import httplib
 import logging
+import socket
+import threading
+import time
+import weakref
 
-from remoteobjects.dataobject import DataObject, DataObjectMetaclass
+from remoteobjects.dataobject import (DataObject, DataObjectMetaclass,
+    stock_method)
 from remoteobjects import fields
+import remoteobjects.deadline
+from remoteobjects.lazy import LazyModule
+import remoteobjects.tracing
+
+
+json = LazyModule('simplejson')
+httplib2 = LazyModule('httplib2')
+forgiving_json = LazyModule('remoteobjects.json')
+email_utils = LazyModule('email.utils')
+
+
+class LazyUserAgent(object):
+
+    """A stand-in for the default user agent, which makes the real
+    `httplib2.Http` instance only when one of its attributes is first used.
+
+    Getting or setting an attribute of the stand-in (such as calling
+    ``remoteobjects.http.userAgent.add_credentials()``) uses the real user
+    agent's attribute, so the stand-in can be configured as the user agent
+    itself would be.
+
+    """
+
+    def __init__(self):
+        self.__dict__['_http'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def resolve(self):
+        """Returns the real user agent, making it if necessary."""
+        http = self._http
+        if http is None:
+            self._lock.acquire()
+            try:
+                if self._http is None:
+                    self.__dict__['_http'] = httplib2.Http()
+                http = self._http
+            finally:
+                self._lock.release()
+        return http
+
+    def __getattr__(self, attr):
+        return getattr(self.resolve(), attr)
 
-userAgent = httplib2.Http()
+    def __setattr__(self, attr, value):
+        setattr(self.resolve(), attr, value)
+
+    def __repr__(self):
+        return '<%s for %r>' % (type(self).__name__, self._http)
+
+
+# The default user agent, made when it's first used.
+userAgent = LazyUserAgent()
 
 log = logging.getLogger('remoteobjects.http')
 
 
+def user_agent():
+    """Returns the default user agent, making a new `httplib2.Http` instance
+    the first time it's needed.
+
+    Set `remoteobjects.http.userAgent` to use some other user agent by
+    default.
+
+    """
+    http = userAgent
+    if isinstance(http, LazyUserAgent):
+        return http.resolve()
+    return http
+
+
+def new_user_agent(http=None):
+    """Returns a new user agent with the same settings as the user agent
+    `http` (or the default user agent, if not given), for making requests
+    from another thread.
+
+    User agents are not safe to share between threads, so worker threads
+    (such as those of a `remoteobjects.futures.Executor`) each use their own.
+    If the user agent is an `httplib2.Http` instance, the new one has the
+    same credentials, certificates, cache and other settings, but its own
+    connections. Other kinds of user agent can't be copied, so they are
+    returned as they are, and must be safe to use from many threads.
+
+    """
+    if http is None:
+        http = user_agent()
+    elif isinstance(http, LazyUserAgent):
+        http = http.resolve()
+    if not isinstance(http, httplib2.Http):
+        return http
+    new = httplib2.Http()
+    settings = dict(http.__dict__)
+    # Connections and the authorizations negotiated over them belong to each
+    # user agent.
+    settings.pop('connections', None)
+    settings.pop('authorizations', None)
+    new.__dict__.update(settings)
+    return new
+
+
 def omit_nulls(data):
-    """Strips `None` values from a dictionary or `RemoteObject` instance."""
+    """Strips `None` values from a dictionary or `RemoteObject` instance.
+
+    This is the lenient `default` hook used when encoding request bodies:
+    `DataObject` instances are encoded with `to_dict()`, and objects that
+    aren't otherwise serializable are encoded as their string forms.
+
+    """
+    if isinstance(data, DataObject):
+        return data.to_dict(omit_nulls=True)
     if not isinstance(data, dict):
         if not hasattr(data, '__dict__'):
             return str(data)
-        data = dict(data.__dict__)
-    for key in data.keys():
-        if data[key] is None:
-            del data[key]
-    return data
+        data = data.__dict__
+    return dict((k, v) for k, v in data.iteritems() if v is not None)
+
+
+def refuse_unknown(data):
+    """Refuses to encode an object that is not natively serializable as JSON.
+
+    This is the strict `default` hook used when encoding request bodies for
+    `HttpObject` classes with `encode_strictly` set.
+
+    """
+    if isinstance(data, DataObject):
+        return data.to_dict(omit_nulls=True)
+    raise TypeError('%r is not JSON serializable' % (data,))
+
+
+def send_request(http, request, timeout=None):
+    """Makes an HTTP request with the given user agent, within the deadline
+    for the request.
+
+    Parameter `http` is the user agent to use, or `None` to use the default
+    user agent. Parameter `request` is a dictionary of keyword arguments for
+    the user agent's `request()` method, as returned from
+    `HttpObject.get_request()`.
+
+    Optional parameter `timeout` is the deadline for the request, as a number
+    of seconds or a `remoteobjects.deadline.Deadline` instance. If there is
+    also a deadline set for the calling thread, the earlier of the two
+    applies. If the deadline has already passed, the request is not made; for
+    `httplib2.Http` user agents, the time remaining is also used as the
+    connection and read timeouts. In either case, a
+    `remoteobjects.deadline.DeadlineExceeded` exception is raised if the
+    deadline passes.
+
+    As the timeouts are set on the `httplib2.Http` user agent itself for the
+    length of the request, requests through the same `httplib2.Http` instance
+    are made one at a time, even from different threads. Give each thread its
+    own user agent (see `new_user_agent()`) to make requests concurrently.
+
+    Returns the user agent's ``(response, content)`` result.
+
+    """
+    if http is None:
+        http = user_agent()
+    deadline = remoteobjects.deadline.effective(timeout)
+    what = 'Request for %s' % (request.get('uri'),)
+    if deadline is not None:
+        deadline.check(what)
+    if not isinstance(http, httplib2.Http):
+        return _request(http, request)
+
+    lock = _agent_lock(http)
+    lock.acquire()
+    try:
+        if deadline is None:
+            return _request(http, request)
+
+        # Waiting for the user agent may have used up the deadline.
+        remaining = deadline.check(what)
+        old_timeout = http.timeout
+        set_timeout(http, remaining)
+        try:
+            return _request(http, request)
+        except socket.timeout:
+            raise remoteobjects.deadline.DeadlineExceeded('%s timed out' % what)
+        finally:
+            set_timeout(http, old_timeout)
+    finally:
+        lock.release()
+
+
+def _request(http, request):
+    return remoteobjects.tracing.call('http.request', request.get('uri'),
+        http.request, **request)
+
+
+_agent_locks = weakref.WeakKeyDictionary()
+_agent_locks_lock = threading.Lock()
+
+
+def _agent_lock(http):
+    _agent_locks_lock.acquire()
+    try:
+        lock = _agent_locks.get(http)
+        if lock is None:
+            lock = _agent_locks[http] = threading.Lock()
+        return lock
+    finally:
+        _agent_locks_lock.release()
+
+
+def set_timeout(http, timeout):
+    """Sets the connection and read timeout of the `httplib2.Http` instance
+    `http`, including for its already open connections."""
+    http.timeout = timeout
+    for conn in http.connections.values():
+        conn.timeout = timeout
+        if getattr(conn, 'sock', None) is not None:
+            conn.sock.settimeout(timeout)
+
+
+def parse_http_date(value):
+    """Returns the timestamp for an HTTP date header value, or `None` if the
+    value is not a valid date."""
+    if value is None:
+        return None
+    parsed = email_utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    try:
+        return email_utils.mktime_tz(parsed)
+    except (OverflowError, ValueError):
+        return None
+
+
+class ResponseInfo(object):
+
+    """A compact record of the HTTP response from which a `RemoteObject`
+    instance was last updated.
+
+    `ResponseInfo` records only what is needed to revalidate the instance and
+    make freshness decisions about it, not the full response:
+
+    * `status`, the HTTP status code of the response
+    * `etag` and `last_modified`, the validators for the resource
+    * `lifetime`, the freshness lifetime of the response in seconds, or
+      `None` if the response did not specify one
+    * `age`, the age of the response in seconds when it was received
+    * `fetched`, the timestamp when the response was received
+
+    """
+
+    __slots__ = ('status', 'etag', 'last_modified', 'lifetime', 'age',
+                 'fetched')
+
+    def __init__(self, status, etag=None, last_modified=None, lifetime=None,
+                 age=0, fetched=None):
+        self.status = status
+        self.etag = etag
+        self.last_modified = last_modified
+        self.lifetime = lifetime
+        self.age = age
+        if fetched is None:
+            fetched = time.time()
+        self.fetched = fetched
+
+    @classmethod
+    def from_response(cls, response, now=None):
+        """Makes a `ResponseInfo` from an `httplib2.Response` instance.
+
+        The freshness lifetime is taken from the ``max-age`` directive of the
+        ``Cache-Control`` header if there is one, or else from the ``Expires``
+        and ``Date`` headers. Responses marked ``no-cache`` or ``no-store``
+        have a lifetime of 0.
+
+        """
+        if now is None:
+            now = time.time()
+        date = parse_http_date(response.get('date'))
+
+        lifetime = None
+        directives = {}
+        for directive in response.get('cache-control', '').split(','):
+            name, _, value = directive.strip().partition('=')
+            directives[name.lower()] = value.strip().strip('"')
+        if 'no-store' in directives or 'no-cache' in directives:
+            lifetime = 0
+        elif 'max-age' in directives:
+            try:
+                lifetime = int(directives['max-age'])
+            except ValueError:
+                lifetime = 0
+        elif 'expires' in response:
+            expires = parse_http_date(response['expires'])
+            if expires is None:
+                # Invalid Expires values mean "already expired."
+                lifetime = 0
+            else:
+                lifetime = max(0, expires - (date or now))
+
+        try:
+            age = max(0, int(response.get('age', 0)))
+        except ValueError:
+            age = 0
+        if date is not None:
+            age = max(age, now - date)
+
+        return cls(status=response.status, etag=response.get('etag'),
+            last_modified=response.get('last-modified'), lifetime=lifetime,
+            age=age, fetched=now)
+
+    def current_age(self, now=None):
+        """Returns the age of the response in seconds as of now (or optional
+        timestamp `now`)."""
+        if now is None:
+            now = time.time()
+        return self.age + max(0, now - self.fetched)
+
+    def is_fresh(self, now=None):
+        """Returns whether the response is still fresh as of now (or optional
+        timestamp `now`)."""
+        if self.lifetime is None:
+            return False
+        return self.current_age(now) < self.lifetime
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return '<%s status=%r etag=%r lifetime=%r>' % (type(self).__name__,
+            self.status, self.etag, self.lifetime)
 
 
 class HttpObject(DataObject):
@@ -47,6 +359,14 @@ class HttpObject(DataObject):
 
     content_types = ('application/json',)
 
+    encode_strictly = False
+
+    batch_strategy = None
+
+    negative_cache = None
+
+    _response_info = None
+
     class NotFound(httplib.HTTPException):
         """An HTTPException thrown when the server reports that the requested
         resource was not found."""
@@ -107,13 +427,26 @@ class HttpObject(DataObject):
         non-success HTTP response."""
         pass
 
+    class Gone(NotFound, BadResponse):
+        """A `NotFound` exception thrown when the server reports that the
+        requested resource was deliberately removed.
+
+        This exception corresponds to the HTTP status code 410. As such
+        responses used to be reported as `BadResponse` exceptions, `Gone` is
+        also a `BadResponse`.
+
+        """
+        pass
+
+    @stock_method
     def __init__(self, **kwargs):
         self._location = None
         super(HttpObject, self).__init__(**kwargs)
 
     @classmethod
     def statefields(cls):
-        return super(HttpObject, cls).statefields() + ['_location', '_etag']
+        return super(HttpObject, cls).statefields() + ['_location', '_etag',
+            '_response_info']
 
     def get_request(self, url=None, headers=None, **kwargs):
         """Returns the parameters for requesting this `RemoteObject` instance
@@ -137,6 +470,21 @@ class HttpObject(DataObject):
         request.update(kwargs)
         return request
 
+    def encode_body(self):
+        """Returns this `RemoteObject` instance encoded as a request body.
+
+        The instance is encoded in one pass with `to_dict()`, leaving out any
+        `None` values. Values `to_dict()` leaves that can't be serialized as
+        JSON are encoded as strings, unless the class's `encode_strictly`
+        attribute is true, in which case a `TypeError` is raised instead.
+
+        """
+        if self.encode_strictly:
+            default = refuse_unknown
+        else:
+            default = omit_nulls
+        return json.dumps(self.to_dict(omit_nulls=True), default=default)
+
     @classmethod
     def raise_for_response(cls, url, response, content):
         """Raises exceptions corresponding to invalid HTTP responses that
@@ -152,6 +500,8 @@ class HttpObject(DataObject):
         classname = cls.__name__
         if response.status == httplib.NOT_FOUND:
             raise cls.NotFound('No such %s %s' % (classname, url))
+        if response.status == httplib.GONE:
+            raise cls.Gone('%s %s is gone' % (classname, url))
         if response.status == httplib.UNAUTHORIZED:
             raise cls.Unauthorized('Not authorized to fetch %s %s' % (classname, url))
         if response.status == httplib.FORBIDDEN:
@@ -167,7 +517,9 @@ class HttpObject(DataObject):
             # Pull out an error if we can.
             content_type = response.get('content-type', '').split(';', 1)[0].strip()
             if content_type == 'text/plain':
-                error = content.split('\n', 2)[0]
+                # Copy only the first line, not the whole body.
+                end = content.find('\n')
+                error = content if end == -1 else content[:end]
                 exc = err_cls('%d %s requesting %s %s: %s'
                     % (response.status, response.reason, classname, url,
                        error))
@@ -223,44 +575,135 @@ class HttpObject(DataObject):
         instance is updated as well.
 
         """
-        self.raise_for_response(url, response, content)
+        span = None
+        if remoteobjects.tracing.enabled:
+            span = remoteobjects.tracing.begin('update_from_response',
+                '%s %s' % (type(self).__name__, url))
+        try:
+            remoteobjects.tracing.call('raise_for_response', url,
+                self.raise_for_response, url, response, content)
 
+            self.update_from_dict(remoteobjects.tracing.call('json.loads', url,
+                forgiving_json.forgiving_loads, content))
+
+            location_header = self.location_headers.get(response.status)
+            if location_header is None:
+                self._location = url
+            else:
+                self._location = response[location_header.lower()]
+
+            if 'etag' in response:
+                self._etag = response['etag']
+
+            self._response_info = ResponseInfo.from_response(response)
+        finally:
+            remoteobjects.tracing.end(span)
+
+    def update_from_get(self, url, response, content):
+        """Updates this `RemoteObject` instance from the response to a ``GET``
+        request for `url`, as with `update_from_response()`.
+
+        If the class has a `negative_cache`, failures it remembers (such as
+        for ``404 Not Found`` responses) are recorded there, and a successful
+        response makes it forget any failure for `url`. Responses to other
+        requests, such as a ``POST`` to a collection, say nothing about
+        requesting the URL, so only responses to ``GET`` requests should be
+        given to `update_from_get()`.
+
+        """
+        cache = self.negative_cache
+        if cache is None:
+            return self.update_from_response(url, response, content)
         try:
-            data = json.loads(content)
-        except UnicodeDecodeError:
-            data = json.loads(content, cls=ForgivingDecoder)
+            self.update_from_response(url, response, content)
+        except Exception, exc:
+            if response.status in cache.statuses:
+                cache.add(type(self), url, exc)
+            raise
+        if len(cache):
+            cache.discard(type(self), url)
 
-        self.update_from_dict(data)
+    def is_fresh(self, now=None):
+        """Returns whether this `RemoteObject` instance's data is still fresh
+        according to the caching headers of the response it came from.
 
-        location_header = self.location_headers.get(response.status)
-        if location_header is None:
-            self._location = url
-        else:
-            self._location = response[location_header.lower()]
+        Instances that were not updated from a response, or whose responses
+        did not say how long they would stay fresh, are not fresh.
+
+        """
+        info = self._response_info
+        return info is not None and info.is_fresh(now)
+
+    def refresh(self, http=None, timeout=None):
+        """Brings this `RemoteObject` instance up to date with its remote
+        resource, unless its data is still fresh.
+
+        The resource is requested conditionally on the validators (``ETag``
+        and ``Last-Modified``) of the response the instance was last updated
+        from. If the server reports the resource is not modified, only the
+        instance's freshness information is updated.
 
-        if 'etag' in response:
-            self._etag = response['etag']
+        Optional parameter `timeout` is the deadline for the request, as for
+        `send_request()`.
+
+        Returns whether the resource was requested.
+
+        """
+        if self.is_fresh():
+            return False
+        if getattr(self, '_location', None) is None:
+            raise ValueError('Cannot refresh %r with no URL to GET' % self)
+
+        headers = {}
+        info = self._response_info
+        etag = getattr(self, '_etag', None)
+        if etag is not None:
+            headers['if-none-match'] = etag
+        if info is not None and info.last_modified is not None:
+            headers['if-modified-since'] = info.last_modified
+
+        url = self._location
+        request = self.get_request(headers=headers)
+        response, content = send_request(http, request, timeout)
+
+        if response.status == httplib.NOT_MODIFIED:
+            new_info = ResponseInfo.from_response(response)
+            new_info.etag = new_info.etag or etag
+            if info is not None and new_info.last_modified is None:
+                new_info.last_modified = info.last_modified
+            self._response_info = new_info
+        else:
+            self.update_from_get(url, response, content)
+        return True
 
     @classmethod
-    def get(cls, url, http=None, **kwargs):
+    def get(cls, url, http=None, timeout=None, **kwargs):
         """Fetches a new `RemoteObject` instance from a URL.
 
         Parameter `url` is the URL from which the object should be requested.
         Optional parameter `http` is the user agent object to use for
         fetching. `http` should be compatible with `httplib2.Http` instances.
 
+        Optional parameter `timeout` is the deadline for the request, as a
+        number of seconds or a `remoteobjects.deadline.Deadline` instance. If
+        the deadline passes, `remoteobjects.deadline.DeadlineExceeded` is
+        raised.
+
+        If the class has a `negative_cache` that remembers a recent failure
+        requesting `url`, the same exception is raised again without making a
+        request.
+
         """
+        if cls.negative_cache is not None:
+            cls.negative_cache.check(cls, url)
         self = cls()
         request = self.get_request(url=url, **kwargs)
+        response, content = send_request(http, request, timeout)
 
-        if http is None:
-            http = userAgent
-        response, content = http.request(**request)
-
-        self.update_from_response(url, response, content)
+        self.update_from_get(url, response, content)
         return self
 
-    def post(self, obj, http=None):
+    def post(self, obj, http=None, timeout=None):
         """Add another `RemoteObject` to this remote resource through an HTTP
         ``POST`` request.
 
@@ -271,35 +714,156 @@ class HttpObject(DataObject):
         Optional parameter `http` is the user agent object to use for posting.
         `http` should be compatible with `httplib2.Http` objects.
 
+        Optional parameter `timeout` is the deadline for the request, as for
+        `get()`.
+
         """
         if getattr(self, '_location', None) is None:
             raise ValueError('Cannot add %r to %r with no URL to POST to'
                 % (obj, self))
 
-        body = json.dumps(obj.to_dict(), default=omit_nulls)
+        body = obj.encode_body()
 
         headers = {'content-type': self.content_types[0]}
 
         request = obj.get_request(url=self._location, method='POST',
             body=body, headers=headers)
-        if http is None:
-            http = userAgent
-        response, content = http.request(**request)
+        response, content = send_request(http, request, timeout)
 
         obj.update_from_response(self._location, response, content)
 
-    def put(self, http=None):
+    def post_many(self, objs, http=None, batch_size=100, strategy=None,
+            timeout=None):
+        """Add many `RemoteObject` instances to this remote resource.
+
+        Parameter `objs` is an iterable of `RemoteObject` instances to save to
+        this instance's resource. `objs` is consumed lazily, `batch_size`
+        instances at a time, and each instance is encoded only as its batch
+        is sent.
+
+        Optional parameter `strategy` is the batching strategy with which to
+        send each batch, such as a `remoteobjects.batch.ArrayBatch`,
+        `MultipartBatch`, or `ConcurrentBatch` instance. If not given, the
+        class's `batch_strategy` is used; if that is not set either, each
+        instance is posted with its own request, one after another, through
+        a `SequentialBatch`.
+
+        Optional parameter `http` is the user agent object to use for posting,
+        as for `post()`.
+
+        Each instance is updated from its own result, as with `post()`. An
+        exception for one instance does not stop the others from being
+        posted: the returned `remoteobjects.batch.BatchResult` instead
+        records the exception, such as one raised by `raise_for_response()`,
+        for each instance that failed.
+
+        Optional parameter `timeout` is the deadline for the whole operation,
+        as for `get()`. If the deadline passes before all the batches are
+        sent, `remoteobjects.deadline.DeadlineExceeded` is raised, with the
+        `BatchResult` for the instances already sent as its `result`
+        attribute.
+
+        """
+        if getattr(self, '_location', None) is None:
+            raise ValueError('Cannot add objects to %r with no URL to POST to'
+                % (self,))
+
+        return self._run_batches('post', objs, http, batch_size, strategy,
+            timeout, self)
+
+    @classmethod
+    def put_many(cls, objs, http=None, batch_size=100, strategy=None,
+            timeout=None):
+        """Save many previously requested `RemoteObject` instances back to
+        their remote resources, as with `put()`.
+
+        Each instance is saved with its own conditional ``PUT`` request,
+        carrying the instance's ETag in an ``If-Match`` header. The requests
+        are made through the class's `batch_strategy` (or optional parameter
+        `strategy`), by default a `remoteobjects.batch.SequentialBatch`; use
+        a `ConcurrentBatch` to make them concurrently. Parameters `objs`,
+        `http`, `batch_size` and `timeout` are as for `post_many()`.
+
+        An exception for one instance, such as `PreconditionFailed` for an
+        instance that has changed on the server, does not stop the others
+        from being saved. The returned `remoteobjects.batch.BatchResult`
+        records each instance's outcome, along with the overall throughput.
+
+        Strategies that can only post, such as `ArrayBatch` and
+        `MultipartBatch`, can't be used to save instances; if the strategy
+        has no `put()` method, a `TypeError` is raised before any request is
+        made.
+
+        """
+        return cls._run_batches('put', objs, http, batch_size, strategy,
+            timeout)
+
+    @classmethod
+    def delete_many(cls, objs, http=None, batch_size=100, strategy=None,
+            timeout=None):
+        """Delete the remote resources represented by many `RemoteObject`
+        instances, as with `delete()`.
+
+        As with `put_many()`, each instance is deleted with its own
+        conditional request, and the outcomes for all the instances are
+        returned in a `remoteobjects.batch.BatchResult`. A `TypeError` is
+        raised if the strategy has no `delete()` method.
+
+        """
+        return cls._run_batches('delete', objs, http, batch_size, strategy,
+            timeout)
+
+    @classmethod
+    def _run_batches(cls, method, objs, http, batch_size, strategy, timeout,
+                     *args):
+        from remoteobjects import batch
+
+        if strategy is None:
+            strategy = cls.batch_strategy
+        if strategy is None:
+            strategy = batch.SequentialBatch()
+        run = getattr(strategy, method, None)
+        if run is None:
+            raise TypeError('Batching strategy %r cannot %s %s instances'
+                % (strategy, method.upper(), cls.__name__))
+
+        result = batch.BatchResult()
+        deadline = remoteobjects.deadline.effective(timeout)
+        if deadline is None:
+            for objs in batch.batches(objs, batch_size):
+                result.add(objs, run(*(args + (objs, http))))
+            return result
+
+        # Apply the deadline to the strategy's requests, too.
+        deadline.__enter__()
+        try:
+            for objs in batch.batches(objs, batch_size):
+                try:
+                    deadline.check('%s of %s instances' % (method.upper(),
+                        cls.__name__))
+                except remoteobjects.deadline.DeadlineExceeded, exc:
+                    exc.result = result
+                    raise
+                result.add(objs, run(*(args + (objs, http))))
+        finally:
+            deadline.__exit__(None, None, None)
+        return result
+
+    def put(self, http=None, timeout=None):
         """Save a previously requested `RemoteObject` back to its remote
         resource through an HTTP ``PUT`` request.
 
         Optional `http` parameter is the user agent object to use. `http`
         objects should be compatible with `httplib2.Http` objects.
 
+        Optional parameter `timeout` is the deadline for the request, as for
+        `get()`.
+
         """
         if getattr(self, '_location', None) is None:
             raise ValueError('Cannot save %r with no URL to PUT to' % self)
 
-        body = json.dumps(self.to_dict(), default=omit_nulls)
+        body = self.encode_body()
 
         headers = {}
         if hasattr(self, '_etag') and self._etag is not None:
@@ -307,20 +871,21 @@ class HttpObject(DataObject):
         headers['content-type'] = self.content_types[0]
 
         request = self.get_request(method='PUT', body=body, headers=headers)
-        if http is None:
-            http = userAgent
-        response, content = http.request(**request)
+        response, content = send_request(http, request, timeout)
 
         log.debug('Yay saved my obj, now turning %r into new content', content)
         self.update_from_response(self._location, response, content)
 
-    def delete(self, http=None):
+    def delete(self, http=None, timeout=None):
         """Delete the remote resource represented by the `RemoteObject`
         instance through an HTTP ``DELETE`` request.
 
         Optional parameter `http` is the user agent object to use. `http`
         objects should be compatible with `httplib2.Http` objects.
 
+        Optional parameter `timeout` is the deadline for the request, as for
+        `get()`.
+
         """
         if getattr(self, '_location', None) is None:
             raise ValueError('Cannot delete %r with no URL to DELETE' % self)
@@ -330,9 +895,7 @@ class HttpObject(DataObject):
             headers['if-match'] = self._etag
 
         request = self.get_request(method='DELETE', headers=headers)
-        if http is None:
-            http = userAgent
-        response, content = http.request(**request)
+        response, content = send_request(http, request, timeout)
 
         self.raise_for_response(self._location, response, content)
 
@@ -1,9 +1,13 @@
+import simplejson
 from simplejson import JSONDecoder
 from simplejson.decoder import FLAGS, BACKSLASH, STRINGCHUNK, DEFAULT_ENCODING
 from simplejson.scanner import py_make_scanner
 import re
 
 
+NON_ASCII = re.compile(r'[\x80-\xff]')
+
+
 # Truly heinous... we are going to the trouble of reproducing this
 # entire routine, because we need to supply an errors="replace"
 # keyword argument at the point this function invokes unicode().
@@ -89,3 +93,20 @@ class ForgivingDecoder(JSONDecoder):
         super(ForgivingDecoder, self).__init__(*args, **kwargs)
         self.parse_string = forgiving_scanstring
         self.scan_once = py_make_scanner(self)
+
+
+def forgiving_loads(content):
+    """Decodes the JSON document `content`, replacing any invalid UTF-8
+    sequences in its strings with the Unicode Replacement Character.
+
+    The document is parsed only once. Byte strings that are plain ASCII are
+    parsed directly; other byte strings are decoded from UTF-8 once up front,
+    and only if that fails is the (much slower) `ForgivingDecoder` used.
+
+    """
+    if isinstance(content, str) and NON_ASCII.search(content) is not None:
+        try:
+            content = content.decode('utf-8')
+        except UnicodeDecodeError:
+            return simplejson.loads(content, cls=ForgivingDecoder)
+    return simplejson.loads(content)
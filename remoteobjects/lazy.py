@@ -0,0 +1,27 @@
+"""
+
+`remoteobjects.lazy` provides stand-ins for modules that are imported only
+when first used.
+
+The transport and JSON libraries are loaded this way, so importing
+`remoteobjects` stays cheap for programs that make few requests (or none).
+
+"""
+
+import sys
+
+
+class LazyModule(object):
+
+    """A stand-in for a module that is imported only when one of its
+    attributes is first used."""
+
+    def __init__(self, name):
+        self.__dict__['__name__'] = name
+
+    def __getattr__(self, attr):
+        name = self.__dict__['__name__']
+        __import__(name)
+        # Copy the module's contents, so later lookups don't come here.
+        self.__dict__.update(sys.modules[name].__dict__)
+        return getattr(sys.modules[name], attr)
@@ -1,7 +1,9 @@
 from urlparse import urljoin, urlparse, urlunparse
+from array import array
 import cgi
 import inspect
 import sys
+import threading
 import urllib
 
 import remoteobjects.fields as fields
@@ -50,9 +52,23 @@ class OfOf(type):
 
         attr['_subclasses'] = {}
         attr['_basemodule'] = None
+        # Guards making new subclasses, so each is made only once.
+        attr['_lock'] = threading.RLock()
 
         return type.__new__(cls, name, bases, attr)
 
+    def prepare(cls, *targets):
+        """Makes the subclasses for all the given targets ahead of time,
+        returning them in a list.
+
+        Each of `targets` is a class or class name, as for calling the
+        metaclass directly. Call this at startup, such as with
+        ``ListOf.prepare(Entry, 'Comment')``, so requests don't have to make
+        these classes when they're first used.
+
+        """
+        return [cls(target) for target in targets]
+
 
 class PageOf(PromiseObject.__metaclass__):
 
@@ -87,39 +103,62 @@ class PageOf(PromiseObject.__metaclass__):
         If only `name` is specified, that value is used as a reference to a
         `RemoteObject` class to which the new `PageObject` class is bound.
         The `name` parameter can be either a name or a `RemoteObject` class,
-        as when declaring a `remoteobjects.fields.Object` field.
+        as when declaring a `remoteobjects.fields.Object` field. A class is
+        bound as it is, while a name refers to whichever class has that name
+        when it's first used; ``PageOf('Entry')`` is the same class as
+        ``PageOf(Entry)`` if ``Entry`` is the class named ``Entry`` then.
 
         """
-        direct = attr is None
-        if direct:
-            # Don't bother making a new subclass if we already made one for
-            # this target.
-            if name in cls._subclasses:
-                return cls._subclasses[name]
-
-            entryclass = name
+        if attr is not None:
+            newcls = super(PageOf, cls).__new__(cls, name, bases, attr)
+            if cls._basemodule is None:
+                cls._basemodule = newcls
+            return newcls
+
+        entryclass = name
+        if not callable(entryclass):
+            # Names refer to the class with that name, so share its subclass.
+            try:
+                entryclass = find_by_name(name)
+            except KeyError:
+                pass
+
+        # Don't bother making a new subclass if we already made one for this
+        # target. Once made, subclasses are never replaced, so they can be
+        # looked up without the lock.
+        try:
+            return cls._subclasses[entryclass]
+        except KeyError:
+            pass
+
+        cls._lock.acquire()
+        try:
+            # Another thread may have made it while we waited.
+            try:
+                return cls._subclasses[entryclass]
+            except KeyError:
+                pass
+
             if callable(entryclass):
                 name = cls.__name__ + entryclass.__name__
             else:
                 name = cls.__name__ + entryclass
-
             bases = (cls._basemodule,)
 
             attr = {
                 'entries': fields.List(fields.Object(entryclass)),
             }
 
-        newcls = super(PageOf, cls).__new__(cls, name, bases, attr)
-
-        # Save the result for later direct invocations.
-        if direct:
-            cls._subclasses[entryclass] = newcls
+            newcls = super(PageOf, cls).__new__(cls, name, bases, attr)
             newcls.__module__ = cls._modulename
             setattr(sys.modules[cls._modulename], name, newcls)
-        elif cls._basemodule is None:
-            cls._basemodule = newcls
 
-        return newcls
+            # Save the result for later direct invocations, only once it's
+            # ready to use.
+            cls._subclasses[entryclass] = newcls
+            return newcls
+        finally:
+            cls._lock.release()
 
 
 class PageObject(PromiseObject, SequenceProxy):
@@ -180,6 +219,132 @@ class PageObject(PromiseObject, SequenceProxy):
         else:
             return getitem(key)
 
+    @classmethod
+    def projection_names(cls, projection):
+        """Returns the API names of the fields of the page's entry class with
+        the attribute names in `projection`.
+
+        A page's projection names the fields of its entries, not of the page
+        itself.
+
+        """
+        entry_field = getattr(cls.fields['entries'], 'fld', None)
+        if not isinstance(entry_field, fields.Object):
+            return list(projection)
+        entry_fields = entry_field.cls.fields
+        return [entry_fields[name].api_name if name in entry_fields else name
+            for name in projection]
+
+    @classmethod
+    def project_api_data(cls, data, api_names):
+        """Returns the API data `data` with only the values for the fields
+        with the API names `api_names` in each of its entries."""
+        api_name = cls.fields['entries'].api_name
+        if not isinstance(data, dict) or api_name not in data:
+            return data
+        data = dict(data)
+        data[api_name] = [dict((k, entry[k]) for k in api_names if k in entry)
+            if isinstance(entry, dict) else entry for entry in data[api_name]]
+        return data
+
+    def column(self, name, as_numpy=False):
+        """Returns the values of the field `name` of all the page's entries.
+
+        The values are read straight from the page's API data, decoded
+        through the entry class's field only, without making a `DataObject`
+        instance for each entry. (If the page's entries were already decoded,
+        their attribute values are used instead.) Each entry is read through
+        the field of the class it would be decoded as, so entries of
+        subclasses picked by the entries field's `discriminator` use their
+        own fields. Entries missing the field have the field's default value,
+        and entries whose class has no such field have `None`.
+
+        The values are returned as an `array.array` if they are all integers
+        (typecode ``l``) or all numbers (typecode ``d``), or as a list
+        otherwise. If optional parameter `as_numpy` is true, they are instead
+        returned as a NumPy array if NumPy is installed, or as a list if
+        not.
+
+        """
+        values = self._column_values(name)
+        if as_numpy:
+            try:
+                import numpy
+            except ImportError:
+                return values
+            return numpy.array(values)
+        return _compact(values)
+
+    def columns(self, *names, **kwargs):
+        """Returns a tuple of the columns of values of the named fields of
+        all the page's entries.
+
+        Each column is as returned by `column()`, which see. Optional keyword
+        parameter `as_numpy` is passed on to `column()` for each column.
+
+        """
+        return tuple(self.column(name, **kwargs) for name in names)
+
+    def _column_values(self, name):
+        if 'entries' in self.__dict__:
+            return [getattr(entry, name) if name in entry.fields else None
+                for entry in self.entries]
+
+        entries_field = type(self).fields['entries']
+        raw_entries = self.api_data.get(entries_field.api_name) or ()
+        entry_field = getattr(entries_field, 'fld', None)
+        if not isinstance(entry_field, fields.Object):
+            # Entries aren't objects, so read their dictionaries directly.
+            return [entry.get(name) for entry in raw_entries]
+
+        if entry_field.discriminator is None:
+            entry_cls = entry_field.cls
+            cls_for = lambda entry: entry_cls
+        else:
+            cls_for = entry_field.cls_for
+        # Look up the field once for each class the entries decode as.
+        readers = {}
+        values = []
+        append = values.append
+        for entry in raw_entries:
+            cls = cls_for(entry)
+            try:
+                field = readers[cls]
+            except KeyError:
+                field = readers[cls] = cls.fields.get(name)
+            if field is None:
+                append(None)
+                continue
+            try:
+                raw = entry[field.api_name]
+            except KeyError:
+                if callable(field.default):
+                    # Defaults get the instance they're for, so make one.
+                    append(getattr(cls.from_dict(entry), name))
+                else:
+                    append(field.default)
+            else:
+                append(field.decode(raw))
+        return values
+
+
+def _compact(values):
+    """Returns the list `values` as an `array.array` if it holds only
+    numbers, or `values` itself otherwise."""
+    typecode = 'l'
+    for value in values:
+        kind = type(value)
+        if kind is int or kind is long:
+            continue
+        if kind is float:
+            typecode = 'd'
+            continue
+        return values
+    try:
+        return array(typecode, values)
+    except OverflowError:
+        return values
+
 
 class ListOf(PageOf):
 
@@ -193,5 +358,5 @@ class ListObject(PageObject):
     def update_from_dict(self, data):
         super(ListObject, self).update_from_dict({ 'entries': data })
 
-    def to_dict(self):
-        return super(ListObject, self).to_dict()['entries']
+    def to_dict(self, omit_nulls=False):
+        return super(ListObject, self).to_dict(omit_nulls)['entries']
@@ -0,0 +1,224 @@
+"""
+
+`remoteobjects.memory` reports how much memory `DataObject` instances use,
+for sizing caches and finding waste.
+
+Use `report()` to measure the graph of instances reachable from some root
+instances (such as a delivered `PageObject` and the entry objects decoded
+from it):
+
+>>> print remoteobjects.memory.report([timeline]).format()
+
+The report breaks down the memory used by class, into the instances
+themselves, their raw API data, and the field values decoded from that data
+(beyond any API data values the fields used as they were). It also lists
+URLs for which more than one instance is alive, which are often instances
+that could be shared or cached.
+
+To measure all the instances an application has alive, call
+`start_tracking()` early on. Every `DataObject` instance made after that is
+tracked through a weak reference, and `report()` with no roots measures all
+the tracked instances still alive. Tracking costs a little time for every
+instance made, so it's off by default.
+
+Memory sizes are as reported by `sys.getsizeof()`, so they're estimates of
+the memory used by Python objects, not including allocator overhead.
+
+"""
+
+import sys
+import weakref
+
+import remoteobjects.dataobject
+
+
+# Whether new instances are being tracked.
+tracking = False
+
+_tracked = weakref.WeakSet()
+
+
+def start_tracking():
+    """Starts tracking every `DataObject` instance made from now on."""
+    global tracking
+    tracking = True
+
+
+def stop_tracking():
+    """Stops tracking new `DataObject` instances, and forgets those already
+    tracked."""
+    global tracking
+    tracking = False
+    _tracked.clear()
+
+
+def track(obj):
+    """Tracks the `DataObject` instance `obj` for `report()`."""
+    _tracked.add(obj)
+
+
+def tracked():
+    """Returns a list of the tracked `DataObject` instances still alive."""
+    return list(_tracked)
+
+
+def deep_size(value, seen=None):
+    """Returns the memory used by `value` and the dictionaries, lists,
+    tuples and sets it contains, in bytes.
+
+    Optional parameter `seen` is a set of the ids of objects already
+    measured, which are not measured again. The ids of the objects
+    measured are added to it.
+
+    """
+    if seen is None:
+        seen = set()
+    size = 0
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+        size += sys.getsizeof(value)
+        if isinstance(value, dict):
+            stack.extend(value.iterkeys())
+            stack.extend(value.itervalues())
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            stack.extend(value)
+    return size
+
+
+class ClassUsage(object):
+
+    """The memory used by the instances of one `DataObject` class.
+
+    `count` is the number of instances measured. `instances` is the memory
+    used by the instance objects and their attribute dictionaries, `raw` by
+    their API data, and `decoded` by their decoded field values and other
+    attributes. `total` is the sum of the three.
+
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.instances = 0
+        self.raw = 0
+        self.decoded = 0
+
+    @property
+    def total(self):
+        return self.instances + self.raw + self.decoded
+
+    def __repr__(self):
+        return '<%s %s count=%d total=%d>' % (type(self).__name__, self.name,
+            self.count, self.total)
+
+
+class MemoryReport(object):
+
+    """A report of the memory used by a graph of `DataObject` instances.
+
+    `classes` maps class names to `ClassUsage` instances, and `duplicates`
+    maps each URL for which more than one instance was found to the number
+    of such instances.
+
+    """
+
+    def __init__(self):
+        self.classes = {}
+        self.duplicates = {}
+
+    @property
+    def total(self):
+        """The total memory used by all the instances, in bytes."""
+        return sum(usage.total for usage in self.classes.itervalues())
+
+    @property
+    def count(self):
+        """The number of instances measured."""
+        return sum(usage.count for usage in self.classes.itervalues())
+
+    def format(self):
+        """Returns the report as a table of text, largest classes first."""
+        lines = ['%-30s %8s %12s %12s %12s %12s' % ('class', 'count',
+            'instances', 'raw', 'decoded', 'total')]
+        usages = sorted(self.classes.itervalues(), key=lambda u: -u.total)
+        for u in usages:
+            lines.append('%-30s %8d %12d %12d %12d %12d' % (u.name, u.count,
+                u.instances, u.raw, u.decoded, u.total))
+        lines.append('%-30s %8d %12s %12s %12s %12d' % ('(all)', self.count,
+            '', '', '', self.total))
+        if self.duplicates:
+            lines.append('')
+            lines.append('duplicate instances by URL:')
+            dups = sorted(self.duplicates.iteritems(),
+                key=lambda item: (-item[1], item[0]))
+            for url, n in dups:
+                lines.append('%8d %s' % (n, url))
+        return '\n'.join(lines)
+
+
+def report(roots=None):
+    """Measures the memory used by the `DataObject` instances reachable from
+    the given root instances, returning a `MemoryReport`.
+
+    Instances are reachable through the field values decoded into other
+    instances, including those in lists and dictionaries. Instances that are
+    in API data only as dictionaries are measured as that API data.
+
+    If `roots` is not given, all the tracked instances still alive are
+    measured. (See `start_tracking()`.)
+
+    """
+    if roots is None:
+        roots = tracked()
+
+    result = MemoryReport()
+    seen = set()
+    locations = {}
+    pending = list(roots)
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        cls = type(obj)
+        try:
+            usage = result.classes[cls.__name__]
+        except KeyError:
+            usage = result.classes[cls.__name__] = ClassUsage(cls.__name__)
+        usage.count += 1
+
+        # Read the instance dictionary directly, so undelivered promises
+        # aren't delivered.
+        attrs = obj.__dict__
+        seen.add(id(attrs))
+        usage.instances += sys.getsizeof(obj) + sys.getsizeof(attrs)
+        usage.raw += deep_size(attrs.get('api_data'), seen)
+
+        for name, value in attrs.iteritems():
+            seen.add(id(name))
+            if name == 'api_data':
+                continue
+            nested = remoteobjects.dataobject.objects_in(value)
+            if nested:
+                pending.extend(nested)
+                # Count the containers, but not the instances in them.
+                unseen = set(id(v) for v in nested) - seen
+                seen.update(unseen)
+                usage.decoded += deep_size(value, seen)
+                seen.difference_update(unseen)
+            else:
+                usage.decoded += deep_size(value, seen)
+
+        # Use the property, so promises whose URLs are still to be built
+        # from their queries are counted too.
+        location = getattr(obj, '_location', None)
+        if location is not None:
+            locations[location] = locations.get(location, 0) + 1
+
+    result.duplicates = dict((url, n) for url, n in locations.iteritems()
+        if n > 1)
+    return result
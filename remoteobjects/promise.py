@@ -1,8 +1,13 @@
 import urlparse
 import urllib
 import cgi
+from operator import itemgetter
+import weakref
 
+import remoteobjects.deadline
 import remoteobjects.http
+from remoteobjects.dataobject import objects_in, stock_method
+from remoteobjects.futures import CancelledError, Executor
 from remoteobjects.fields import Property
 
 
@@ -20,8 +25,32 @@ class PromiseObject(remoteobjects.http.HttpObject):
     When the caller tries to use attributes that should have data in them from
     the remote resource, only *then* is the resource actually fetched.
 
+    Set a `PromiseObject` class's `executor` attribute to a
+    `remoteobjects.futures.Executor` instance to make its promises *eager*:
+    such promises start requesting their resources in the background as soon
+    as they're made, so when their data is used, only the rest of the request
+    remains to be waited for.
+
+    Set a `PromiseObject` class's `object_cache` attribute to a
+    `remoteobjects.cache.ObjectCache` instance to deliver its promises from
+    the data of previously delivered instances while that data is fresh.
+
+    Set a `PromiseObject` class's `projection` attribute to a list of the
+    attribute names of the fields your application uses to ask the server
+    for only those fields. (See `get()`.)
+
     """
 
+    executor = None
+
+    object_cache = None
+
+    projection = None
+
+    _future = None
+    _deadline = None
+
+    @stock_method
     def __init__(self, **kwargs):
         """Initializes a delivered, empty `PromiseObject`."""
         self._delivered = True
@@ -41,23 +70,227 @@ class PromiseObject(remoteobjects.http.HttpObject):
 
     api_data = property(_get_api_data, _set_api_data, _del_api_data)
 
+    def _get_location(self):
+        try:
+            return self.__dict__['_location']
+        except KeyError:
+            pass
+        # Serialize the query only now that the URL is needed.
+        parts = list(urlparse.urlsplit(self.__dict__['_base_location']))
+        parts[3] = urllib.urlencode(self.__dict__['_query'])
+        url = self.__dict__['_location'] = urlparse.urlunsplit(parts)
+        return url
+
+    def _set_location(self, value):
+        self.__dict__['_location'] = value
+        self.__dict__.pop('_base_location', None)
+        self.__dict__.pop('_query', None)
+
+    _location = property(_get_location, _set_location)
+
+    def split_query(self):
+        """Returns the instance's URL without its query string, and the query
+        parameters as a tuple of ``(name, value)`` pairs sorted by name.
+
+        Repeated parameters are all included, in their original order.
+
+        """
+        try:
+            return self.__dict__['_base_location'], self.__dict__['_query']
+        except KeyError:
+            pass
+        parts = list(urlparse.urlsplit(self._location))
+        query = cgi.parse_qsl(parts[3], keep_blank_values=True)
+        query.sort(key=itemgetter(0))
+        parts[3] = ''
+        base = urlparse.urlunsplit(parts)
+
+        self.__dict__['_base_location'] = base
+        query = self.__dict__['_query'] = tuple(query)
+        return base, query
+
     @classmethod
     def statefields(cls):
-        return super(PromiseObject, cls).statefields() + ['_delivered']
+        return super(PromiseObject, cls).statefields() + ['_delivered',
+            '_projected', 'projection']
+
+    def __getstate__(self):
+        # Make sure a pending query is serialized into the saved URL.
+        self._location
+        return super(PromiseObject, self).__getstate__()
 
     @classmethod
-    def get(cls, url, http=None, **kwargs):
+    def get(cls, url, http=None, executor=None, query=None, timeout=None,
+            projection=None, **kwargs):
         """Creates a new undelivered `PromiseObject` instance that, when
-        delivered, will contain the data at the given URL."""
+        delivered, will contain the data at the given URL.
+
+        Optional parameter `projection` is a list of the attribute names of
+        the fields to request, in place of the class's `projection`. The
+        query parameters `projection_query()` makes for those fields are
+        added to the URL, and data for other fields in the response is
+        discarded when the instance is delivered. As the instance then has
+        only part of its resource's data, it can't be saved with `put()`.
+
+        Optional parameter `timeout` is the deadline for delivering the
+        instance, as a number of seconds from now or a
+        `remoteobjects.deadline.Deadline` instance.
+
+        Optional parameter `query` is a sequence of ``(name, value)`` pairs
+        to use as the query string of the URL, in place of any query string
+        `url` has. The query is only encoded into the URL once the URL is
+        needed (usually when the instance is delivered).
+
+        If optional parameter `executor` is given, or the class has an
+        `executor` set, the new instance is eager: it starts requesting its
+        resource right away, as with `prefetch()`.
+
+        """
         # Make a fake empty instance of this class.
         self = cls()
-        self._location = url
+        if query is None:
+            self._location = url
+        else:
+            del self.__dict__['_location']
+            self.__dict__['_base_location'] = url
+            self.__dict__['_query'] = tuple(query)
         self._http = http
         self._delivered = False
+        if projection is None:
+            projection = cls.projection
+        elif projection != cls.projection:
+            self.projection = tuple(projection)
+        if projection:
+            self._add_projection_query(projection)
+        if timeout is not None:
+            self._deadline = remoteobjects.deadline.effective(timeout)
+
+        if executor is None:
+            executor = cls.executor
+        if executor is not None:
+            self.prefetch(executor)
 
         return self
 
-    def deliver(self):
+    def _add_projection_query(self, projection):
+        params = self.projection_query(self.projection_names(projection))
+        replaced = set(k for k, v in params)
+        base, query = self.split_query()
+        query = [(k, v) for k, v in query if k not in replaced]
+        query.extend(params)
+        query.sort(key=itemgetter(0))
+
+        self.__dict__.pop('_location', None)
+        self.__dict__['_query'] = tuple(query)
+
+    @classmethod
+    def projection_names(cls, projection):
+        """Returns the API names of the fields with the attribute names in
+        `projection`.
+
+        Names of attributes that aren't fields are returned as they are.
+
+        """
+        fields = cls.fields
+        return [fields[name].api_name if name in fields else name
+            for name in projection]
+
+    @classmethod
+    def projection_query(cls, api_names):
+        """Returns the query parameters that ask the server for only the
+        fields with the API names `api_names`, as a list of ``(name,
+        value)`` pairs.
+
+        This implementation returns a ``fields`` parameter listing the names
+        separated by commas. Override this method if your API asks for
+        partial resources some other way.
+
+        """
+        return [('fields', ','.join(api_names))]
+
+    @classmethod
+    def project_api_data(cls, data, api_names):
+        """Returns the API data `data` with only the values for the fields
+        with the API names `api_names`."""
+        if not isinstance(data, dict):
+            return data
+        return dict((k, data[k]) for k in api_names if k in data)
+
+    def prefetch(self, executor):
+        """Starts requesting the instance's resource on one of the worker
+        threads of the `remoteobjects.futures.Executor` instance `executor`.
+
+        The response is decoded into the instance only when it's delivered,
+        on the thread that uses its data. If the executor's queue is full, the
+        instance is left to be requested when delivered, as normal. If the
+        instance is discarded (or `cancel()` is called) before its request
+        starts, the request is cancelled.
+
+        User agents can't be shared between threads, so the request is not
+        made with any user agent given to `get()` itself. If the executor has
+        an `http_factory`, the worker thread's own user agent from the
+        executor is used (see `remoteobjects.futures.Executor.http()`).
+        Otherwise the request is made with a copy of the user agent given to
+        `get()` (see `remoteobjects.http.new_user_agent()`), or with the
+        worker's default one if none was given.
+
+        Returns whether the request was started.
+
+        """
+        if self._delivered or self._future is not None:
+            return False
+        if self._location is None:
+            raise PromiseError('Instance %r has no URL from which to deliver' % (self,))
+        if not self._needs_request():
+            return False
+
+        request = self.get_request()
+        # Worker threads don't share our deadlines, so take ours along.
+        deadline = remoteobjects.deadline.effective(self._deadline)
+        http = self._http
+        if http is None or executor.http_factory is not None:
+            worker_http = executor.http
+        else:
+            worker_http = lambda: remoteobjects.http.new_user_agent(http)
+
+        def fetch():
+            return remoteobjects.http.send_request(worker_http(), request,
+                deadline)
+
+        future = executor.try_submit(fetch)
+        if future is None:
+            return False
+        # Cancel the request if the promise is dropped before it's made. The
+        # weak reference is kept alive by the future itself.
+        future.owner = weakref.ref(self, lambda ref: future.cancel())
+        self._future = future
+        return True
+
+    def _needs_request(self):
+        """Returns whether delivering the instance would request its
+        resource, rather than raise a known failure from the negative cache
+        or fill it from the object cache."""
+        if self.negative_cache is not None:
+            try:
+                self.negative_cache.check(type(self), self._location)
+            except Exception:
+                return False
+        cache = self.object_cache
+        return cache is None or not cache.servable(cache.lookup(type(self),
+            self._location))
+
+    def cancel(self):
+        """Cancels the instance's background request, if it has one and it
+        hasn't started yet.
+
+        Returns whether a request was cancelled. A cancelled instance is
+        requested normally if it's delivered later.
+
+        """
+        future, self._future = self._future, None
+        return future is not None and future.cancel()
+
+    def deliver(self, timeout=None):
         """Attempts to fill the instance with the data it represents.
 
         If the instance has already been delivered or the instance has no URL
@@ -65,28 +298,81 @@ class PromiseObject(remoteobjects.http.HttpObject):
         exceptions from requesting and decoding a `RemoteObject` that might
         normally result from a `RemoteObject.get()` may also be thrown.
 
+        Optional parameter `timeout` is the deadline for delivering the
+        instance, as for `get()`. If the deadline passes while waiting for a
+        background request, the request is cancelled and
+        `remoteobjects.deadline.DeadlineExceeded` is raised.
+
         """
         if self._delivered:
             raise PromiseError('%s instance %r has already been delivered' % (type(self).__name__, self))
         if self._location is None:
             raise PromiseError('Instance %r has no URL from which to deliver' % (self,))
-
-        http = self._http
-        if self._http is None:
-            http = remoteobjects.http.userAgent
+        if self.negative_cache is not None:
+            self.negative_cache.check(type(self), self._location)
+        cache = self.object_cache
+        if cache is not None and cache.deliver(self):
+            self.cancel()
+            # The cached data was projected when it was first delivered.
+            if self.projection:
+                self.__dict__['_projected'] = True
+            return
 
         request = self.get_request()
-        response, content = http.request(**request)
-        self.update_from_response(request['uri'], response, content)
+        deadline = remoteobjects.deadline.effective(timeout, self._deadline)
+
+        future, self._future = self._future, None
+        response = None
+        if future is not None:
+            if deadline is not None and not future.wait(deadline.remaining()):
+                future.cancel()
+                deadline.check('Delivery of %s' % (request['uri'],))
+            try:
+                response, content = future.result()
+            except CancelledError:
+                pass
+
+        if response is None:
+            response, content = remoteobjects.http.send_request(self._http,
+                request, deadline)
+
+        self.update_from_get(request['uri'], response, content)
+        if cache is not None:
+            cache.store(self)
+
+    def refresh(self, http=None, timeout=None):
+        """Brings this `PromiseObject` instance up to date with its remote
+        resource, unless its data is still fresh.
+
+        An undelivered instance is delivered. Otherwise, the resource is
+        requested conditionally as for `HttpObject.refresh()`, and only if the
+        data the instance was delivered with is no longer fresh.
 
+        Returns whether the resource was requested.
+
+        """
+        if not self._delivered:
+            if http is not None:
+                self._http = http
+            self.deliver(timeout=timeout)
+            return True
+        return super(PromiseObject, self).refresh(http=http or self._http,
+            timeout=timeout)
+
+    @stock_method
     def update_from_dict(self, data):
         if not isinstance(data, dict):
             raise TypeError("Cannot update %r from non-dictionary data source %r"
                 % (self, data))
+        self._before_change()
+        self.__dict__.pop('_modified', None)
         # Clear any local instance field data
         for k in self.fields.iterkeys():
             if k in self.__dict__:
                 del self.__dict__[k]
+        if self.release_decoded:
+            # Released values are removed, so don't remove the caller's.
+            data = dict(data)
         # Update directly to avoid triggering delivery.
         self.__dict__['api_data'] = data
 
@@ -96,6 +382,40 @@ class PromiseObject(remoteobjects.http.HttpObject):
         super(PromiseObject, self).update_from_response(url, response, content)
         # Any updating from a response constitutes delivery.
         self._delivered = True
+        self.__dict__.pop('_projected', None)
+
+    def update_from_get(self, url, response, content):
+        """Fills the `PromiseObject` instance with the data from the response
+        to a ``GET`` request, as for `HttpObject.update_from_get()`.
+
+        If the instance has a `projection`, the request asked for only some
+        of its fields, so data for other fields is discarded.
+
+        """
+        super(PromiseObject, self).update_from_get(url, response, content)
+
+        projection = self.projection
+        if projection:
+            # Don't keep data for fields we didn't ask for, in case the
+            # server sent them anyway.
+            self.__dict__['api_data'] = self.project_api_data(
+                self.__dict__['api_data'], self.projection_names(projection))
+            self.__dict__['_projected'] = True
+
+    def put(self, http=None, timeout=None):
+        """Saves the `PromiseObject` instance back to its remote resource, as
+        for `HttpObject.put()`.
+
+        Instances delivered with a `projection` have data for only some of
+        their fields, and saving them would erase the rest, so `ValueError`
+        is raised for them instead. Get an instance without a projection to
+        save it.
+
+        """
+        if self.__dict__.get('_projected'):
+            raise ValueError('Cannot save %r, which has data for only the'
+                ' fields in its projection' % (self,))
+        return super(PromiseObject, self).put(http=http, timeout=timeout)
 
     def filter(self, **kwargs):
         """Returns a new undelivered `PromiseObject` instance, equivalent to
@@ -103,7 +423,14 @@ class PromiseObject(remoteobjects.http.HttpObject):
         keyword parameters.
 
         By default, all filter parameters are added as parameters to the
-        `PromiseObject` instance's query string.
+        `PromiseObject` instance's query string, replacing any parameters of
+        the same names. Parameters given as lists or tuples are added once
+        for each value. Parameters are kept in order by name, so equivalent
+        filters always produce the same URL.
+
+        Keyword parameter `projection`, if given, is not a query parameter
+        but the list of fields to request, as for `get()`. If not given, the
+        new instance requests the same fields as this one.
 
         If your endpoint takes only certain parameters, or accepts parameters
         in some way other than query parameters in the URL, override this
@@ -111,11 +438,145 @@ class PromiseObject(remoteobjects.http.HttpObject):
         you require.
 
         """
-        parts = list(urlparse.urlparse(self._location))
-        queryargs = cgi.parse_qs(parts[4], keep_blank_values=True)
-        queryargs = dict([(k, v[0]) for k, v in queryargs.iteritems()])
-        queryargs.update(kwargs)
-        parts[4] = urllib.urlencode(queryargs)
-        newurl = urlparse.urlunparse(parts)
-
-        return self.get(newurl, http=self._http)
+        projection = kwargs.pop('projection', self.projection)
+        base, query = self.split_query()
+        query = [(k, v) for k, v in query if k not in kwargs]
+        for k, v in kwargs.iteritems():
+            if isinstance(v, (list, tuple)):
+                query.extend((k, x) for x in v)
+            else:
+                query.append((k, v))
+        query.sort(key=itemgetter(0))
+
+        return self.get(base, http=self._http, query=query,
+            timeout=self._deadline, projection=projection)
+
+
+class DeliveryResult(object):
+
+    """The outcome of delivering a graph of `PromiseObject` instances with
+    `deliver_graph()`.
+
+    `waves` is the number of rounds of concurrent requests that were made,
+    and `requests` the total number of HTTP requests (not counting instances
+    filled from the object cache or failed from the negative cache).
+    `objects` maps each path requested to the list of instances found at that
+    path, and `errors` maps the URLs of any instances that could not be
+    delivered to the exceptions raised delivering them.
+
+    """
+
+    def __init__(self):
+        self.waves = 0
+        self.requests = 0
+        self.objects = {}
+        self.errors = {}
+
+
+def deliver_graph(root, paths, executor=None, timeout=None):
+    """Delivers `root` and the instances reachable from it through the given
+    attribute paths, breadth first.
+
+    Parameter `paths` is a list of dotted attribute paths from `root`, such
+    as ``['entries', 'entries.tweeter.feed']``. Lists and dictionaries found
+    along a path are followed through all their members.
+
+    All the undelivered instances found at the same depth are requested
+    concurrently on the `remoteobjects.futures.Executor` instance `executor`
+    (or a temporary one, if not given), and each URL is requested only once
+    across the whole graph: other instances with the same URL are filled from
+    the one that was delivered. The workers of a temporary executor make
+    their requests with copies of the user agent `root` was requested with.
+
+    Optional parameter `timeout` is the deadline for delivering the whole
+    graph, as for `PromiseObject.get()`. Once it passes, requests not yet
+    made are cancelled, and the instances they were for are recorded with
+    `remoteobjects.deadline.DeadlineExceeded` errors.
+
+    Returns a `DeliveryResult` describing the requests that were made. An
+    instance that could not be delivered is recorded in the result's
+    `errors`, and no paths are followed from it. Undelivered instances with
+    no URL are left undelivered, and no paths are followed from them either.
+
+    """
+    tree = {}
+    for path in paths:
+        node = tree
+        parts = path.split('.')
+        for i, attr in enumerate(parts):
+            subpath = '.'.join(parts[:i+1])
+            node = node.setdefault(attr, (subpath, {}))[1]
+
+    own_executor = executor is None
+    if own_executor:
+        http = getattr(root, '_http', None)
+        executor = Executor(workers=8,
+            http_factory=lambda: remoteobjects.http.new_user_agent(http))
+
+    deadline = remoteobjects.deadline.effective(timeout)
+    if deadline is not None:
+        deadline.__enter__()
+
+    result = DeliveryResult()
+    delivered = {}
+    frontier = [(root, tree)]
+    try:
+        while frontier:
+            # Find which URLs this wave needs to request.
+            pending = {}
+            for obj, node in frontier:
+                if not isinstance(obj, PromiseObject):
+                    continue
+                url = obj._location
+                if url is None:
+                    # There's nothing to request for it.
+                    continue
+                if obj._delivered:
+                    delivered.setdefault(url, obj)
+                elif url not in delivered and url not in result.errors:
+                    pending.setdefault(url, []).append(obj)
+
+            if pending:
+                result.waves += 1
+                if deadline is None or not deadline.expired():
+                    for url, objs in pending.iteritems():
+                        objs[0].prefetch(executor)
+                for url, objs in pending.iteritems():
+                    first = objs[0]
+                    if first._future is not None or first._needs_request():
+                        result.requests += 1
+                    try:
+                        first.deliver()
+                    except Exception, exc:
+                        result.errors[url] = exc
+                    else:
+                        delivered[url] = first
+
+            next_frontier = []
+            for obj, node in frontier:
+                if isinstance(obj, PromiseObject) and not obj._delivered:
+                    url = obj._location
+                    source = None
+                    if url is not None:
+                        source = delivered.get(url)
+                    if source is None:
+                        # Delivering this one failed (or it has no URL to
+                        # deliver from); don't follow it.
+                        continue
+                    obj.replace_api_data(source.copy_api_data())
+                    obj._etag = getattr(source, '_etag', None)
+                    obj._response_info = source._response_info
+                    obj._delivered = True
+
+                for attr, (subpath, children) in node.iteritems():
+                    members = objects_in(getattr(obj, attr))
+                    result.objects.setdefault(subpath, []).extend(members)
+                    next_frontier.extend((m, children) for m in members)
+            frontier = next_frontier
+    finally:
+        if deadline is not None:
+            deadline.__exit__(None, None, None)
+        if own_executor:
+            executor.shutdown(wait=False)
+
+    return result
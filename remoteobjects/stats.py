@@ -0,0 +1,260 @@
+"""
+
+`remoteobjects.stats` counts how much decoding the fields of each
+`DataObject` class costs, for finding which classes and fields are worth
+optimizing in a running application.
+
+Decode statistics are off by default. Turn them on with `enable()`:
+
+>>> remoteobjects.stats.enable(sample_every=10)
+
+Then every field value decoded from API data is counted by its class and
+field, and every tenth decoding is timed and has the size of its API data
+measured. `snapshot()` returns the counts so far, with the time and size
+totals estimated from the sampled decodings, and `prometheus()` formats them
+in the Prometheus text exposition format, for serving to a metrics
+collector.
+
+When decode statistics are off, decoding checks only the module's `enabled`
+flag. When they're on, each thread counts its own decodings, so decoding
+takes no lock; `snapshot()` adds up the counts of all the threads.
+
+"""
+
+import threading
+import time
+
+import remoteobjects.tracing
+
+
+# Whether decode statistics are being collected.
+enabled = False
+
+_sample_every = 1
+
+# The counts of each live thread that has decoded anything, and the totals
+# of threads that have since finished, guarded by `_lock`.
+_all_counts = []
+_finished = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class _Counts(object):
+
+    """The decode counters of one thread, keyed by ``(class name, field
+    name)`` pairs, and the number of decodings it has counted."""
+
+    __slots__ = ('thread', 'counters', 'tick')
+
+    def __init__(self):
+        self.thread = threading.currentThread()
+        self.counters = {}
+        self.tick = 0
+
+
+def _counts():
+    """Returns the calling thread's `_Counts`, making them if necessary."""
+    try:
+        return _local.counts
+    except AttributeError:
+        counts = _local.counts = _Counts()
+        _lock.acquire()
+        try:
+            # Fold in the counts of finished threads, so threads that come
+            # and go don't pile up.
+            live = []
+            for other in _all_counts:
+                if other.thread.isAlive():
+                    live.append(other)
+                else:
+                    _add(_finished, other.counters)
+            live.append(counts)
+            _all_counts[:] = live
+        finally:
+            _lock.release()
+        return counts
+
+
+def _add(totals, counters):
+    """Adds the decode counters `counters` to the counters `totals`."""
+    # Copy the items in one step, as their thread may add counters.
+    for key, counter in counters.items():
+        total = totals.get(key)
+        if total is None:
+            totals[key] = list(counter)
+        else:
+            for i, value in enumerate(counter):
+                total[i] += value
+
+
+def enable(sample_every=1):
+    """Starts collecting decode statistics.
+
+    Optional parameter `sample_every` is how many decodings are counted for
+    each one that is also timed and measured. Sampling fewer decodings makes
+    collecting statistics cheaper, but the time and size totals less
+    accurate.
+
+    """
+    global enabled, _sample_every
+    _sample_every = max(1, int(sample_every))
+    enabled = True
+
+
+def disable():
+    """Stops collecting decode statistics, keeping those already
+    collected."""
+    global enabled
+    enabled = False
+
+
+def reset():
+    """Discards all the decode statistics collected so far."""
+    _lock.acquire()
+    try:
+        _finished.clear()
+        for counts in _all_counts:
+            counts.counters.clear()
+            counts.tick = 0
+    finally:
+        _lock.release()
+
+
+def record_decode(field, obj, raw):
+    """Decodes the API data `raw` for the field `field` of the `DataObject`
+    instance `obj`, counting the decoding in the decode statistics, and
+    returns the decoded value."""
+    counts = _counts()
+    counts.tick += 1
+    sampled = counts.tick % _sample_every == 0
+    key = (type(obj).__name__, field.attrname)
+    try:
+        counter = counts.counters[key]
+    except KeyError:
+        counter = counts.counters[key] = [0, 0, 0.0, 0]
+    counter[0] += 1
+
+    if remoteobjects.tracing.enabled:
+        decode, args = field.traced_decode, (obj, raw)
+    else:
+        decode, args = field.decode, (raw,)
+    if not sampled:
+        return decode(*args)
+
+    size = json_size(raw)
+    start = time.time()
+    value = decode(*args)
+    elapsed = time.time() - start
+
+    counter[1] += 1
+    counter[2] += elapsed
+    counter[3] += size
+    return value
+
+
+def json_size(value):
+    """Returns about how many bytes the API data `value` would take when
+    encoded as JSON, without encoding it."""
+    if isinstance(value, basestring):
+        return len(value) + 2
+    if isinstance(value, dict):
+        return 1 + sum(len(k) + 4 + json_size(v)
+            for k, v in value.iteritems()) + (not value)
+    if isinstance(value, (list, tuple)):
+        return 1 + sum(json_size(v) + 1 for v in value) + (not value)
+    if value is None or value is True:
+        return 4
+    if value is False:
+        return 5
+    if isinstance(value, (int, long)):
+        # The repr of a long has a trailing L.
+        return len(str(value))
+    return len(repr(value))
+
+
+class DecodeStats(object):
+
+    """The decode statistics for one field of one `DataObject` class.
+
+    `calls` is the number of times the field was decoded, and `samples` how
+    many of those decodings were timed and measured. `seconds` and `bytes`
+    are the total time spent decoding the field and the total size of the
+    API data decoded, estimated from the samples.
+
+    """
+
+    __slots__ = ('cls', 'field', 'calls', 'samples', 'seconds', 'bytes')
+
+    def __init__(self, cls, field, calls, samples, seconds, bytes):
+        self.cls = cls
+        self.field = field
+        self.calls = calls
+        self.samples = samples
+        if samples:
+            scale = float(calls) / samples
+        else:
+            scale = 0.0
+        self.seconds = seconds * scale
+        self.bytes = int(round(bytes * scale))
+
+    def __repr__(self):
+        return '<%s %s.%s calls=%d seconds=%.6f bytes=%d>' % (
+            type(self).__name__, self.cls, self.field, self.calls,
+            self.seconds, self.bytes)
+
+
+def snapshot():
+    """Returns the decode statistics collected so far, as a dictionary of
+    `DecodeStats` instances keyed by ``(class name, field name)`` pairs.
+
+    Threads still decoding may be partway through counting a decoding, so
+    the statistics are as of about the time of the call.
+
+    """
+    totals = {}
+    _lock.acquire()
+    try:
+        _add(totals, _finished)
+        all_counts = list(_all_counts)
+    finally:
+        _lock.release()
+
+    for counts in all_counts:
+        _add(totals, counts.counters)
+    return dict((key, DecodeStats(key[0], key[1], *counter))
+        for key, counter in totals.iteritems())
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n',
+        '\\n')
+
+
+def prometheus(prefix='remoteobjects_decode'):
+    """Returns the decode statistics collected so far in the Prometheus text
+    exposition format.
+
+    Optional parameter `prefix` is the prefix of the names of the metrics.
+    Each metric is labeled with the ``class`` and ``field`` decoded.
+
+    """
+    stats = sorted(snapshot().itervalues(), key=lambda s: (s.cls, s.field))
+    metrics = (
+        ('calls_total', 'Field values decoded.', 'calls', '%d'),
+        ('samples_total', 'Field decodings timed and measured.', 'samples',
+         '%d'),
+        ('seconds_total', 'Estimated time spent decoding field values.',
+         'seconds', '%.9f'),
+        ('bytes_total', 'Estimated JSON size of field values decoded.',
+         'bytes', '%d'),
+    )
+    lines = []
+    for suffix, help, attr, format in metrics:
+        name = '%s_%s' % (prefix, suffix)
+        lines.append('# HELP %s %s' % (name, help))
+        lines.append('# TYPE %s counter' % (name,))
+        for s in stats:
+            lines.append(('%s{class="%s",field="%s"} ' + format) % (name,
+                _label(s.cls), _label(s.field), getattr(s, attr)))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,271 @@
+"""
+
+`remoteobjects.tracing` records where the time goes when `RemoteObject`
+instances are requested and decoded.
+
+Use a `Trace` as a context manager to record the phases of the work done in
+a block of code as nested *spans*:
+
+>>> with Trace() as trace:
+...     entries = Timeline.get(url).entries
+...
+>>> trace.write_chrome_trace(open('timeline.json', 'w'))
+
+The spans recorded are:
+
+* ``http.request``, the user agent making a request
+* ``update_from_response``, updating an instance from a response, including:
+  * ``raise_for_response``, checking the response for errors
+  * ``json.loads``, parsing the response body
+* ``decode``, decoding a field value from API data
+* ``to_dict``, encoding an instance to a dictionary
+
+Each span records the URL or the class (and field) it was for as its
+detail. Export a trace with `chrome_trace()` for viewing in Chrome's
+``about:tracing`` page (or other trace event viewers), or with
+`collapsed()` for flame graph tools.
+
+Traces apply only to the thread that started them, so work done by
+`remoteobjects.futures.Executor` worker threads is not recorded. When no
+trace is recording, the instrumented code checks only the module's
+`enabled` flag.
+
+"""
+
+import os
+import threading
+import time
+
+
+# Whether any trace is recording, in any thread.
+enabled = False
+
+_active = 0
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def current():
+    """Returns the innermost `Trace` recording in the calling thread, or
+    `None` if there is none."""
+    traces = getattr(_local, 'traces', None)
+    if not traces:
+        return None
+    return traces[-1]
+
+
+def call(name, detail, func, *args, **kwargs):
+    """Calls `func` with the given arguments, recording the call as a span
+    named `name` in the current trace, and returns its result.
+
+    Parameter `detail` is the URL, class or other object the span is for,
+    or `None`. If no trace is recording, `func` is simply called.
+
+    """
+    if not enabled:
+        return func(*args, **kwargs)
+    trace = current()
+    if trace is None:
+        return func(*args, **kwargs)
+    span = trace.begin(name, detail)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        trace.end(span)
+
+
+def begin(name, detail=None):
+    """Starts a span named `name` in the current trace, returning it for
+    passing to `end()`.
+
+    If no trace is recording, returns `None`, which `end()` ignores.
+
+    """
+    if not enabled:
+        return None
+    trace = current()
+    if trace is None:
+        return None
+    return trace.begin(name, detail)
+
+
+def end(span):
+    """Ends the span `span` from `begin()`."""
+    if span is not None:
+        span.trace.end(span)
+
+
+class Span(object):
+
+    """A timed phase of work recorded in a `Trace`.
+
+    `start` and `end` are timestamps in seconds, and `path` is the tuple of
+    the spans enclosing this one (outermost first), ending with this span.
+    `child_time` is the time spent in the span's nested spans.
+
+    """
+
+    __slots__ = ('trace', 'name', 'detail', 'start', 'end', 'path',
+                 'child_time')
+
+    def __init__(self, trace, name, detail, path):
+        self.trace = trace
+        self.name = name
+        self.detail = detail
+        self.path = path + (self,)
+        self.child_time = 0.0
+        self.end = None
+        self.start = trace.clock()
+
+    @property
+    def duration(self):
+        """The span's total duration in seconds."""
+        return self.end - self.start
+
+    def label(self, details=False):
+        """Returns the span's name, and if `details` is true its detail."""
+        if details and self.detail is not None:
+            return '%s %s' % (self.name, self.detail)
+        return self.name
+
+    def __repr__(self):
+        return '<%s %s>' % (type(self).__name__, self.label(True))
+
+
+class Trace(object):
+
+    """A record of the spans of work done in a block of code.
+
+    Use a `Trace` as a context manager to record the spans of the work done
+    in the calling thread while the block runs. The finished spans are kept
+    in the trace's `spans` list in the order they finished.
+
+    """
+
+    def __init__(self, clock=time.time):
+        """Sets up an empty trace.
+
+        Optional parameter `clock` is the function that returns the current
+        time in seconds. If not given, `time.time` is used.
+
+        """
+        self.clock = clock
+        self.spans = []
+        self._stack = []
+        thread = threading.currentThread()
+        self.thread = thread.getName()
+        self.thread_id = thread.ident
+
+    def begin(self, name, detail=None):
+        """Starts a new span named `name`, nested in the trace's current
+        span, and returns it."""
+        if self._stack:
+            path = self._stack[-1].path
+        else:
+            path = ()
+        span = Span(self, name, detail, path)
+        self._stack.append(span)
+        return span
+
+    def end(self, span):
+        """Ends the span `span`, and any spans nested in it that are still
+        open."""
+        now = self.clock()
+        stack = self._stack
+        while stack:
+            top = stack.pop()
+            top.end = now
+            self.spans.append(top)
+            if stack:
+                stack[-1].child_time += top.duration
+            if top is span:
+                break
+
+    def __enter__(self):
+        global enabled, _active
+        traces = getattr(_local, 'traces', None)
+        if traces is None:
+            traces = _local.traces = []
+        traces.append(self)
+        _lock.acquire()
+        try:
+            _active += 1
+            enabled = True
+        finally:
+            _lock.release()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global enabled, _active
+        if self._stack:
+            self.end(self._stack[0])
+        _local.traces.remove(self)
+        _lock.acquire()
+        try:
+            _active -= 1
+            enabled = _active > 0
+        finally:
+            _lock.release()
+        return False
+
+    def chrome_trace(self):
+        """Returns the trace as a dictionary in the Chrome trace event format,
+        ready to be encoded as JSON.
+
+        Events are identified by the process ID and the thread's numeric ID,
+        and a ``thread_name`` metadata event comes first to name the thread.
+
+        """
+        pid, tid = os.getpid(), self.thread_id
+        events = []
+        for span in self.spans:
+            event = {
+                'name': span.name,
+                'cat': 'remoteobjects',
+                'ph': 'X',
+                'ts': span.start * 1000000,
+                'dur': span.duration * 1000000,
+                'pid': pid,
+                'tid': tid,
+            }
+            if span.detail is not None:
+                event['args'] = {'detail': str(span.detail)}
+            events.append(event)
+        events.sort(key=lambda e: e['ts'])
+        events.insert(0, {
+            'name': 'thread_name',
+            'ph': 'M',
+            'pid': pid,
+            'tid': tid,
+            'args': {'name': self.thread},
+        })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self, fileobj):
+        """Writes the trace as Chrome trace event JSON to the file-like
+        object `fileobj`."""
+        import simplejson
+        simplejson.dump(self.chrome_trace(), fileobj)
+
+    def collapsed(self, details=False):
+        """Returns the trace in the "collapsed stack" format used by flame
+        graph tools.
+
+        Each line is a stack of span names separated by semicolons, followed
+        by the time in microseconds spent in that stack's innermost span but
+        not in any span nested in it. If optional parameter `details` is
+        true, each span's detail is included with its name, making a
+        separate stack for each URL or class.
+
+        """
+        totals = {}
+        order = []
+        for span in self.spans:
+            stack = ';'.join(s.label(details).replace(';', ',')
+                for s in span.path)
+            if stack not in totals:
+                totals[stack] = 0.0
+                order.append(stack)
+            totals[stack] += span.duration - span.child_time
+        return ''.join('%s %d\n' % (stack, round(totals[stack] * 1000000))
+            for stack in order)
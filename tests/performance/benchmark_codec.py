@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+"""
+This will benchmark the sizes of, and the times to load, remoteobjects
+encoded with `remoteobjects.codec` compared with pickle and JSON. It will
+decode the JSON data you specify as the first argument into the remoteobject
+subclass you specify as the second argument, then encode it in each format.
+The load process is run as many times as you specify (via the -n flag). The
+size and mean load time for each format will be dumped to stdout.
+"""
+
+import cPickle as pickle
+import optparse
+import time
+
+import simplejson as json
+
+from remoteobjects import codec
+
+
+def formats(object_class):
+    def json_loads(value):
+        return object_class.from_dict(json.loads(value))
+
+    return (
+        ('json', lambda obj: json.dumps(obj.to_dict()), json_loads),
+        ('pickle', lambda obj: pickle.dumps(obj, pickle.HIGHEST_PROTOCOL),
+            pickle.loads),
+        ('codec', codec.dumps, codec.loads),
+        ('codec-raw', lambda obj: codec.dumps(obj, compress=False),
+            codec.loads),
+    )
+
+
+def test_loading(object_class, data, count):
+    obj = object_class.from_dict(json.loads(data))
+    for name, dumps, loads in formats(object_class):
+        value = dumps(obj)
+        # warm up
+        loads(value)
+
+        t = time.time()
+        for _ in xrange(count):
+            loads(value)
+        yield name, len(value), (time.time() - t) / count
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(
+        usage="%prog [options] json_file remoteobject_class",
+        description=("Compare the sizes and load times of remoteobjects"
+                     " encoded with the codec, pickle and JSON."))
+    parser.add_option("-n", action="store", type="int", default=1000,
+                      dest="num_runs", help="Number of times to run the test.")
+    options, args = parser.parse_args()
+
+    if len(args) != 2:
+        parser.error("Incorrect number of arguments")
+
+    try:
+        fd = open(args[0])
+        data = fd.read()
+    except:
+        parser.error("Unable to read file: '%s'" % args[0])
+    finally:
+        fd.close()
+
+    module_name, _, class_name = args[1].rpartition('.')
+    try:
+        module = __import__(module_name)
+    except ImportError, e:
+        parser.error(e.message)
+
+    try:
+        RemoteObject = getattr(module, class_name)
+    except AttributeError, e:
+        parser.error(e.message)
+
+    for name, size, t in test_loading(RemoteObject, data, options.num_runs):
+        print "%-10s %8d bytes %10.1f usec" % (name, size, t * 1000000)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+"""
+This will benchmark how long it takes to import remoteobjects in a new Python
+process, as a command line tool or serverless function would on every start.
+The import is timed in as many new processes as you specify (via the -n flag),
+and the mean and fastest times are dumped to stdout, along with a baseline
+of starting Python without importing remoteobjects.
+
+Use the -m flag to list which of the heavier libraries remoteobjects can use
+were loaded by the import. Those should all be loaded only when needed.
+"""
+
+import optparse
+import os
+import subprocess
+import sys
+import time
+
+
+HEAVY_MODULES = ('httplib2', 'simplejson', 'email', 'remoteobjects.json',
+                 'remoteobjects.batch', 'remoteobjects.cache')
+
+
+def time_import(statement, count):
+    root = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    times = []
+    for _ in xrange(count):
+        t = time.time()
+        subprocess.check_call([sys.executable, '-c', statement], cwd=root)
+        times.append(time.time() - t)
+    return sum(times) / count, min(times)
+
+
+def loaded_modules():
+    root = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    statement = ("import sys, remoteobjects; print ' '.join(m for m in %r"
+                 " if sys.modules.get(m) is not None)" % (HEAVY_MODULES,))
+    proc = subprocess.Popen([sys.executable, '-c', statement], cwd=root,
+        stdout=subprocess.PIPE)
+    return proc.communicate()[0].split()
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(
+        usage="%prog [options]",
+        description=("Test the time it takes to import remoteobjects."))
+    parser.add_option("-n", action="store", type="int", default=20,
+                      dest="num_runs", help="Number of times to run the test.")
+    parser.add_option("-m", action="store_true", default=False,
+                      dest="modules", help="List the heavy modules loaded.")
+    options, args = parser.parse_args()
+
+    for label, statement in (('python', 'pass'),
+                             ('import', 'import remoteobjects')):
+        mean, best = time_import(statement, options.num_runs)
+        print "%-8s mean %7.1f msec  best %7.1f msec" % (label, mean * 1000,
+            best * 1000)
+
+    if options.modules:
+        print "loaded: %s" % (' '.join(loaded_modules()) or '(none)')
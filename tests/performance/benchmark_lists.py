@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+"""
+This will benchmark decoding the entries of a list object whose entries are
+declared with a forward reference by class name, as in
+`fields.List(fields.Object('Entry'))`, compared with one declaring its entries
+with the class itself. The entries are decoded as many times as you specify
+(via the -n flag), from a list of as many entries as you specify (via the -s
+flag). The mean time to decode each list will be dumped to stdout.
+"""
+
+import optparse
+import time
+
+from remoteobjects import fields, ListObject, RemoteObject
+
+
+class Entry(RemoteObject):
+    name = fields.Field()
+    size = fields.Field()
+
+
+class ByName(ListObject):
+    entries = fields.List(fields.Object('Entry'))
+
+
+class ByClass(ListObject):
+    entries = fields.List(fields.Object(Entry))
+
+
+def test_decoding(list_class, size, count):
+    data = [{'name': 'entry %d' % i, 'size': i} for i in xrange(size)]
+
+    # warm up remoteobjects
+    list_class.from_dict(data).entries
+
+    t = time.time()
+    for _ in xrange(count):
+        list_class.from_dict(data).entries
+    return (time.time() - t) / count
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(
+        usage="%prog [options]",
+        description=("Test the performance of decoding list entries declared"
+                     " by class name."))
+    parser.add_option("-n", action="store", type="int", default=100,
+                      dest="num_runs", help="Number of times to run the test.")
+    parser.add_option("-s", action="store", type="int", default=1000,
+                      dest="size", help="Number of entries in each list.")
+    options, args = parser.parse_args()
+
+    for list_class in (ByName, ByClass):
+        t = test_decoding(list_class, options.size, options.num_runs)
+        print "%-8s %10.1f usec" % (list_class.__name__, t * 1000000)
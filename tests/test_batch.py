@@ -0,0 +1,278 @@
+import unittest
+
+import threading
+
+from remoteobjects import fields, http, batch
+from remoteobjects.deadline import DeadlineExceeded
+from tests import utils
+from tests.utils import FakeHttp
+
+
+class TestBatches(unittest.TestCase):
+
+    cls = http.HttpObject
+
+    def make_classes(self):
+
+        class Item(self.cls):
+            name = fields.Field()
+
+        class Collection(self.cls):
+            pass
+
+        c = Collection()
+        c._location = 'http://example.com/items'
+        return Item, c
+
+    def test_batches(self):
+        chunks = list(batch.batches(iter(range(7)), 3))
+        self.assertEquals(chunks, [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_sequential(self):
+        Item, c = self.make_classes()
+        threads = set()
+
+        def respond(uri, method, body, headers):
+            threads.add(threading.currentThread())
+            if 'item1' in body:
+                return {'status': 412}, ''
+            return ({'status': 201, 'content-type': 'application/json',
+                     'location': 'http://example.com/items/x'}, body)
+
+        # By default each instance is posted in turn with the default user
+        # agent, just as post() would.
+        h = FakeHttp(respond)
+        old_agent, http.userAgent = http.userAgent, h
+        try:
+            items = [Item(name='item%d' % i) for i in range(3)]
+            result = c.post_many(items, batch_size=2)
+        finally:
+            http.userAgent = old_agent
+
+        self.assertEquals(len(h.requests), 3)
+        self.assertEquals(threads, set([threading.currentThread()]))
+        self.assertEquals(result.succeeded, [items[0], items[2]])
+        (obj, error), = result.failed
+        self.assert_(obj is items[1])
+        self.assert_(isinstance(error, Item.PreconditionFailed))
+        self.assertEquals(items[2]._location, 'http://example.com/items/x')
+
+    def test_array(self):
+        Item, c = self.make_classes()
+
+        def respond(uri, method, body, headers):
+            self.assertEquals(method, 'POST')
+            self.assertEquals(headers['content-type'], 'application/json')
+            data = http.json.loads(body)
+            return ({'status': 201, 'location': uri,
+                     'content-type': 'application/json'},
+                    http.json.dumps([dict(d, id=d['name']) for d in data]))
+
+        h = FakeHttp(respond)
+        items = [Item(name='item%d' % i) for i in range(5)]
+        result = c.post_many(iter(items), http=h, batch_size=2,
+            strategy=batch.ArrayBatch())
+
+        self.assertEquals(len(h.requests), 3)
+        self.assertEquals(len(result), 5)
+        self.assertEquals(result.succeeded, items)
+        self.assertEquals(items[3].api_data['id'], 'item3')
+
+    def test_multipart(self):
+        Item, c = self.make_classes()
+
+        def respond(uri, method, body, headers):
+            self.assertEquals(uri, 'http://example.com/batch')
+            self.assert_(headers['content-type'].startswith('multipart/mixed'))
+            self.assertEquals(body.count('POST /items HTTP/1.1'), 3)
+            parts = []
+            # Answer out of order to exercise Content-ID matching.
+            for i, status in ((2, '201 Created'), (0, '201 Created'),
+                              (1, '404 Not Found')):
+                parts.append('--xyz\r\nContent-Type: application/http\r\n'
+                    'Content-ID: <response-%d>\r\n\r\nHTTP/1.1 %s\r\n'
+                    'Content-Type: application/json\r\n'
+                    'Location: http://example.com/items/%d\r\n'
+                    'ETag: "%d"\r\n\r\n{"name": "fresh%d"}\r\n'
+                    % (i, status, i, i, i))
+            parts.append('--xyz--\r\n')
+            return ({'status': 200,
+                     'content-type': 'multipart/mixed; boundary=xyz'},
+                    ''.join(parts))
+
+        h = FakeHttp(respond)
+        items = [Item(name='item%d' % i) for i in range(3)]
+        strategy = batch.MultipartBatch(url='http://example.com/batch')
+        result = c.post_many(items, http=h, strategy=strategy)
+
+        self.assertEquals(len(h.requests), 1)
+        self.assertEquals(result.succeeded, [items[0], items[2]])
+        self.assertEquals(items[0]._location, 'http://example.com/items/0')
+        self.assertEquals(items[2]._etag, '"2"')
+        self.assertEquals(items[2].name, 'fresh2')
+
+        (obj, error), = result.failed
+        self.assert_(obj is items[1])
+        self.assert_(isinstance(error, Item.NotFound))
+
+    def test_concurrent(self):
+        Item, c = self.make_classes()
+
+        def respond(uri, method, body, headers):
+            if 'item3' in body:
+                return {'status': 412}, ''
+            return ({'status': 201, 'content-type': 'application/json',
+                     'location': 'http://example.com/items/x'}, body)
+
+        h = FakeHttp(respond)
+        items = [Item(name='item%d' % i) for i in range(10)]
+        strategy = batch.ConcurrentBatch(workers=3)
+        result = c.post_many(items, http=h, batch_size=4, strategy=strategy)
+
+        self.assertEquals(len(h.requests), 10)
+        self.assertEquals(len(result.succeeded), 9)
+        (obj, error), = result.failed
+        self.assert_(obj is items[3])
+        self.assert_(isinstance(error, Item.PreconditionFailed))
+        self.assertEquals(items[9]._location, 'http://example.com/items/x')
+
+        strategy.executor.shutdown()
+
+    def test_put_many(self):
+        for strategy in (batch.SequentialBatch(),
+                         batch.ConcurrentBatch(workers=2)):
+            self.check_put_many(strategy)
+
+    def check_put_many(self, strategy):
+        Item, c = self.make_classes()
+
+        def respond(uri, method, body, headers):
+            self.assertEquals(method, 'PUT')
+            if headers['if-match'] != uri[-1]:
+                return {'status': 412}, ''
+            return {'status': 200, 'content-type': 'application/json',
+                    'etag': uri[-1] + 'x'}, body
+
+        items = []
+        for i in range(6):
+            item = Item(name='item%d' % i)
+            item._location = 'http://example.com/items/%d' % i
+            item._etag = str(i)
+            items.append(item)
+        items[4]._etag = 'stale'
+
+        h = FakeHttp(respond)
+        result = Item.put_many(items, http=h, strategy=strategy)
+
+        self.assertEquals(len(h.requests), 6)
+        self.assertEquals(len(result.succeeded), 5)
+        (obj, error), = result.failed
+        self.assert_(obj is items[4])
+        self.assert_(isinstance(error, Item.PreconditionFailed))
+        self.assertEquals(items[5]._etag, '5x')
+        self.assert_(result.elapsed > 0)
+        self.assert_(result.throughput > 0)
+
+        if isinstance(strategy, batch.ConcurrentBatch):
+            strategy.executor.shutdown()
+
+    def test_delete_many(self):
+        for strategy in (batch.SequentialBatch(),
+                         batch.ConcurrentBatch(workers=2)):
+            self.check_delete_many(strategy)
+
+    def check_delete_many(self, strategy):
+        Item, c = self.make_classes()
+
+        def respond(uri, method, headers):
+            self.assertEquals(method, 'DELETE')
+            self.assertEquals(headers['if-match'], 'abc')
+            if uri.endswith('/1'):
+                return {'status': 404}, ''
+            return {'status': 204}, ''
+
+        items = []
+        for i in range(3):
+            item = Item(name='item%d' % i)
+            item._location = 'http://example.com/items/%d' % i
+            item._etag = 'abc'
+            items.append(item)
+
+        h = FakeHttp(respond)
+        result = Item.delete_many(items, http=h, strategy=strategy)
+
+        self.assertEquals(len(h.requests), 3)
+        self.assertEquals([obj for obj, error in result.failed], [items[1]])
+        self.assert_(items[0]._location is None)
+        self.assertEquals(items[1]._location, 'http://example.com/items/1')
+
+        if isinstance(strategy, batch.ConcurrentBatch):
+            strategy.executor.shutdown()
+
+    def test_post_only_strategies(self):
+        Item, c = self.make_classes()
+
+        def respond(uri, method, headers, body=None):
+            self.fail('%s request made with a post-only strategy' % method)
+
+        h = FakeHttp(respond)
+        item = Item(name='item')
+        item._location = 'http://example.com/items/1'
+
+        for strategy in (batch.ArrayBatch(), batch.MultipartBatch()):
+            self.assertRaises(TypeError, lambda: Item.put_many([item],
+                http=h, strategy=strategy))
+            self.assertRaises(TypeError, lambda: Item.delete_many([item],
+                http=h, strategy=strategy))
+
+            # Post-only strategies set on the class are refused the same way.
+            Item.batch_strategy = strategy
+            self.assertRaises(TypeError, lambda: Item.put_many([item],
+                http=h))
+            self.assertRaises(TypeError, lambda: Item.delete_many([item],
+                http=h))
+            del Item.batch_strategy
+
+        self.assertEquals(len(h.requests), 0)
+
+    def test_deadline(self):
+        Item, c = self.make_classes()
+        slow = threading.Event()
+
+        def respond(uri, method, body, headers):
+            slow.wait(0.2)
+            return ({'status': 201, 'content-type': 'application/json',
+                     'location': 'http://example.com/items/x'}, body)
+
+        h = FakeHttp(respond)
+        items = [Item(name='item%d' % i) for i in range(6)]
+        strategy = batch.ConcurrentBatch(workers=1)
+
+        try:
+            c.post_many(items, http=h, batch_size=3, strategy=strategy,
+                timeout=0.05)
+        except DeadlineExceeded, exc:
+            result = exc.result
+        else:
+            self.fail('post_many() did not exceed its deadline')
+
+        # The first post was already running, so it was allowed to finish,
+        # but the other two were cancelled and the second batch never sent.
+        self.assertEquals(len(result), 3)
+        self.assertEquals(result.succeeded, items[:1])
+        self.assertEquals([obj for obj, error in result.failed], items[1:3])
+        for obj, error in result.failed:
+            self.assert_(isinstance(error, DeadlineExceeded))
+        self.assertEquals(len(h.requests), 1)
+
+        strategy.executor.shutdown()
+
+    def test_no_location(self):
+        Item, c = self.make_classes()
+        c._location = None
+        self.assertRaises(ValueError, lambda: c.post_many([Item()]))
+
+
+if __name__ == '__main__':
+    utils.log()
+    unittest.main()
@@ -0,0 +1,161 @@
+import BaseHTTPServer
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import httplib2
+
+from remoteobjects import cache, fields, promise
+from tests import utils
+
+
+class TestSharedStore(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_store(self):
+        store = cache.SharedStore(self.path, max_entries=2)
+        self.assert_(store.get('a') is None)
+        store.set('a', 'apple')
+        store.set(u'b\u2603', 'banana')
+        self.assertEquals(store.get('a'), 'apple')
+        self.assertEquals(store.get(u'b\u2603'), 'banana')
+
+        store.delete('a')
+        self.assert_(store.get('a') is None)
+        store.delete('a')
+
+        store.set('a', 'apple')
+        store.clear()
+        self.assert_(store.get('a') is None)
+        self.assert_(store.get(u'b\u2603') is None)
+
+    def test_evict(self):
+        store = cache.SharedStore(self.path, max_entries=2)
+        then = time.time() - 60
+        store.set('a', 'apple')
+        os.utime(store.filename('a'), (then, then))
+        store.set('b', 'banana')
+        os.utime(store.filename('b'), (then + 1, then + 1))
+
+        # Reading a value keeps it from being evicted.
+        store.get('a')
+        store.set('c', 'cherry')
+        self.assertEquals(store.get('a'), 'apple')
+        self.assert_(store.get('b') is None)
+        self.assertEquals(store.get('c'), 'cherry')
+
+    def test_processes(self):
+        store = cache.SharedStore(self.path)
+        store.set('a', 'apple')
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                child = cache.SharedStore(self.path)
+                if child.get('a') == 'apple':
+                    store.set('b', 'banana')
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+
+        self.assertEquals(store.get('b'), 'banana')
+
+    def test_object_cache(self):
+
+        class Tiny(promise.PromiseObject):
+            name = fields.Field()
+
+        def respond(uri, headers):
+            return ({'status': 200, 'content-type': 'application/json',
+                     'cache-control': 'max-age=60', 'etag': '"7"'},
+                    '{"name": "Molly"}')
+
+        h = utils.FakeHttp(respond)
+        url = 'http://example.com/molly'
+
+        # Each cache stands in for one process's cache.
+        for i in range(3):
+            Tiny.object_cache = cache.ObjectCache(
+                shared=cache.SharedStore(self.path))
+            t = Tiny.get(url, http=h)
+            self.assertEquals(t.name, 'Molly')
+            self.assertEquals(t._etag, '"7"')
+            self.assert_(t.is_fresh())
+        self.assertEquals(len(h.requests), 1)
+
+        Tiny.object_cache.discard(Tiny, url)
+        Tiny.object_cache = cache.ObjectCache(
+            shared=cache.SharedStore(self.path))
+        self.assertEquals(Tiny.get(url, http=h).name, 'Molly')
+        self.assertEquals(len(h.requests), 2)
+
+    def test_permissions(self):
+        store = cache.SharedStore(os.path.join(self.path, 'new'))
+        self.assertEquals(os.stat(store.path).st_mode & 0777, 0700)
+
+        # Directories other users can get into are refused.
+        os.chmod(self.path, 0755)
+        self.assertRaises(OSError, cache.SharedStore, self.path)
+        os.chmod(self.path, 0700)
+
+        filename = os.path.join(self.path, 'file')
+        open(filename, 'w').close()
+        self.assertRaises(OSError, cache.SharedStore, filename)
+
+        # Nor can we use a directory that belongs to someone else.
+        if os.getuid() == 0:
+            other = os.path.join(self.path, 'other')
+            os.mkdir(other, 0700)
+            os.chown(other, 65534, -1)
+        else:
+            other = '/'
+        self.assertRaises(OSError, cache.SharedStore, other)
+
+    def test_httplib2(self):
+        requests = []
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                requests.append(self.path)
+                body = 'Molly'
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'max-age=60')
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, *args):
+                pass
+
+        server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=server.handle_request)
+        thread.start()
+        url = 'http://127.0.0.1:%d/molly' % server.server_port
+        try:
+            # Each user agent stands in for one process's user agent.
+            response, content = httplib2.Http(
+                cache=cache.SharedStore(self.path)).request(url)
+            self.assertEquals(content, 'Molly')
+            self.assert_(not response.fromcache)
+        finally:
+            thread.join()
+            server.server_close()
+
+        response, content = httplib2.Http(
+            cache=cache.SharedStore(self.path)).request(url)
+        self.assertEquals(content, 'Molly')
+        self.assert_(response.fromcache)
+        self.assertEquals(requests, ['/molly'])
+
+
+if __name__ == '__main__':
+    utils.log()
+    unittest.main()
@@ -0,0 +1,135 @@
+from datetime import datetime
+import pickle
+import unittest
+
+from remoteobjects import codec, dataobject, fields, http, listobject
+from tests import utils
+
+
+class CodecAuthor(http.HttpObject):
+    name = fields.Field()
+    url = fields.Field(api_name='profileUrl')
+
+
+class CodecPost(http.HttpObject):
+    title = fields.Field()
+    published = fields.Datetime()
+    author = fields.Object(CodecAuthor)
+    tags = fields.List(fields.Field())
+    related = fields.Dict(fields.Object('CodecPost'))
+
+
+class CodecPosts(listobject.ListObject):
+    entries = fields.List(fields.Object(CodecPost))
+
+
+class Tagged(CodecAuthor):
+
+    @classmethod
+    def statefields(cls):
+        return super(Tagged, cls).statefields() + ['_tags']
+
+
+class TestCodec(unittest.TestCase):
+
+    def make_post(self, i):
+        return {
+            'title': 'CodecPost %d' % i,
+            'published': '2009-08-07T12:34:56Z',
+            'author': {'name': u'Molly \u2603', 'profileUrl': None,
+                       'extra': [1, 2.5, True]},
+            'tags': ['a', 'b'],
+            'related': {'next': {'title': 'CodecPost %d' % (i + 1)}},
+            'unknown': {'x': 'y'},
+        }
+
+    def test_roundtrip(self):
+        data = self.make_post(1)
+        p = CodecPost.from_dict(dataobject.copy_data(data))
+        p._location = 'http://example.com/posts/1'
+        p._etag = '"1"'
+        p._response_info = http.ResponseInfo(200, etag='"1"', lifetime=60)
+
+        q = codec.loads(codec.dumps(p))
+        self.assert_(type(q) is CodecPost)
+        self.assertEquals(q.api_data, data)
+        self.assertEquals(q.author.name, u'Molly \u2603')
+        self.assertEquals(q.related['next'].title, 'CodecPost 2')
+        self.assertEquals(q._location, 'http://example.com/posts/1')
+        self.assertEquals(q._etag, '"1"')
+        self.assertEquals(q._response_info.lifetime, 60)
+        self.assertEquals(q._response_info.etag, '"1"')
+
+    def test_decoded_fields(self):
+        p = CodecPost.from_dict(self.make_post(1))
+        p.published
+        p.title = 'Changed'
+        p.author = CodecAuthor(name='Fred')
+
+        q = codec.loads(codec.dumps(p))
+        # Decoded values are stored encoded, not as live objects.
+        self.assert_('author' not in q.__dict__)
+        self.assertEquals(q.title, 'Changed')
+        self.assertEquals(q.published, datetime(2009, 8, 7, 12, 34, 56))
+        self.assertEquals(q.author.name, 'Fred')
+
+    def test_class_names(self):
+        value = codec.dumps(CodecAuthor(name='Molly'))
+
+        def declare():
+            class CodecAuthor(http.HttpObject):
+                name = fields.Field()
+            return CodecAuthor
+
+        # Classes are found by module, not just by name.
+        Shadow = declare()
+        q = codec.loads(value)
+        self.assert_(type(q) is CodecAuthor)
+        self.assertEquals(q.name, 'Molly')
+
+        # Classes that can't be found by module must be given.
+        value = codec.dumps(Shadow(name='Fred'))
+        self.assertRaises(ValueError, codec.loads, value)
+        self.assert_(type(codec.loads(value, Shadow)) is Shadow)
+
+    def test_state(self):
+        a = Tagged(name='Molly')
+        a._tags = ('not', 'response', 'info')
+        a._response_info = http.ResponseInfo(200, lifetime=5)
+        q = codec.loads(codec.dumps(a))
+        self.assertEquals(q._tags, ('not', 'response', 'info'))
+        self.assertEquals(q._response_info.lifetime, 5)
+
+    def test_schema_changes(self):
+        data = self.make_post(1)
+        value = codec.dumps(CodecPost.from_dict(dataobject.copy_data(data)))
+
+        class Post2(http.HttpObject):
+            title = fields.Field()
+            summary = fields.Field()
+
+        q = codec.loads(value, Post2)
+        self.assertEquals(q.title, 'CodecPost 1')
+        self.assert_(q.summary is None)
+        self.assertEquals(q.api_data, data)
+
+    def test_compact(self):
+        l = CodecPosts.from_dict([self.make_post(i) for i in range(50)])
+        value = codec.dumps(l)
+        self.assert_(len(value) < len(pickle.dumps(l, 2)) / 4)
+        self.assertEquals(codec.loads(value).entries[49].title, 'CodecPost 49')
+
+        value = codec.dumps(l, compress=False)
+        self.assertEquals(codec.loads(value).entries[49].title, 'CodecPost 49')
+
+    def test_version(self):
+        value = codec.dumps(CodecAuthor(name='Molly'))
+        self.assertEquals(codec.loads(value).name, 'Molly')
+        value = codec.dumps(CodecAuthor(name='Molly'), compress=False)
+        bad = codec.marshal.dumps((0,) + codec.marshal.loads(value)[1:])
+        self.assertRaises(ValueError, lambda: codec.loads(bad))
+
+
+if __name__ == '__main__':
+    utils.log()
+    unittest.main()
@@ -148,6 +148,200 @@ class TestDataObjects(unittest.TestCase):
             "Changing deep exported data doesn't change instance's "
             "internal data retroactively")
 
+    def test_omit_nulls(self):
+
+        class BasicMost(self.cls):
+            name  = fields.Field()
+            value = fields.Field()
+
+        b = BasicMost.from_dict({
+            'name': 'foo',
+            'value': None,
+            'secret': {'code': None, 'word': 'xyzzy'},
+            'list': [{'a': None}, None],
+        })
+
+        d = b.to_dict()
+        self.assert_('value' in d)
+        self.assert_(d['secret']['code'] is None)
+
+        d = b.to_dict(omit_nulls=True)
+        self.assertEquals(d, {
+            'name': 'foo',
+            'secret': {'word': 'xyzzy'},
+            'list': [{}, None],
+        })
+
+    def test_release_decoded(self):
+
+        class Frob(self.cls):
+            size = fields.Field()
+
+        class Twiddle(self.cls):
+            name = fields.Field()
+            frob = fields.Object(Frob)
+            zotz = fields.List(fields.Object(Frob))
+            when = fields.Datetime()
+
+        Twiddle.release_decoded = True
+        data = {
+            'name': 'Twiddle Dee',
+            'frob': {'size': 'large'},
+            'zotz': [{'size': 'small'}, {'size': 'medium'}],
+            'when': '2009-06-15T12:23:53Z',
+            'extra': 'kept',
+        }
+        t = Twiddle.from_dict(dataobject.copy_data(data))
+        self.assertEquals(t.frob.size, 'large')
+        self.assertEquals(t.zotz[1].size, 'medium')
+        self.assertEquals(t.name, 'Twiddle Dee')
+        self.assertEquals(t.when, datetime(2009, 6, 15, 12, 23, 53))
+
+        # Only the values decoded into new objects were released.
+        self.assertEquals(sorted(t.api_data.keys()), ['extra', 'name'])
+        self.assertEquals(t.to_dict(), data)
+        self.assertEquals(t.copy_api_data(), data)
+
+        # The dictionaries given to from_dict() are left as they were.
+        given = dataobject.copy_data(data)
+        t = Twiddle.from_dict(given)
+        t.when
+        t.update_from_dict(given)
+        t.when
+        self.assertEquals(given, data)
+        self.assertEquals(Twiddle.from_dict(given).when,
+            datetime(2009, 6, 15, 12, 23, 53))
+
+        t.frob.size = 'huge'
+        self.assertEquals(t.to_dict()['frob'], {'size': 'huge'})
+        del t.frob
+        self.assert_(t.frob is None)
+        self.assert_('frob' not in t.to_dict())
+
+    def test_fingerprint(self):
+
+        class Frob(self.cls):
+            size = fields.Field()
+
+        class Twiddle(self.cls):
+            name = fields.Field()
+            frob = fields.Object(Frob)
+
+        def make(**kwargs):
+            data = {'name': 'Dee', 'frob': {'size': 'large'}, 'extra': 1}
+            data.update(kwargs)
+            return Twiddle.from_dict(data)
+
+        a, b, c = make(), make(extra=2), make(name='Dum')
+        self.assertEquals(a.fingerprint(), b.fingerprint())
+        self.assertNotEquals(a.fingerprint(), c.fingerprint())
+        # Fingerprinting decodes no fields.
+        self.assert_('frob' not in a.__dict__)
+        self.assert_(a != c)
+        self.assert_(a == b)
+
+        # Decoded values have the same fingerprints as their API data.
+        b.frob
+        del b.__dict__['_fingerprint']
+        self.assertEquals(a.fingerprint(), b.fingerprint())
+
+        b.name = 'Dum'
+        self.assert_('_fingerprint' not in b.__dict__)
+        self.assertEquals(b.fingerprint(), c.fingerprint())
+        b.update_from_dict({'name': 'Dee', 'frob': {'size': 'large'}})
+        self.assertEquals(a.fingerprint(), b.fingerprint())
+
+        self.assertEquals(dataobject.unique([a, c, b, make(), c]), [a, c])
+
+    def test_fingerprint_equality(self):
+
+        class Twiddle(self.cls):
+            n = fields.Field()
+            tags = fields.List(fields.Field())
+
+        # Fingerprints of unfrozen instances don't decide equality, as they
+        # can be out of date or differ only in how values are written.
+        a = Twiddle.from_dict({'n': 1, 'tags': ['x']})
+        b = Twiddle.from_dict({'n': 1, 'tags': ['x']})
+        a.fingerprint()
+        b.fingerprint()
+        a.tags.append('y')
+        b.tags.append('y')
+        self.assert_(a == b)
+
+        c = Twiddle.from_dict({'n': 1.0, 'tags': ['x', 'y']})
+        c.fingerprint()
+        self.assertNotEquals(a.fingerprint(), c.fingerprint())
+        self.assert_(a == c)
+
+    def test_fingerprint_nested(self):
+
+        class Frob(self.cls):
+            size = fields.Field()
+
+        class Twiddle(self.cls):
+            name = fields.Field()
+            frob = fields.Object(Frob)
+            frobs = fields.List(fields.Object(Frob))
+
+        def make():
+            return Twiddle.from_dict({'name': 'Dee', 'frob': {'size': 1},
+                'frobs': [{'size': 2}]})
+
+        a, b = make(), make()
+        self.assert_(a == b)
+        self.assertEquals(a.fingerprint(), b.fingerprint())
+
+        # Changing a nested object changes the fingerprint of its owner.
+        a.frob.size = 99
+        self.assert_(a != b)
+        self.assertNotEquals(a.fingerprint(), b.fingerprint())
+        self.assertEquals(dataobject.unique([a, b]), [a, b])
+        b.frob.size = 99
+        self.assert_(a == b)
+        self.assertEquals(a.fingerprint(), b.fingerprint())
+
+        # So does changing objects in lists, and objects decoded after the
+        # fingerprint was made.
+        c, d = make(), make()
+        c.fingerprint()
+        c.frobs[0].size = 99
+        self.assert_(c != d)
+        self.assertEquals(dataobject.unique([c, d]), [c, d])
+        d.frobs[0].update_from_dict({'size': 99})
+        self.assert_(c == d)
+        self.assertEquals(dataobject.unique([c, d]), [c])
+
+        # Objects decoded from frozen instances are frozen too.
+        e = make().freeze()
+        self.assertRaises(AttributeError, setattr, e.frob, 'size', 99)
+        self.assertRaises(AttributeError, setattr, e.frobs[0], 'size', 99)
+        self.assertEquals(hash(e), hash(make().freeze()))
+
+    def test_freeze(self):
+
+        class Twiddle(self.cls):
+            name = fields.Field()
+
+        a = Twiddle.from_dict({'name': 'Dee'}).freeze()
+        b = Twiddle.from_dict({'name': 'Dee'}).freeze()
+        c = Twiddle.from_dict({'name': 'Dum'}).freeze()
+        self.assertEquals(hash(a), hash(b))
+        self.assertEquals(len(set([a, b, c])), 2)
+        self.assertEquals({a: 1, c: 2}[b], 1)
+
+        def change():
+            a.name = 'Dum'
+        self.assertRaises(AttributeError, change)
+        self.assertRaises(AttributeError,
+            lambda: a.update_from_dict({'name': 'Dum'}))
+        self.assertEquals(a.name, 'Dee')
+
+        # Unfrozen instances are still hashed by identity.
+        d = Twiddle.from_dict({'name': 'Dee'})
+        e = Twiddle.from_dict({'name': 'Dee'})
+        self.assertEquals(len(set([d, e])), 2)
+
     def test_strong_types(self):
 
         class Blah(self.cls):
@@ -263,6 +457,36 @@ class TestDataObjects(unittest.TestCase):
         self.assert_(isinstance(r.related, Related))  # not extra_dataobject.Related
         self.assert_(isinstance(r.other,   extra_dataobject.OtherRelated))  # not NotRelated
 
+    def test_reference_caching(self):
+
+        class Cachey(self.cls):
+            name = fields.Field()
+
+        class Feed(self.cls):
+            entries = fields.List(fields.Object('Cachey'))
+
+        lookups = []
+        find_by_name = dataobject.find_by_name
+        def counting_find_by_name(name):
+            lookups.append(name)
+            return find_by_name(name)
+        dataobject.find_by_name = counting_find_by_name
+        try:
+            f = Feed.from_dict({'entries': [{}, {}, {}]})
+            self.assert_(isinstance(f.entries[2], Cachey))
+            self.assertEquals(lookups, ['Cachey'])
+
+            # Declaring a leafier subclass of the same name is noticed.
+            OldCachey = Cachey
+            class Cachey(OldCachey):
+                pass
+
+            f = Feed.from_dict({'entries': [{}, {}]})
+            self.assert_(type(f.entries[1]) is Cachey)
+            self.assertEquals(lookups, ['Cachey', 'Cachey'])
+        finally:
+            dataobject.find_by_name = find_by_name
+
     def set_up_pickling_class(self):
         class BasicMost(self.cls):
             name  = fields.Field()
@@ -403,6 +627,90 @@ class TestDataObjects(unittest.TestCase):
         # Just to make sure
         self.assertEquals(x.alwaysTheSame, noninconstant)
 
+    def test_from_dict_template(self):
+
+        class Plain(self.cls):
+            name = fields.Field()
+
+        a = Plain.from_dict({'name': 'a'})
+        b = Plain.from_dict({'name': 'b'})
+        self.assert_(type(a) is Plain)
+        self.assertEquals((a.name, b.name), ('a', 'b'))
+        self.assert_(Plain.__dict__['_from_dict_template'] is not None)
+        self.assertEquals(sorted(a.__dict__.keys()),
+            sorted(Plain().__dict__.keys() + ['name']))
+        self.assertRaises(TypeError, lambda: Plain.from_dict(['a']))
+
+        inits = []
+
+        class Custom(Plain):
+            def __init__(self, **kwargs):
+                inits.append(self)
+                super(Custom, self).__init__(**kwargs)
+
+        c = Custom.from_dict({'name': 'c'})
+        self.assertEquals(inits, [c])
+        self.assertEquals(c.name, 'c')
+
+        class Mutable(Plain):
+            @dataobject.stock_method
+            def __init__(self, **kwargs):
+                self.tags = []
+                super(Mutable, self).__init__(**kwargs)
+
+        m = Mutable.from_dict({'name': 'm'})
+        n = Mutable.from_dict({'name': 'n'})
+        self.assert_(Mutable.__dict__['_from_dict_template'] is None)
+        self.assert_(m.tags is not n.tags)
+
+    def test_constant_dispatch(self):
+
+        class Asset(self.cls):
+            name = fields.Field()
+
+        class Photo(Asset):
+            kind = fields.Constant('photo', api_name='objectType')
+            width = fields.Field()
+
+        class Post(Asset):
+            kind = fields.Constant('post', api_name='objectType')
+
+        class Tagged(Asset):
+            kind = fields.Constant(['post', 'tagged'], api_name='objectType')
+
+        class Feed(self.cls):
+            entries = fields.List(fields.Object(Asset, discriminator='kind'))
+            pinned = fields.Object('Asset', discriminator='kind')
+
+        f = Feed.from_dict({
+            'entries': [
+                {'objectType': 'photo', 'width': 3},
+                {'objectType': 'post'},
+                {'objectType': ['post', 'tagged']},
+                {'objectType': 'video'},
+                {'name': 'untyped'},
+            ],
+            'pinned': {'objectType': 'post'},
+        })
+        self.assertEquals([type(e) for e in f.entries],
+            [Photo, Post, Tagged, Asset, Asset])
+        self.assertEquals(f.entries[0].width, 3)
+        self.assert_(isinstance(f.pinned, Post))
+
+        self.assert_(Asset.subclass_with_constant_field('kind', 'post')
+            is Post)
+        self.assert_(Asset.subclass_with_constant_field('kind',
+            ['post', 'tagged']) is Tagged)
+        self.assertRaises(ValueError,
+            lambda: Asset.subclass_with_constant_field('kind', 'video'))
+
+        # Leafier subclasses declared later take over their values.
+        class BigPhoto(Photo):
+            pass
+
+        f = Feed.from_dict({'entries': [{'objectType': 'photo'}]})
+        self.assert_(type(f.entries[0]) is BigPhoto)
+
     def test_field_link(self):
 
         class Frob(dataobject.DataObject):
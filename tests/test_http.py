@@ -1,11 +1,18 @@
 from datetime import datetime
 import logging
+import os
+import pickle
+import subprocess
 import sys
+import threading
+import time
 import unittest
 
+import httplib2
 import mox
 
-from remoteobjects import fields, http
+from remoteobjects import cache, fields, http
+from remoteobjects.deadline import Deadline, DeadlineExceeded
 from tests import test_dataobject
 from tests import utils
 
@@ -57,6 +64,24 @@ class TestHttpObjects(unittest.TestCase):
         self.assertEquals(b.value, u"image by \ufffdrew Example")
         mox.Verify(h)
 
+    def test_get_utf8(self):
+
+        class BasicMost(self.cls):
+            name  = fields.Field()
+            value = fields.Field()
+
+        request = {
+            'uri': 'http://example.com/ohhai',
+            'headers': {'accept': 'application/json'},
+        }
+        content = """{"name": "Fred\xc3\xb1", "value": "Andrew \\u00e9"}"""
+
+        h = utils.mock_http(request, content)
+        b = BasicMost.get('http://example.com/ohhai', http=h)
+        self.assertEquals(b.name, u"Fred\xf1")
+        self.assertEquals(b.value, u"Andrew \xe9")
+        mox.Verify(h)
+
     def test_post(self):
 
         class BasicMost(self.cls):
@@ -126,6 +151,109 @@ class TestHttpObjects(unittest.TestCase):
 
         self.assertEquals(b._etag, 'xyz')
 
+    def test_put_omits_nulls(self):
+
+        class BasicMost(self.cls):
+            name  = fields.Field()
+            value = fields.Field()
+
+        request = {
+            'uri': 'http://example.com/bwuh',
+            'headers': {'accept': 'application/json'},
+        }
+        content = """{"name": "Molly", "value": null}"""
+        h = utils.mock_http(request, content)
+        b = BasicMost.get('http://example.com/bwuh', http=h)
+        self.assertEquals(b.name, 'Molly')
+        mox.Verify(h)
+
+        headers = {
+            'accept':       'application/json',
+            'content-type': 'application/json',
+            'if-match':     '7',  # default etag
+        }
+        request  = dict(uri='http://example.com/bwuh', method='PUT',
+                        headers=headers, body="""{"name": "Molly"}""")
+        response = dict(content=content, etag='xyz')
+        h = utils.mock_http(request, response)
+        b.put(http=h)
+        mox.Verify(h)
+
+    def test_encode_body_nested(self):
+
+        class Frob(self.cls):
+            color = fields.Field()
+            size  = fields.Field()
+
+        class Twiddle(self.cls):
+            name  = fields.Field()
+            frob  = fields.Object(Frob)
+            frobs = fields.List(fields.Object(Frob))
+            named = fields.Dict(fields.Object(Frob))
+
+        t = Twiddle.from_dict({
+            'name': 'Dee',
+            'frob': {'color': 'red', 'size': None},
+            'frobs': [{'color': None, 'size': 'big'}],
+            'named': {'x': {'color': 'blue', 'size': None}},
+        })
+        # Decode the nested objects, so they're encoded from their fields.
+        self.assertEquals(t.frob.color, 'red')
+        self.assertEquals(t.frobs[0].size, 'big')
+        self.assertEquals(t.named['x'].color, 'blue')
+
+        self.assertEquals(http.json.loads(t.encode_body()), {
+            'name': 'Dee',
+            'frob': {'color': 'red'},
+            'frobs': [{'size': 'big'}],
+            'named': {'x': {'color': 'blue'}},
+        })
+        self.assert_(t.to_dict()['frob']['size'] is None)
+
+    def test_encode_body_custom_field(self):
+
+        class Frob(self.cls):
+            color = fields.Field()
+            size  = fields.Field()
+
+        class FrobField(fields.Object):
+            def encode(self, value):
+                data = super(FrobField, self).encode(value)
+                data['custom'] = True
+                return data
+
+        class Twiddle(self.cls):
+            frob  = FrobField(Frob)
+            frobs = fields.List(FrobField(Frob))
+
+        t = Twiddle.from_dict({
+            'frob': {'color': 'red', 'size': None},
+            'frobs': [{'color': None, 'size': 'big'}],
+        })
+        self.assertEquals(t.frob.color, 'red')
+        self.assertEquals(t.frobs[0].size, 'big')
+
+        self.assertEquals(http.json.loads(t.encode_body()), {
+            'frob': {'color': 'red', 'custom': True},
+            'frobs': [{'size': 'big', 'custom': True}],
+        })
+
+    def test_encode_strictly(self):
+
+        class BasicMost(self.cls):
+            name  = fields.Field()
+            value = fields.Field()
+
+        b = BasicMost(name='Molly', value=datetime(2009, 8, 7))
+        self.assertEquals(b.encode_body(),
+            """{"name": "Molly", "value": "2009-08-07 00:00:00"}""")
+
+        class StrictMost(BasicMost):
+            encode_strictly = True
+
+        b = StrictMost(name='Molly', value=datetime(2009, 8, 7))
+        self.assertRaises(TypeError, lambda: b.encode_body())
+
     def test_put_failure(self):
 
         class BasicMost(self.cls):
@@ -211,6 +339,167 @@ class TestHttpObjects(unittest.TestCase):
         self.assertRaises(BasicMost.PreconditionFailed, lambda: b.delete(http=h))
         mox.Verify(h)
 
+    def test_response_info(self):
+
+        class BasicMost(self.cls):
+            name  = fields.Field()
+
+        request = {
+            'uri': 'http://example.com/bwuh',
+            'headers': {'accept': 'application/json'},
+        }
+        response = {
+            'content': """{"name": "Molly"}""",
+            'cache-control': 'public, max-age=60',
+            'age': '20',
+            'last-modified': 'Fri, 07 Aug 2009 12:00:00 GMT',
+        }
+        h = utils.mock_http(request, response)
+        b = BasicMost.get('http://example.com/bwuh', http=h)
+        self.assertEquals(b.name, 'Molly')
+        mox.Verify(h)
+
+        info = b._response_info
+        self.assertEquals(info.status, 200)
+        self.assertEquals(info.etag, '7')
+        self.assertEquals(info.last_modified, 'Fri, 07 Aug 2009 12:00:00 GMT')
+        self.assertEquals(info.lifetime, 60)
+        self.assert_(b.is_fresh())
+        self.failIf(b.is_fresh(now=info.fetched + 45))
+
+        cloned = pickle.loads(pickle.dumps(info))
+        self.assertEquals(cloned.lifetime, 60)
+        self.assertEquals(cloned.fetched, info.fetched)
+
+        response = httplib2.Response({
+            'status': 200,
+            'date': 'Fri, 07 Aug 2009 12:00:00 GMT',
+            'expires': 'Fri, 07 Aug 2009 12:05:00 GMT',
+        })
+        info = http.ResponseInfo.from_response(response)
+        self.assertEquals(info.lifetime, 300)
+
+        response = httplib2.Response({
+            'status': 200,
+            'cache-control': 'no-cache',
+        })
+        info = http.ResponseInfo.from_response(response)
+        self.assertEquals(info.lifetime, 0)
+        self.failIf(info.is_fresh())
+
+    def test_refresh(self):
+
+        class BasicMost(self.cls):
+            name  = fields.Field()
+
+        request = {
+            'uri': 'http://example.com/bwuh',
+            'headers': {'accept': 'application/json'},
+        }
+        response = {
+            'content': """{"name": "Molly"}""",
+            'cache-control': 'max-age=60',
+        }
+        h = utils.mock_http(request, response)
+        b = BasicMost.get('http://example.com/bwuh', http=h)
+        self.assertEquals(b.name, 'Molly')
+        mox.Verify(h)
+
+        # Fresh data isn't requested again.
+        h = mox.MockObject(httplib2.Http)
+        mox.Replay(h)
+        self.failIf(b.refresh(http=h))
+        mox.Verify(h)
+
+        b._response_info.fetched -= 120
+        self.failIf(b.is_fresh())
+
+        request = {
+            'uri': 'http://example.com/bwuh',
+            'headers': {'accept': 'application/json', 'if-none-match': '7'},
+        }
+        response = {'status': 304, 'cache-control': 'max-age=30'}
+        h = utils.mock_http(request, response)
+        self.assert_(b.refresh(http=h))
+        mox.Verify(h)
+
+        self.assert_(b.is_fresh())
+        self.assertEquals(b._response_info.lifetime, 30)
+        self.assertEquals(b._response_info.etag, '7')
+        self.assertEquals(b.name, 'Molly')
+
+    def test_deadline(self):
+
+        class BasicMost(self.cls):
+            name = fields.Field()
+
+        def respond(uri, headers):
+            return ({'status': 200, 'content-type': 'application/json'},
+                    '{"name": "Molly"}')
+
+        h = utils.FakeHttp(respond)
+        url = 'http://example.com/ohhai'
+
+        def fetch(**kwargs):
+            return BasicMost.get(url, http=h, **kwargs).name
+
+        self.assertRaises(DeadlineExceeded, lambda: fetch(timeout=-1))
+        with Deadline(-1):
+            self.assertRaises(DeadlineExceeded, fetch)
+            # A later deadline can't extend an earlier one.
+            self.assertRaises(DeadlineExceeded, lambda: fetch(timeout=30))
+        self.assertEquals(h.requests, [])
+
+        with Deadline(30):
+            self.assertEquals(fetch(timeout=30), 'Molly')
+        self.assertEquals(len(h.requests), 1)
+
+    def test_deadline_timeout(self):
+        h = httplib2.Http()
+        d = Deadline(5)
+
+        def timeout(**kwargs):
+            self.assert_(0 < h.timeout <= 5)
+            raise http.socket.timeout('timed out')
+
+        h.request = timeout
+        request = {'uri': 'http://example.com/slow'}
+        self.assertRaises(DeadlineExceeded,
+            lambda: http.send_request(h, request, d))
+        self.assert_(h.timeout is None)
+
+    def test_deadline_shared_agent(self):
+        h = httplib2.Http()
+        started = threading.Event()
+        proceed = threading.Event()
+        seen = []
+
+        def request(**kwargs):
+            before = h.timeout
+            started.set()
+            proceed.wait(5)
+            seen.append((before, h.timeout))
+            return httplib2.Response({'status': 200}), ''
+
+        h.request = request
+        req = {'uri': 'http://example.com/slow'}
+        first = threading.Thread(target=lambda: http.send_request(h, req, 30))
+        first.start()
+        started.wait(5)
+        # Another thread's deadline doesn't change the timeout of a request
+        # in progress.
+        second = threading.Thread(target=lambda: http.send_request(h, req, 10))
+        second.start()
+        time.sleep(0.05)
+        proceed.set()
+        first.join()
+        second.join()
+
+        self.assertEquals(len(seen), 2)
+        for before, after in seen:
+            self.assertEquals(before, after)
+        self.assert_(h.timeout is None)
+
     def test_not_found(self):
         self.assert_(self.cls.NotFound)
 
@@ -228,6 +517,73 @@ class TestHttpObjects(unittest.TestCase):
         self.assertRaises(Huh.NotFound, lambda: Huh.get('http://example.com/bwuh', http=http).name)
         mox.Verify(http)
 
+    def test_negative_cache(self):
+
+        class Huh(self.cls):
+            name = fields.Field()
+
+        Huh.negative_cache = cache.NegativeCache(ttl=30, max_size=2)
+
+        def respond(uri, headers):
+            status = {'/gone': 410, '/secret': 403, '/ok': 200}.get(
+                uri[len('http://example.com'):], 404)
+            return ({'status': status, 'content-type': 'application/json'},
+                    '{"name": "Molly"}')
+
+        h = utils.FakeHttp(respond)
+
+        def fetch(path):
+            return Huh.get('http://example.com' + path, http=h).name
+
+        for i in range(2):
+            self.assertRaises(Huh.NotFound, lambda: fetch('/bwuh'))
+            self.assertRaises(Huh.Gone, lambda: fetch('/gone'))
+        self.assertEquals(len(h.requests), 2)
+        self.assertEquals(fetch('/ok'), 'Molly')
+        self.assertEquals(fetch('/ok'), 'Molly')
+        self.assertEquals(len(h.requests), 4)
+
+        # The oldest failure is forgotten to make room for newer ones.
+        self.assertRaises(Huh.Forbidden, lambda: fetch('/secret'))
+        self.assertEquals(len(Huh.negative_cache), 2)
+        self.assertRaises(Huh.NotFound, lambda: fetch('/bwuh'))
+        self.assertEquals(len(h.requests), 6)
+
+        # Expired failures are requested again.
+        Huh.negative_cache.ttl = -1
+        Huh.negative_cache.add(Huh, 'http://example.com/bwuh',
+            Huh.NotFound('No such Huh'))
+        self.assertRaises(Huh.NotFound, lambda: fetch('/bwuh'))
+        self.assertEquals(len(h.requests), 7)
+
+        # 410 responses are still BadResponses, as they used to be.
+        self.assert_(issubclass(Huh.Gone, Huh.BadResponse))
+
+    def test_negative_cache_writes(self):
+
+        class Huh(self.cls):
+            name = fields.Field()
+
+        Huh.negative_cache = cache.NegativeCache()
+
+        def respond(uri, headers, method='GET', body=None):
+            if method == 'GET':
+                return ({'status': 200, 'content-type': 'application/json'},
+                        '{"name": "Molly"}')
+            return {'status': 404}, ''
+
+        h = utils.FakeHttp(respond)
+        collection = Huh()
+        collection._location = 'http://example.com/huhs'
+        self.assertRaises(Huh.NotFound,
+            lambda: collection.post(Huh(name='Fred'), http=h))
+
+        # The failed POST says nothing about GETting the collection.
+        self.assertEquals(len(Huh.negative_cache), 0)
+        self.assertEquals(Huh.get('http://example.com/huhs', http=h).name,
+            'Molly')
+        self.assertEquals(len(h.requests), 2)
+
     @utils.todo
     def test_not_found_discrete(self):
         """Checks that the NotFound exceptions for different HttpObjects are
@@ -269,6 +625,28 @@ class TestHttpObjects(unittest.TestCase):
         mox.Verify(http)
 
 
+class TestImports(unittest.TestCase):
+
+    def test_lazy_imports(self):
+        # Check in a fresh interpreter, as this one has imported everything.
+        script = ("import sys, remoteobjects\n"
+            "print sorted(m for m in ('httplib2', 'simplejson', 'email.utils')"
+            " if m in sys.modules)\n"
+            "print remoteobjects.http.userAgent\n"
+            "print type(remoteobjects.http.user_agent()).__name__\n"
+            "print 'httplib2' in sys.modules\n"
+            # The default user agent can still be configured in place.
+            "remoteobjects.http.userAgent.add_credentials('molly', 'secret')\n"
+            "print list(remoteobjects.http.user_agent().credentials.iter(''))\n")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        proc = subprocess.Popen([sys.executable, '-c', script], cwd=root,
+            stdout=subprocess.PIPE)
+        output = proc.communicate()[0]
+        self.assertEquals(output.split('\n'), ['[]',
+            '<LazyUserAgent for None>', 'Http', 'True',
+            "[('molly', 'secret')]", ''])
+
+
 if __name__ == '__main__':
     utils.log()
     unittest.main()
@@ -1,5 +1,10 @@
 import unittest
 
+import array
+from datetime import datetime
+import sys
+import threading
+
 import httplib2
 import mox
 
@@ -58,3 +63,147 @@ class TestPageObjects(unittest.TestCase):
         self.assertEqual(b[7], 7)
 
         mox.Verify(h)        
+
+    def test_columns(self):
+
+        class Toy(http.HttpObject):
+            name = fields.Field()
+            size = fields.Field(default=0)
+            born = fields.Datetime()
+
+        class Toys(listobject.ListObject):
+            entries = fields.List(fields.Object(Toy))
+
+        t = Toys.from_dict([
+            {'name': 'ball', 'size': 3, 'born': '2009-01-02T03:04:05Z'},
+            {'name': 'kite', 'size': 12},
+            {'name': 'yoyo', 'size': 1.5},
+        ])
+        sizes = t.column('size')
+        self.assert_(isinstance(sizes, array.array))
+        self.assertEquals(sizes.typecode, 'd')
+        self.assertEquals(list(sizes), [3.0, 12.0, 1.5])
+
+        names, born = t.columns('name', 'born')
+        self.assertEquals(names, ['ball', 'kite', 'yoyo'])
+        self.assertEquals(born, [datetime(2009, 1, 2, 3, 4, 5), None, None])
+
+        # No entry objects were made.
+        self.assert_('entries' not in t.__dict__)
+
+        t = Toys.from_dict([{'name': 'ball', 'size': 3}, {'name': 'kite'}])
+        sizes = t.column('size')
+        self.assertEquals(sizes.typecode, 'l')
+        self.assertEquals(list(sizes), [3, 0])
+
+        # Decoded entries are used as they are.
+        t.entries[1].size = 7
+        self.assertEquals(list(t.column('size')), [3, 7])
+
+        # Without NumPy, columns asked for as NumPy arrays are lists.
+        try:
+            import numpy
+        except ImportError:
+            self.assertEquals(t.column('size', as_numpy=True), [3, 7])
+        else:
+            self.assertEquals(list(t.column('size', as_numpy=True)), [3, 7])
+
+    def test_columns_discriminator(self):
+
+        class Asset(http.HttpObject):
+            name = fields.Field()
+
+        class Photo(Asset):
+            kind = fields.Constant('photo', api_name='objectType')
+            width = fields.Field(api_name='pixelWidth', default=100)
+
+        class Post(Asset):
+            kind = fields.Constant('post', api_name='objectType')
+            width = fields.Field()
+
+        class Assets(listobject.ListObject):
+            entries = fields.List(fields.Object(Asset, discriminator='kind'))
+
+        data = [
+            {'objectType': 'photo', 'name': 'cat', 'pixelWidth': 640},
+            {'objectType': 'post', 'name': 'hi', 'width': 'wide'},
+            {'objectType': 'photo', 'name': 'dog'},
+            {'name': 'thing'},
+        ]
+        t = Assets.from_dict(data)
+        self.assertEquals(t.column('width'), [640, 'wide', 100, None])
+        self.assertEquals(list(t.column('name')), ['cat', 'hi', 'dog', 'thing'])
+        self.assert_('entries' not in t.__dict__)
+
+        # Decoded entries give the same values.
+        t.entries
+        self.assertEquals(t.column('width'), [640, 'wide', 100, None])
+
+    def test_projection(self):
+
+        class Toy(http.HttpObject):
+            name = fields.Field()
+            size = fields.Field(api_name='bigness')
+
+        class Toys(listobject.ListObject):
+            entries = fields.List(fields.Object(Toy))
+            projection = ['size']
+
+        t = Toys.get('http://example.com/toys')
+        self.assertEquals(t._location, 'http://example.com/toys?fields=bigness')
+
+        request = dict(uri=t._location,
+            headers={'accept': 'application/json'})
+        content = """[{"name": "ball", "bigness": 3}, {"name": "kite"}]"""
+        t._http = utils.mock_http(request, content)
+        self.assertEquals(t.column('size'), [3, None])
+        self.assertEquals(t.api_data['entries'], [{'bigness': 3}, {}])
+
+    def test_generated_classes(self):
+
+        class Gadget(http.HttpObject):
+            name = fields.Field()
+
+        start = threading.Event()
+        made = []
+
+        def make():
+            start.wait()
+            made.append(listobject.PageOf(Gadget))
+
+        threads = [threading.Thread(target=make) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(len(made), 8)
+        cls = made[0]
+        for other in made:
+            self.assert_(other is cls)
+        self.assert_(issubclass(cls, listobject.PageObject))
+        self.assert_(sys.modules[listobject.PageOf._modulename].PageOfGadget
+            is cls)
+
+        # Classes are the same whether named or given directly.
+        self.assert_(listobject.PageOf('Gadget') is cls)
+
+        # Classes can be made up front, and are then used as they are.
+        prepared = listobject.ListOf.prepare(Gadget)
+        self.assertEquals([c.__name__ for c in prepared], ['ListOfGadget'])
+        self.assert_(listobject.ListOf(Gadget) is prepared[0])
+        self.assert_(listobject.ListOf('Gadget') is prepared[0])
+        self.assert_(issubclass(prepared[0], listobject.ListObject))
+        self.assert_(prepared[0].fields['entries'].fld.cls is Gadget)
+
+        # Classes given directly stay bound to them, even once another class
+        # has the same name.
+        class Gadget(http.HttpObject):
+            name = fields.Field()
+
+        page = cls.from_dict({'entries': [{'name': 'spork'}]})
+        self.assert_(type(page.entries[0]) is made[0].fields['entries'].fld.cls)
+        self.assert_(type(page.entries[0]) is not Gadget)
+        self.assert_(listobject.PageOf('Gadget') is listobject.PageOf(Gadget))
+        self.assert_(listobject.PageOf(Gadget) is not cls)
@@ -0,0 +1,106 @@
+import gc
+import unittest
+
+from remoteobjects import fields, http, listobject, memory, promise
+from tests import utils
+
+
+class TestMemoryReport(unittest.TestCase):
+
+    def tearDown(self):
+        memory.stop_tracking()
+
+    def make_classes(self):
+
+        class Author(http.HttpObject):
+            name = fields.Field()
+
+        class Post(http.HttpObject):
+            title = fields.Field()
+            author = fields.Object(Author)
+
+        class Posts(listobject.ListObject):
+            entries = fields.List(fields.Object(Post))
+
+        return Author, Post, Posts
+
+    def make_page(self, Posts):
+        data = [{'title': 'post %d' % i, 'author': {'name': 'x' * 100}}
+                for i in range(5)]
+        page = Posts.from_dict(data)
+        page._location = 'http://example.com/posts'
+        return page
+
+    def test_report(self):
+        Author, Post, Posts = self.make_classes()
+        page = self.make_page(Posts)
+
+        before = memory.report([page])
+        self.assertEquals(before.classes.keys(), ['Posts'])
+        self.assertEquals(before.count, 1)
+        raw = before.classes['Posts'].raw
+        self.assert_(raw > 5 * 100)
+
+        # Decoding entries finds their instances, without counting the
+        # same data twice.
+        for post in page.entries:
+            post.author.name
+            post._location = 'http://example.com/post'
+        after = memory.report([page])
+        self.assertEquals(sorted(after.classes.keys()),
+            ['Author', 'Post', 'Posts'])
+        self.assertEquals(after.classes['Post'].count, 5)
+        self.assertEquals(after.classes['Author'].count, 5)
+        self.assertEquals(after.classes['Posts'].raw, raw)
+        self.assertEquals(after.classes['Author'].raw, 0)
+        self.assert_(after.classes['Posts'].decoded > 0)
+        self.assertEquals(after.duplicates, {'http://example.com/post': 5})
+        self.assert_(after.total > before.total)
+
+        text = after.format()
+        self.assert_(text.splitlines()[0].startswith('class '))
+        self.assert_('       5 http://example.com/post' in text)
+
+    def test_duplicate_promises(self):
+
+        class Post(promise.PromiseObject):
+            title = fields.Field()
+
+        # Promises whose URLs haven't been built yet still count.
+        post = Post.get('http://example.com/posts')
+        posts = [post.filter(limit=5), post.filter(limit=5)]
+        self.failIf('_location' in posts[0].__dict__)
+        result = memory.report(posts)
+        self.assertEquals(result.duplicates,
+            {'http://example.com/posts?limit=5': 2})
+        self.failIf(posts[0]._delivered)
+
+    def test_tracking(self):
+        Author, Post, Posts = self.make_classes()
+
+        untracked = Post.from_dict({'title': 'untracked'})
+        memory.start_tracking()
+        page = self.make_page(Posts)
+        author = Author(name='Fred')
+        self.assert_(memory.report().classes['Posts'].count >= 1)
+        tracked = memory.tracked()
+        self.assert_(page in tracked)
+        self.assert_(author in tracked)
+        self.assert_(untracked not in tracked)
+
+        del page, tracked
+        gc.collect()
+        self.assertEquals([type(o) for o in memory.tracked()
+            if isinstance(o, Posts)], [])
+
+    def test_deep_size(self):
+        shared = ['x' * 50]
+        seen = set()
+        first = memory.deep_size({'a': shared}, seen)
+        second = memory.deep_size({'b': shared}, seen)
+        self.assert_(second < first)
+
+
+if __name__ == '__main__':
+    utils.log()
+    unittest.main()
@@ -1,13 +1,23 @@
+import gc
+import pickle
+import threading
 import unittest
 
 import httplib2
 import mox
 
-from remoteobjects import fields, http, promise
+from remoteobjects import cache, codec, fields, http, promise, futures
+from remoteobjects.deadline import DeadlineExceeded
+from remoteobjects.listobject import ListOf
 from tests import test_dataobject, test_http
 from tests import utils
 
 
+class ProjectedToy(promise.PromiseObject):
+    name = fields.Field()
+    size = fields.Field()
+
+
 class TestDataObjects(test_dataobject.TestDataObjects):
 
     cls = promise.PromiseObject
@@ -68,6 +78,108 @@ class TestPromiseObjects(unittest.TestCase):
         # Nobody did any HTTP, right?
         mox.Verify(h)
 
+    def test_filter_query(self):
+
+        class Toy(self.cls):
+            name = fields.Field()
+
+        b = Toy.get('http://example.com/foo?tag=a&tag=b&z=1#frag')
+        x = b.filter(limit=10).filter(offset=20).filter(limit=5)
+
+        # The URL isn't built until it's needed.
+        self.failIf('_location' in x.__dict__)
+        self.assertEquals(x.split_query(), ('http://example.com/foo#frag',
+            (('limit', 5), ('offset', 20), ('tag', 'a'), ('tag', 'b'),
+             ('z', '1'))))
+        self.assertEquals(x._location,
+            'http://example.com/foo?limit=5&offset=20&tag=a&tag=b&z=1#frag')
+
+        # Filters in any order make the same URL.
+        y = b.filter(offset=20, limit=5)
+        self.assertEquals(y._location, x._location)
+
+        y = b.filter(tag=['c', 'd'])
+        self.assertEquals(y._location,
+            'http://example.com/foo?tag=c&tag=d&z=1#frag')
+
+        # Setting the URL directly drops the old query.
+        y._location = 'http://example.com/bar?q=1'
+        self.assertEquals(y.filter(r=2)._location,
+            'http://example.com/bar?q=1&r=2')
+
+        # Unbuilt URLs are still pickled.
+        self.assertEquals(x.__getstate__()['_location'], x._location)
+
+    def test_projection(self):
+
+        class Toy(self.cls):
+            name = fields.Field()
+            color = fields.Field(api_name='colour')
+            size = fields.Field()
+
+        class NamedToy(Toy):
+            projection = ['name']
+
+        t = NamedToy.get('http://example.com/toy?z=1')
+        self.assertEquals(t._location, 'http://example.com/toy?fields=name&z=1')
+
+        t = Toy.get('http://example.com/toy', projection=['name', 'color'])
+        self.assertEquals(t._location,
+            'http://example.com/toy?fields=name%2Ccolour')
+
+        # Filtered instances ask for the same fields unless told otherwise.
+        x = t.filter(limit=5)
+        self.assertEquals(x._location,
+            'http://example.com/toy?fields=name%2Ccolour&limit=5')
+        x = t.filter(projection=['size'])
+        self.assertEquals(x._location, 'http://example.com/toy?fields=size')
+
+        request = dict(uri=t._location,
+            headers={'accept': 'application/json'})
+        content = """{"name": "Ball", "colour": "red", "size": 3}"""
+        t._http = utils.mock_http(request, content)
+        self.assertEquals(t.name, 'Ball')
+        self.assertEquals(t.color, 'red')
+        self.assert_(t.size is None)
+        self.assertEquals(sorted(t.api_data.keys()), ['colour', 'name'])
+
+        # Projected instances can't be saved, as that would erase the fields
+        # they don't have.
+        t.name = 'Bat'
+        self.assertRaises(ValueError, t.put)
+
+        # Instances with all their data can be.
+        t = NamedToy.from_dict({'name': 'Ball', 'size': 3})
+        t._location = 'http://example.com/toy'
+        request = dict(uri=t._location, method='PUT',
+            body='{"name": "Ball", "size": 3}',
+            headers={'accept': 'application/json',
+                     'content-type': 'application/json'})
+        t._http = utils.mock_http(request, '{"name": "Ball", "size": 3}')
+        t.put(http=t._http)
+        self.assertEquals(t.size, 3)
+        mox.Verify(t._http)
+
+    def test_projection_state(self):
+
+        def respond(uri, headers):
+            return ({'status': 200, 'content-type': 'application/json'},
+                    '{"name": "Ball", "size": 3}')
+
+        h = utils.FakeHttp(respond)
+        t = ProjectedToy.get('http://example.com/toy', http=h,
+            projection=['name'])
+        self.assertEquals(t.name, 'Ball')
+
+        # Saved and restored projected instances still can't be saved.
+        for copy in (pickle.loads(pickle.dumps(t, 2)),
+                     codec.loads(codec.dumps(t))):
+            self.assertEquals(copy.projection, ('name',))
+            self.assertEquals(copy.api_data, {'name': 'Ball'})
+            copy.name = 'Bat'
+            self.assertRaises(ValueError, copy.put, http=h)
+        self.assertEquals(len(h.requests), 1)
+
     def test_awesome(self):
 
         class Toy(self.cls):
@@ -80,3 +192,490 @@ class TestPromiseObjects(unittest.TestCase):
         b = r.toybox
         self.assert_(isinstance(b, Toy))
         self.assertEquals(b._location, 'http://example.com/bwuh/toybox')
+
+
+class TestEagerPromiseObjects(unittest.TestCase):
+
+    cls = promise.PromiseObject
+
+    def make_http(self, gate=None):
+        def respond(uri, headers):
+            if gate is not None:
+                gate.wait()
+            return ({'status': 200, 'content-type': 'application/json'},
+                    """{"name": "%s"}""" % uri.rsplit('/', 1)[-1])
+        return utils.FakeHttp(respond)
+
+    def test_eager(self):
+
+        class Tiny(self.cls):
+            name = fields.Field()
+
+        h = self.make_http()
+        executor = futures.Executor(workers=2, http_factory=lambda: h)
+        t = Tiny.get('http://example.com/molly', http=h, executor=executor)
+        t._future.wait()
+
+        # The request was made before the data was used.
+        self.assertEquals(len(h.requests), 1)
+        self.failIf(t._delivered)
+        self.assertEquals(t.name, 'molly')
+        self.assertEquals(len(h.requests), 1)
+
+        class Eager(Tiny):
+            pass
+
+        Eager.executor = executor
+        e = Eager.get('http://example.com/fred', http=h)
+        self.assert_(e._future is not None)
+        self.assertEquals(e.name, 'fred')
+        self.assertEquals(len(h.requests), 2)
+
+        executor.shutdown()
+
+    def test_bounded(self):
+
+        class Tiny(self.cls):
+            name = fields.Field()
+
+        gate = threading.Event()
+        h = self.make_http(gate)
+        executor = futures.Executor(workers=1, max_queue=1,
+            http_factory=lambda: h)
+
+        first = Tiny.get('http://example.com/first', http=h, executor=executor)
+        while not h.requests:
+            gate.wait(0.01)
+        second = Tiny.get('http://example.com/second', http=h,
+            executor=executor)
+        # The queue is full, so this one waits to be delivered normally.
+        third = Tiny.get('http://example.com/third', http=h,
+            executor=executor)
+        self.assert_(first._future is not None)
+        self.assert_(second._future is not None)
+        self.assert_(third._future is None)
+
+        # Cancelled promises are requested when delivered instead.
+        self.assert_(second.cancel())
+        gate.set()
+        self.assertEquals(first.name, 'first')
+        self.assertEquals(second.name, 'second')
+        self.assertEquals(third.name, 'third')
+        self.assertEquals(len(h.requests), 3)
+
+        executor.shutdown()
+
+    def test_discarded(self):
+
+        class Tiny(self.cls):
+            name = fields.Field()
+
+        gate = threading.Event()
+        h = self.make_http(gate)
+        executor = futures.Executor(workers=1, http_factory=lambda: h)
+
+        first = Tiny.get('http://example.com/first', http=h, executor=executor)
+        unused = Tiny.get('http://example.com/unused', http=h,
+            executor=executor)
+        future = unused._future
+        del unused
+        gc.collect()
+        self.assert_(future.cancelled())
+
+        gate.set()
+        self.assertEquals(first.name, 'first')
+        executor.shutdown()
+        self.assertEquals(len(h.requests), 1)
+
+    def test_deadline(self):
+
+        class Tiny(self.cls):
+            name = fields.Field()
+
+        gate = threading.Event()
+        h = self.make_http(gate)
+        executor = futures.Executor(workers=1, http_factory=lambda: h)
+
+        first = Tiny.get('http://example.com/first', http=h, executor=executor)
+        late = Tiny.get('http://example.com/late', http=h, executor=executor,
+            timeout=0.05)
+        future = late._future
+        # The late promise gives up while its request is still queued.
+        self.assertRaises(DeadlineExceeded, late.deliver)
+        self.assert_(future.cancelled())
+
+        gate.set()
+        self.assertEquals(first.name, 'first')
+        executor.shutdown()
+        self.assertEquals(len(h.requests), 1)
+
+    def test_worker_user_agent(self):
+
+        class Tiny(self.cls):
+            name = fields.Field()
+
+        # A user agent given to get() is never used from a worker thread.
+        mine = self.make_http()
+        workers = self.make_http()
+        executor = futures.Executor(workers=1, http_factory=lambda: workers)
+        t = Tiny.get('http://example.com/molly', http=mine, executor=executor)
+        self.assertEquals(t.name, 'molly')
+        self.assertEquals(len(mine.requests), 0)
+        self.assertEquals(len(workers.requests), 1)
+        executor.shutdown()
+
+        # By default, workers copy the default user agent's settings.
+        default = httplib2.Http(timeout=7)
+        default.add_credentials('fred', 'xyzzy')
+        old_agent, http.userAgent = http.userAgent, default
+        try:
+            executor = futures.Executor(workers=1)
+            agent = executor.submit(executor.http).result()
+            executor.shutdown()
+        finally:
+            http.userAgent = old_agent
+        self.assert_(agent is not default)
+        self.assertEquals(agent.timeout, 7)
+        self.assertEquals(list(agent.credentials.iter('')),
+            [('fred', 'xyzzy')])
+        self.assert_(agent.connections is not default.connections)
+
+
+class TestObjectCache(unittest.TestCase):
+
+    cls = promise.PromiseObject
+
+    def test_fresh(self):
+
+        class Tiny(self.cls):
+            name = fields.Field()
+
+        Tiny.object_cache = cache.ObjectCache(max_size=10)
+
+        def respond(uri, headers):
+            cache_control = uri.endswith('/molly') and 'max-age=60' or 'no-cache'
+            return ({'status': 200, 'content-type': 'application/json',
+                     'cache-control': cache_control, 'etag': '"1"'},
+                    '{"name": "Molly"}')
+
+        h = utils.FakeHttp(respond)
+        for i in range(3):
+            t = Tiny.get('http://example.com/molly', http=h)
+            self.assertEquals(t.name, 'Molly')
+            self.assertEquals(t._etag, '"1"')
+        self.assertEquals(len(h.requests), 1)
+
+        # Cached data is copied, so changing one instance leaves the rest.
+        t.api_data['name'] = 'Fred'
+        t = Tiny.get('http://example.com/molly', http=h)
+        self.assertEquals(t.name, 'Molly')
+
+        # Uncacheable responses are not kept.
+        for i in range(2):
+            self.assertEquals(Tiny.get('http://example.com/other',
+                http=h).name, 'Molly')
+        self.assertEquals(len(h.requests), 3)
+        self.assertEquals(len(Tiny.object_cache), 1)
+
+    def test_stale_while_revalidate(self):
+
+        class Tiny(self.cls):
+            name = fields.Field()
+
+        executor = futures.Executor(workers=1, http_factory=lambda: h)
+        Tiny.object_cache = cache.ObjectCache(grace=60, executor=executor)
+        gate = threading.Event()
+        versions = ['Molly', 'Molly', 'Fred']
+
+        def respond(uri, headers):
+            version = len(h.requests) - 1
+            if version:
+                gate.wait()
+            # Only the last version is fresh when it's delivered.
+            age = version < 2 and '5' or '0'
+            if headers.get('if-none-match') == '"%d"' % (version - 1):
+                if versions[version] == versions[version - 1]:
+                    return {'status': 304, 'cache-control': 'max-age=1',
+                            'age': age}, ''
+            return ({'status': 200, 'content-type': 'application/json',
+                     'cache-control': 'max-age=1', 'age': age,
+                     'etag': '"%d"' % version},
+                    '{"name": "%s"}' % versions[version])
+
+        h = utils.FakeHttp(respond)
+        url = 'http://example.com/tiny'
+        self.assertEquals(Tiny.get(url, http=h).name, 'Molly')
+
+        # The stale data is delivered right away while it's refreshed.
+        t = Tiny.get(url, http=h)
+        self.assertEquals(t.name, 'Molly')
+        gate.set()
+        executor.shutdown()
+        self.assertEquals(len(h.requests), 2)
+        self.assertEquals(h.requests[1]['headers']['if-none-match'], '"0"')
+        self.assertEquals(t._etag, '"0"')
+
+        gate.clear()
+        executor = Tiny.object_cache.executor = futures.Executor(workers=1,
+            http_factory=lambda: h)
+        t = Tiny.get(url, http=h)
+        self.assertEquals(t.name, 'Molly')
+        gate.set()
+        executor.shutdown()
+        self.assertEquals(len(h.requests), 3)
+
+        # The changed data was swapped into the instance.
+        self.assertEquals(t.name, 'Fred')
+        self.assertEquals(t._etag, '"2"')
+        self.assertEquals(Tiny.get(url, http=h).name, 'Fred')
+        self.assertEquals(len(h.requests), 3)
+
+    def test_revalidate_local_changes(self):
+
+        class Frob(self.cls):
+            size = fields.Field()
+
+        class Tiny(self.cls):
+            name = fields.Field()
+            frob = fields.Object(Frob)
+
+        gate = threading.Event()
+        versions = [('Molly', 1), ('Fred', 2), ('Fred', 3)]
+
+        def respond(uri, headers):
+            version = len(h.requests) - 1
+            if version:
+                gate.wait()
+            name, size = versions[version]
+            return ({'status': 200, 'content-type': 'application/json',
+                     'cache-control': 'max-age=1', 'age': '5',
+                     'etag': '"%d"' % version},
+                    '{"name": "%s", "frob": {"size": %d}}' % (name, size))
+
+        h = utils.FakeHttp(respond)
+        url = 'http://example.com/tiny'
+        Tiny.object_cache = cache.ObjectCache(grace=60)
+        self.assertEquals(Tiny.get(url, http=h).name, 'Molly')
+
+        # Fields set while the refresh is running are kept, and so would
+        # be put, though the cache gets the new data.
+        executor = Tiny.object_cache.executor = futures.Executor(workers=1,
+            http_factory=lambda: h)
+        t = Tiny.get(url, http=h)
+        self.assertEquals(t.name, 'Molly')
+        t.name = 'Local'
+        gate.set()
+        executor.shutdown()
+        self.assertEquals(len(h.requests), 2)
+        self.assertEquals(t.name, 'Local')
+        self.assertEquals(t.to_dict(), {'name': 'Local', 'frob': {'size': 1}})
+        self.assertEquals(t._etag, '"0"')
+        self.assertEquals(Tiny.object_cache.lookup(Tiny, url).data['name'],
+            'Fred')
+
+        # So are changes to nested objects.
+        gate.clear()
+        executor = Tiny.object_cache.executor = futures.Executor(workers=1,
+            http_factory=lambda: h)
+        t = Tiny.get(url, http=h)
+        t.frob.size = 99
+        gate.set()
+        executor.shutdown()
+        self.assertEquals(len(h.requests), 3)
+        self.assertEquals(t.frob.size, 99)
+        self.assertEquals(t.to_dict(), {'name': 'Fred', 'frob': {'size': 99}})
+
+
+class TestDeliverGraph(unittest.TestCase):
+
+    cls = promise.PromiseObject
+
+    def test_deliver_graph(self):
+
+        class Ref(fields.Field):
+            """Decodes a URL into a promise for the referenced object."""
+            def __init__(self, cls, **kwargs):
+                super(Ref, self).__init__(**kwargs)
+                self.cls = cls
+            def decode(self, value):
+                return self.cls.get(value)
+
+        class Feed(self.cls):
+            name = fields.Field()
+
+        class User(self.cls):
+            name = fields.Field()
+            feed = Ref(Feed)
+
+        class Entry(self.cls):
+            title  = fields.Field()
+            author = Ref(User)
+
+        class Timeline(self.cls):
+            entries = fields.List(fields.Object(Entry))
+
+        resources = {
+            '/timeline': {'entries': [
+                {'title': 'a', 'author': 'http://example.com/users/1'},
+                {'title': 'b', 'author': 'http://example.com/users/2'},
+                {'title': 'c', 'author': 'http://example.com/users/1'},
+            ]},
+            '/users/1': {'name': 'Molly', 'feed': 'http://example.com/feeds/1'},
+            '/users/2': {'name': 'Fred', 'feed': 'http://example.com/feeds/2'},
+            '/feeds/1': {'name': 'Molly feed'},
+            '/feeds/2': {'name': 'Fred feed'},
+        }
+
+        def respond(uri, headers):
+            path = uri[len('http://example.com'):]
+            return ({'status': 200, 'content-type': 'application/json'},
+                    http.json.dumps(resources[path]))
+
+        h = utils.FakeHttp(respond)
+        executor = futures.Executor(workers=3, http_factory=lambda: h)
+        t = Timeline.get('http://example.com/timeline')
+        result = promise.deliver_graph(t, ['entries', 'entries.author.feed'],
+            executor=executor)
+        executor.shutdown()
+
+        self.assertEquals(result.waves, 3)
+        self.assertEquals(result.requests, 5)
+        self.assertEquals(len(h.requests), 5)
+        self.assertEquals(result.errors, {})
+        self.assertEquals(len(result.objects['entries']), 3)
+        self.assertEquals(len(result.objects['entries.author']), 3)
+        self.assertEquals(len(result.objects['entries.author.feed']), 3)
+
+        # Everything is delivered, including the duplicate user.
+        a, b, c = t.entries
+        self.assert_(c.author is not a.author)
+        self.assert_(c.author._delivered)
+        self.assertEquals(c.author.name, 'Molly')
+        self.assertEquals(c.author.feed.name, 'Molly feed')
+        self.assertEquals(b.author.feed.name, 'Fred feed')
+        self.assertEquals(len(h.requests), 5)
+
+    def test_deliver_graph_shared_lists(self):
+
+        class Ref(fields.Field):
+            def __init__(self, cls, **kwargs):
+                super(Ref, self).__init__(**kwargs)
+                self.cls = cls
+            def decode(self, value):
+                return self.cls.get(value)
+
+        class Post(self.cls):
+            title = fields.Field()
+
+        class User(self.cls):
+            name  = fields.Field()
+            posts = Ref(ListOf(Post))
+
+        class Group(self.cls):
+            members = fields.List(Ref(User))
+
+        resources = {
+            '/group': {'members': ['http://example.com/users/1',
+                                   'http://example.com/users/1', None]},
+            '/users/1': {'name': 'Molly', 'posts': 'http://example.com/posts'},
+            '/posts': [{'title': 'a'}, {'title': 'b'}],
+        }
+
+        def respond(uri, headers):
+            path = uri[len('http://example.com'):]
+            return ({'status': 200, 'content-type': 'application/json'},
+                    http.json.dumps(resources[path]))
+
+        h = utils.FakeHttp(respond)
+        executor = futures.Executor(workers=2, http_factory=lambda: h)
+        g = Group.get('http://example.com/group')
+        result = promise.deliver_graph(g, ['members.posts'],
+            executor=executor)
+        executor.shutdown()
+
+        self.assertEquals(result.errors, {})
+        self.assertEquals(result.requests, 3)
+        self.assertEquals(len(h.requests), 3)
+
+        # The duplicate user's list was filled from the delivered one's data
+        # as it was, not wrapped again.
+        first, second, nobody = g.members
+        self.assert_(second.posts is not first.posts)
+        self.assert_(second.posts._delivered)
+        self.assertEquals([p.title for p in second.posts], ['a', 'b'])
+
+        # The promise with no URL was left alone.
+        self.assert_(nobody._location is None)
+        self.failIf(nobody._delivered)
+        self.assertEquals(len(h.requests), 3)
+
+    def test_deliver_graph_user_agent(self):
+
+        class Thing(self.cls):
+            name = fields.Field()
+
+        def respond(uri, headers):
+            return ({'status': 200, 'content-type': 'application/json'},
+                    '{"name": "Molly"}')
+
+        # Without an executor, the root's user agent is used by the workers.
+        h = utils.FakeHttp(respond)
+        t = Thing.get('http://example.com/molly', http=h)
+        result = promise.deliver_graph(t, ['name'])
+        self.assertEquals(result.errors, {})
+        self.assertEquals(result.requests, 1)
+        self.assertEquals(len(h.requests), 1)
+        self.assertEquals(t.name, 'Molly')
+
+        # So is an instance's own user agent, if the executor doesn't make
+        # its own.
+        executor = futures.Executor(workers=1)
+        t = Thing.get('http://example.com/molly', http=h, executor=executor)
+        self.assert_(t._future is not None)
+        self.assertEquals(t.name, 'Molly')
+        self.assertEquals(len(h.requests), 2)
+        executor.shutdown()
+
+    def test_deliver_graph_cached(self):
+
+        class Thing(self.cls):
+            name = fields.Field()
+
+        def respond(uri, headers):
+            return ({'status': 200, 'content-type': 'application/json',
+                     'cache-control': 'max-age=60'},
+                    '{"name": "Molly"}')
+
+        Thing.object_cache = cache.ObjectCache()
+        h = utils.FakeHttp(respond)
+        executor = futures.Executor(workers=1, http_factory=lambda: h)
+        url = 'http://example.com/molly'
+        self.assertEquals(Thing.get(url, http=h).name, 'Molly')
+        self.assertEquals(len(h.requests), 1)
+
+        # Instances filled from the cache aren't counted as requests.
+        result = promise.deliver_graph(Thing.get(url), ['name'],
+            executor=executor)
+        executor.shutdown()
+        self.assertEquals(result.waves, 1)
+        self.assertEquals(result.requests, 0)
+        self.assertEquals(len(h.requests), 1)
+
+    def test_deliver_graph_errors(self):
+
+        class Thing(self.cls):
+            name = fields.Field()
+
+        def respond(uri, headers):
+            return {'status': 404}, ''
+
+        h = utils.FakeHttp(respond)
+        executor = futures.Executor(workers=1, http_factory=lambda: h)
+        t = Thing.get('http://example.com/nothing')
+        result = promise.deliver_graph(t, ['name'], executor=executor)
+        executor.shutdown()
+
+        self.assertEquals(result.waves, 1)
+        self.assert_(isinstance(result.errors['http://example.com/nothing'],
+            Thing.NotFound))
+        self.assertEquals(result.objects, {})
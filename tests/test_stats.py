@@ -0,0 +1,129 @@
+from datetime import datetime
+import threading
+import unittest
+
+from remoteobjects import dataobject, fields, stats, tracing
+from tests import utils
+
+
+class TestDecodeStats(unittest.TestCase):
+
+    def setUp(self):
+        stats.reset()
+
+    def tearDown(self):
+        stats.disable()
+        stats.reset()
+
+    def make_class(self):
+
+        class Zot(dataobject.DataObject):
+            size = fields.Field()
+            born = fields.Datetime()
+            attr = fields.Dict(fields.Field())
+
+        return Zot
+
+    def test_counts(self):
+        Zot = self.make_class()
+        data = {'size': 3, 'born': '2009-01-02T03:04:05Z',
+                'attr': {'a': [1, 'xy'], 'b': None}}
+
+        # Nothing is counted until statistics are enabled.
+        Zot.from_dict(data).born
+        self.assertEquals(stats.snapshot(), {})
+
+        stats.enable()
+        for i in range(3):
+            z = Zot.from_dict(data)
+            self.assertEquals(z.born, datetime(2009, 1, 2, 3, 4, 5))
+            self.assertEquals(z.attr['b'], None)
+            z.born
+        stats.disable()
+        Zot.from_dict(data).size
+
+        snapshot = stats.snapshot()
+        self.assertEquals(sorted(snapshot.keys()),
+            [('Zot', 'attr'), ('Zot', 'born')])
+        born = snapshot['Zot', 'born']
+        self.assertEquals((born.calls, born.samples), (3, 3))
+        self.assertEquals(born.bytes, 3 * 22)
+        self.assert_(born.seconds > 0)
+        self.assertEquals(snapshot['Zot', 'attr'].bytes, 3 * 23)
+
+    def test_sampling(self):
+        Zot = self.make_class()
+        stats.enable(sample_every=4)
+        for i in range(8):
+            Zot.from_dict({'size': i}).size
+        size = stats.snapshot()['Zot', 'size']
+        self.assertEquals((size.calls, size.samples), (8, 2))
+        # Totals are estimated for all the calls.
+        self.assertEquals(size.bytes, 8)
+
+    def test_json_size(self):
+        for value in ({}, [], {'a': [1, 2.5, None]}, [True, False, 'x'],
+                      u'\u2603', {'k': {'j': []}}, 10 ** 20, [-3L]):
+            self.assertEquals(stats.json_size(value),
+                len(compact_dumps(value)))
+
+    def test_threads(self):
+        Zot = self.make_class()
+        stats.enable(sample_every=2)
+
+        def decode():
+            for i in range(4):
+                Zot.from_dict({'size': i}).size
+
+        threads = [threading.Thread(target=decode) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        decode()
+
+        # Each thread's decodings are counted and sampled.
+        size = stats.snapshot()['Zot', 'size']
+        self.assertEquals((size.calls, size.samples), (16, 8))
+        self.assertEquals(size.bytes, 16)
+
+        # Finished threads' counts are kept when new threads start.
+        thread = threading.Thread(target=decode)
+        thread.start()
+        thread.join()
+        size = stats.snapshot()['Zot', 'size']
+        self.assertEquals((size.calls, size.samples), (20, 10))
+
+        stats.reset()
+        self.assertEquals(stats.snapshot(), {})
+
+    def test_prometheus(self):
+        Zot = self.make_class()
+        stats.enable()
+        Zot.from_dict({'size': 10}).size
+        text = stats.prometheus()
+        self.assert_('# TYPE remoteobjects_decode_calls_total counter\n'
+            in text)
+        self.assert_('remoteobjects_decode_calls_total{class="Zot",'
+            'field="size"} 1\n' in text)
+        self.assert_('remoteobjects_decode_bytes_total{class="Zot",'
+            'field="size"} 2\n' in text)
+
+    def test_traced(self):
+        Zot = self.make_class()
+        stats.enable()
+        with tracing.Trace() as trace:
+            Zot.from_dict({'size': 10}).size
+        self.assertEquals([(s.name, s.detail) for s in trace.spans],
+            [('decode', 'Zot.size')])
+        self.assertEquals(stats.snapshot()['Zot', 'size'].calls, 1)
+
+
+def compact_dumps(value):
+    import simplejson
+    return simplejson.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    utils.log()
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import threading
+import unittest
+
+from remoteobjects import fields, http, tracing
+from tests import utils
+from tests.utils import FakeHttp
+
+
+class Ticker(object):
+
+    """A clock that advances one second every time it's read."""
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+
+class TestTrace(unittest.TestCase):
+
+    def make_classes(self):
+
+        class Author(http.HttpObject):
+            name = fields.Field()
+
+        class Post(http.HttpObject):
+            title = fields.Field()
+            author = fields.Object(Author)
+
+        return Author, Post
+
+    def test_spans(self):
+        Author, Post = self.make_classes()
+
+        def respond(uri, headers):
+            return ({'status': 200, 'content-type': 'application/json'},
+                    '{"title": "Hi", "author": {"name": "Fred"}}')
+
+        h = FakeHttp(respond)
+        self.failIf(tracing.enabled)
+        trace = tracing.Trace(clock=Ticker())
+        trace.__enter__()
+        try:
+            self.assert_(tracing.enabled)
+            self.assert_(tracing.current() is trace)
+            p = Post.get('http://example.com/post', http=h)
+            self.assertEquals(p.author.name, 'Fred')
+            self.assertEquals(p.title, 'Hi')
+            p.to_dict()
+        finally:
+            trace.__exit__(None, None, None)
+        self.failIf(tracing.enabled)
+        self.assert_(tracing.current() is None)
+
+        self.assertEquals([(span.name, span.detail) for span in trace.spans], [
+            ('http.request', 'http://example.com/post'),
+            ('raise_for_response', 'http://example.com/post'),
+            ('json.loads', 'http://example.com/post'),
+            ('update_from_response', 'Post http://example.com/post'),
+            ('decode', 'Post.author'),
+            ('decode', 'Author.name'),
+            ('decode', 'Post.title'),
+            ('to_dict', 'Author'),
+            ('to_dict', 'Post'),
+        ])
+
+        # Each read of the clock takes a second, so a span's own time is a
+        # second more than it has nested spans.
+        self.assertEquals(trace.collapsed(), ''.join((
+            'http.request 1000000\n',
+            'update_from_response;raise_for_response 1000000\n',
+            'update_from_response;json.loads 1000000\n',
+            'update_from_response 3000000\n',
+            'decode 3000000\n',
+            'to_dict;to_dict 1000000\n',
+            'to_dict 2000000\n',
+        )))
+        self.assert_('\ndecode Author.name 1000000\n'
+            in trace.collapsed(details=True))
+
+        events = trace.chrome_trace()['traceEvents']
+        self.assertEquals(len(events), 10)
+        # Threads are numbered, and named by a metadata event.
+        thread = threading.currentThread()
+        self.assertEquals(events.pop(0), {'name': 'thread_name', 'ph': 'M',
+            'pid': os.getpid(), 'tid': thread.ident,
+            'args': {'name': thread.getName()}})
+        for event in events:
+            self.assertEquals(event['tid'], thread.ident)
+        self.assertEquals(events[0]['name'], 'http.request')
+        self.assertEquals(events[0]['ph'], 'X')
+        self.assertEquals(events[0]['ts'], 1000000)
+        self.assertEquals(events[0]['dur'], 1000000)
+        self.assertEquals(events[1]['name'], 'update_from_response')
+        self.assertEquals(events[1]['dur'], 5000000)
+        self.assertEquals(events[1]['args'],
+            {'detail': 'Post http://example.com/post'})
+
+    def test_disabled(self):
+        calls = []
+        self.assertEquals(tracing.call('x', None, calls.append, 1), None)
+        self.assertEquals(calls, [1])
+        self.assert_(tracing.begin('x') is None)
+        tracing.end(None)
+
+
+if __name__ == '__main__':
+    utils.log()
+    unittest.main()
@@ -1,6 +1,7 @@
 import httplib2
 import logging
 import os
+import threading
 
 import mox
 import nose
@@ -80,6 +81,26 @@ def mock_http(req, resp_or_content):
     return mock
 
 
+class FakeHttp(object):
+
+    """A thread-safe stand-in user agent that answers every request by
+    calling a function with the request's parameters."""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def request(self, **kwargs):
+        self.lock.acquire()
+        try:
+            self.requests.append(kwargs)
+        finally:
+            self.lock.release()
+        info, content = self.respond(**kwargs)
+        return httplib2.Response(info), content
+
+
 def log():
     import sys
     logging.basicConfig(level=logging.DEBUG, stream=sys.stderr, format="%(asctime)s %(levelname)s %(message)s")